@@ -1,5 +1,14 @@
+from collections import defaultdict
+from datetime import timedelta
+
 from django.contrib import admin
-from .models import Exercise, Routine, RoutinePlan, ExerciseLog, TopDownWeeklyTarget, WeeklyAnalysis
+from django.http import FileResponse
+from django.template.response import TemplateResponse
+from django.utils import timezone
+
+from . import profiling
+from .models import Exercise, Routine, RoutinePlan, ExerciseLog, TopDownWeeklyTarget, WeeklyAnalysis, DailyPointsRollup, AnalysisJob, AnalysisCallLog
+from .perf import percentile
 
 
 @admin.register(Exercise)
@@ -41,3 +50,77 @@ class WeeklyAnalysisAdmin(admin.ModelAdmin):
     list_display = ('user', 'year', 'week', 'generated_at')
     list_filter = ('user', 'year')
     readonly_fields = ('generated_at',)
+
+
+@admin.register(DailyPointsRollup)
+class DailyPointsRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'planned_points', 'completed_points', 'completed_planned_points', 'completed_unplanned_points')
+    list_filter = ('user',)
+    date_hierarchy = 'date'
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'year', 'week', 'status', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'year')
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+
+@admin.register(AnalysisCallLog)
+class AnalysisCallLogAdmin(admin.ModelAdmin):
+    """Call log list headed by a per-week summary of latency percentiles and token spend."""
+    list_display = ('created_at', 'user', 'year', 'week', 'model', 'streamed', 'latency_ms', 'input_tokens', 'output_tokens', 'success')
+    list_filter = ('success', 'streamed', 'model')
+    readonly_fields = [f.name for f in AnalysisCallLog._meta.fields]
+    date_hierarchy = 'created_at'
+    summary_weeks = 12
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**(extra_context or {}), 'weekly_summary': self.weekly_summary()}
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def weekly_summary(self):
+        since = timezone.now() - timedelta(weeks=self.summary_weeks)
+        weeks = defaultdict(lambda: {'latencies': [], 'calls': 0, 'failures': 0, 'input_tokens': 0, 'output_tokens': 0})
+        rows = AnalysisCallLog.objects.filter(created_at__gte=since).values_list(
+            'created_at', 'latency_ms', 'input_tokens', 'output_tokens', 'success'
+        )
+        for created_at, latency_ms, input_tokens, output_tokens, success in rows:
+            year, week = created_at.isocalendar()[:2]
+            bucket = weeks[(year, week)]
+            bucket['calls'] += 1
+            bucket['input_tokens'] += input_tokens
+            bucket['output_tokens'] += output_tokens
+            if success:
+                bucket['latencies'].append(latency_ms)
+            else:
+                bucket['failures'] += 1
+
+        summary = []
+        for (year, week), bucket in sorted(weeks.items(), reverse=True):
+            latencies = sorted(bucket.pop('latencies'))
+            summary.append({
+                'week': f"W{week:02d} {year}",
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                **bucket,
+            })
+        return summary
+
+
+def profile_reports_view(request):
+    """Stored ProfilingMiddleware reports, newest first (mounted at admin/profiles/ in mysite/urls.py)."""
+    return TemplateResponse(request, 'admin/api/profile_reports.html', {
+        **admin.site.each_context(request),
+        'title': "Profiling reports",
+        'reports': profiling.list_reports(),
+    })
+
+
+def profile_report_download(request, name, kind):
+    """One report as an attachment: the JSON report or the raw cProfile stats (.prof)."""
+    path = profiling.report_file(name, kind)
+    return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
@@ -0,0 +1,273 @@
+"""Weekly analysis generation: week data snapshot, prompt, LLM call and the job runner."""
+import hashlib
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import llm
+from .models import RoutinePlan, WeeklyAnalysis, AnalysisJob
+from .stats import week_snapshots_for_users
+
+# Number of weeks before the analysed week summarised in the analysis prompt (?history_weeks=)
+DEFAULT_HISTORY_WEEKS = 4
+MAX_HISTORY_WEEKS = 26
+
+# Bump whenever build_analysis_prompt changes in a way that should invalidate stored analyses
+PROMPT_VERSION = 1
+
+
+def build_week_data(user, year, week, history_weeks=DEFAULT_HISTORY_WEEKS):
+    return build_week_data_for_users([user.pk], year, week, history_weeks=history_weeks)[user.pk]
+
+
+def build_week_data_for_users(user_ids, year, week, history_weeks=DEFAULT_HISTORY_WEEKS):
+    """Prompt inputs for many users in a fixed number of queries: {user_id: week_data}."""
+    week_start = datetime.fromisocalendar(year, week, 1).date()
+    week_end = week_start + timedelta(days=6)
+
+    # Targets and point totals for this week and the history weeks come from one shared
+    # snapshot fetch; only the exercise breakdown of the analysed week needs the raw plans.
+    snapshots = week_snapshots_for_users(
+        user_ids, week_start, history_weeks=history_weeks, include_days=True
+    )
+    plans = defaultdict(dict)
+    for p in RoutinePlan.objects.filter(
+        user_id__in=user_ids, date__range=[week_start, week_end]
+    ).select_related('routine').prefetch_related('routine__exercises'):
+        plans[p.user_id][p.date] = p
+
+    return {
+        user_id: _week_data(year, week, week_start, week_end, snapshots[user_id], plans[user_id])
+        for user_id in user_ids
+    }
+
+
+def _week_data(year, week, week_start, week_end, snapshots, plans):
+    *history_snapshots, snapshot = snapshots
+    weekly_target = snapshot['target']
+
+    day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+    days = []
+    for i in range(7):
+        day = week_start + timedelta(days=i)
+        plan = plans.get(day)
+
+        exercises = []
+        if plan:
+            for ex in plan.routine.exercises.all():
+                exercises.append({
+                    'name': ex.name,
+                    'type': ex.type,
+                    'muscle_group': ex.muscle_group,
+                    'training_points': ex.training_points,
+                })
+
+        day_planned = sum(e['training_points'] for e in exercises)
+        day_completed = snapshot['days'].get(day, (0, 0))[1]
+
+        days.append({
+            'day': day_names[i],
+            'date': day.strftime('%a %b %d'),
+            'routine': plan.routine.name if plan else None,
+            'planned_points': day_planned,
+            'completed_points': day_completed,
+            'exercises': exercises,
+        })
+
+    history = [
+        {
+            'week': h['label'],
+            'completed': h['completed'],
+            'target': h['target'],
+            'pct': round(h['completed'] / h['target'] * 100, 1) if h['target'] > 0 else 0,
+        }
+        for h in history_snapshots
+    ]
+
+    total_planned = sum(d['planned_points'] for d in days)
+    total_completed = sum(d['completed_points'] for d in days)
+
+    return {
+        'week_label': f"W{week:02d} {year}",
+        'week_range': f"{week_start.strftime('%a %b %d')} – {week_end.strftime('%a %b %d %Y')}",
+        'weekly_target': weekly_target,
+        'total_planned': total_planned,
+        'total_completed': total_completed,
+        'planning_pct': round(total_planned / weekly_target * 100, 1) if weekly_target > 0 else 0,
+        'achievement_pct': round(total_completed / weekly_target * 100, 1) if weekly_target > 0 else 0,
+        'days': days,
+        'history': history,
+    }
+
+
+def build_analysis_prompt(data):
+    day_lines = []
+    for d in data['days']:
+        if d['routine']:
+            exs = ', '.join(
+                f"{e['name']} ({e['muscle_group']}, {e['training_points']}pts)"
+                for e in d['exercises']
+            )
+            day_lines.append(
+                f"  {d['day']} {d['date']}: {d['routine']} — planned {d['planned_points']}pts, "
+                f"completed {d['completed_points']}pts\n    Exercises: {exs}"
+            )
+        else:
+            day_lines.append(f"  {d['day']} {d['date']}: — (rest/unplanned)")
+
+    history_lines = [
+        f"  {h['week']}: {h['completed']}/{h['target']} pts ({h['pct']}% of target)"
+        for h in data['history']
+    ]
+
+    return f"""You are a personal fitness coach. Analyze this weekly training data and provide structured feedback.
+
+WEEK: {data['week_label']} ({data['week_range']})
+TARGET: {data['weekly_target']} training points
+PLANNED: {data['total_planned']} pts ({data['planning_pct']}% of target)
+COMPLETED: {data['total_completed']} pts ({data['achievement_pct']}% of target)
+
+DAILY BREAKDOWN:
+{chr(10).join(day_lines)}
+
+RECENT HISTORY (last {len(data['history'])} weeks):
+{chr(10).join(history_lines)}
+
+Return ONLY a valid JSON object — no markdown, no code blocks, just raw JSON:
+{{
+  "summary": "1-2 sentence overview of the week",
+  "observations": ["specific data-driven observation", "another observation", "a third observation"],
+  "suggestions": ["actionable suggestion", "another suggestion"]
+}}
+
+Be specific: reference exercise names, point counts, recovery gaps, muscle group balance, and historical trends."""
+
+
+def parse_analysis(raw):
+    """Parse the model's reply, tolerating a markdown code fence around the JSON object."""
+    raw = raw.strip()
+    if raw.startswith('```'):
+        raw = raw.split('```')[1]
+        if raw.startswith('json'):
+            raw = raw[4:]
+    return json.loads(raw.strip())
+
+
+def fingerprint(week_data):
+    """Stable hash of the prompt inputs, stored on WeeklyAnalysis to detect redundant regenerations."""
+    payload = json.dumps([PROMPT_VERSION, llm.ANALYSIS_MODEL, week_data], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def is_fresh(analysis, input_hash):
+    return analysis.prompt_version == PROMPT_VERSION and analysis.input_hash == input_hash
+
+
+def generate_analysis(user, year, week, history_weeks=DEFAULT_HISTORY_WEEKS, client=None, week_data=None):
+    """
+    Build the week data (unless prebuilt `week_data` is passed), call the model and store the
+    result. Returns the WeeklyAnalysis row.
+    """
+    if week_data is None:
+        week_data = build_week_data(user, year, week, history_weeks=history_weeks)
+    client = client or llm.get_client()
+    with llm.call_context(user=user, year=year, week=week):
+        message = client.messages.create(
+            model=llm.ANALYSIS_MODEL,
+            max_tokens=llm.ANALYSIS_MAX_TOKENS,
+            messages=[{'role': 'user', 'content': build_analysis_prompt(week_data)}],
+        )
+    return _store_analysis(user, year, week, week_data, message.content[0].text)
+
+
+def stream_analysis(user, year, week, history_weeks=DEFAULT_HISTORY_WEEKS, client=None):
+    """
+    Generate like generate_analysis but yield ('delta', {'text': ...}) events as tokens arrive,
+    then ('done', {...}) once the parsed result is stored, or ('error', {...}) on failure.
+    """
+    try:
+        week_data = build_week_data(user, year, week, history_weeks=history_weeks)
+        client = client or llm.get_client()
+        chunks = []
+        with llm.call_context(user=user, year=year, week=week):
+            manager = client.messages.stream(
+                model=llm.ANALYSIS_MODEL,
+                max_tokens=llm.ANALYSIS_MAX_TOKENS,
+                messages=[{'role': 'user', 'content': build_analysis_prompt(week_data)}],
+            )
+        with manager as stream:
+            for text in stream.text_stream:
+                chunks.append(text)
+                yield 'delta', {'text': text}
+        obj = _store_analysis(user, year, week, week_data, ''.join(chunks))
+    except Exception as e:
+        yield 'error', {'error': str(e)}
+        return
+    yield 'done', {
+        'content': obj.content,
+        'generated_at': obj.generated_at.isoformat(),
+        'cached': False,
+    }
+
+
+def _store_analysis(user, year, week, week_data, raw):
+    obj, _ = WeeklyAnalysis.objects.update_or_create(
+        user=user, year=year, week=week,
+        defaults={
+            'content': parse_analysis(raw),
+            'input_hash': fingerprint(week_data),
+            'prompt_version': PROMPT_VERSION,
+        },
+    )
+    return obj
+
+
+def enqueue_analysis(user, year, week, history_weeks=DEFAULT_HISTORY_WEEKS):
+    """
+    Queue a generation job, reusing an unfinished job for the same user and week. When two
+    requests race, the unique constraint on unfinished jobs rejects the second insert, and
+    that request answers with the job the first one created.
+    """
+    jobs = AnalysisJob.objects.filter(user=user, year=year, week=week)
+    job = jobs.filter(status__in=AnalysisJob.UNFINISHED_STATUSES).first()
+    if job is None:
+        try:
+            with transaction.atomic():
+                job = AnalysisJob.objects.create(user=user, year=year, week=week, history_weeks=history_weeks)
+        except IntegrityError:
+            # The winner's job, even if a worker already finished it meanwhile
+            job = jobs.order_by('-created_at', '-pk').first()
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest pending job to running and return it, or None when the queue
+    is empty. The conditional UPDATE makes the claim safe across concurrent workers.
+    """
+    pending = AnalysisJob.objects.filter(status=AnalysisJob.STATUS_PENDING).order_by('created_at')
+    for job_id in pending.values_list('pk', flat=True)[:10]:
+        claimed = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.STATUS_PENDING).update(
+            status=AnalysisJob.STATUS_RUNNING, started_at=timezone.now(),
+        )
+        if claimed:
+            return AnalysisJob.objects.select_related('user').get(pk=job_id)
+    return None
+
+
+def run_job(job, client=None):
+    """Execute a claimed job, recording the outcome on the job row."""
+    try:
+        generate_analysis(job.user, job.year, job.week, history_weeks=job.history_weeks, client=client)
+    except Exception as e:
+        job.status = AnalysisJob.STATUS_FAILED
+        job.error = f"{type(e).__name__}: {e}"
+    else:
+        job.status = AnalysisJob.STATUS_DONE
+        job.error = ''
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
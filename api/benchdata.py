@@ -0,0 +1,167 @@
+"""
+Synthetic catalog and per-user history for the bench_* management commands and the query budget
+tests (deterministic shapes), and for seed_fitness_data (randomised, realistic-looking training).
+"""
+import math
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+
+from .models import Exercise, Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget
+from .rollups import rebuild_user
+
+EXERCISES = 20
+ROUTINES = 5
+START = date(2000, 1, 3)  # a Monday
+
+
+def seed_catalog(prefix="Bench", exercises=EXERCISES, routines=ROUTINES):
+    """Create `exercises` exercises and `routines` routines (the first one empty); returns both lists."""
+    # Nullable and odd values on purpose, so byte comparisons cover their formatting
+    exercise_rows = Exercise.objects.bulk_create([
+        Exercise(name=f"{prefix} exercise {i:02d}", activity='Strength', type='Barbell',
+                 muscle_group='Legs', sub_group='Quads' if i % 2 else None, training_points=1 + i % 5)
+        for i in range(exercises)
+    ])
+    routine_rows = Routine.objects.bulk_create([
+        Routine(name=f"{prefix} routine {i}") for i in range(routines)
+    ])
+    for i, routine in enumerate(routine_rows[1:], start=1):
+        routine.exercises.set(exercise_rows[i::max(routines - 1, 1)])
+    return exercise_rows, routine_rows
+
+
+def seed_user(username, size, exercises, routines, start=START):
+    """Create a user and seed_history for them; returns the user."""
+    user = get_user_model().objects.create_user(username)
+    seed_history(user, size, exercises, routines, start)
+    return user
+
+
+def seed_history(user, size, exercises, routines, start=START):
+    """
+    Give `user` `size` exercise logs (0-3 sets each) and `size` daily routine plans from `start`
+    on, a weekly target for each week touched, then rebuild their points rollup (bulk_create
+    sends no signals). The logs cover the first size / len(exercises) days of that range.
+    """
+    logs = ExerciseLog.objects.bulk_create([
+        ExerciseLog(user=user, exercise=exercises[i % len(exercises)],
+                    date=start + timedelta(days=i // len(exercises)), completed=i % 3 == 0)
+        for i in range(size)
+    ])
+    weights = [None, Decimal('60'), Decimal('22.5'), Decimal('102.25')]
+    ExerciseSet.objects.bulk_create([
+        ExerciseSet(exercise_log=log, set_number=n, reps=5 + n, weight_kg=weights[(i + n) % len(weights)],
+                    completed=n % 2 == 0)
+        for i, log in enumerate(logs)
+        for n in range(1, i % 4 + 1)
+    ])
+    RoutinePlan.objects.bulk_create([
+        RoutinePlan(user=user, routine=routines[i % len(routines)], date=start + timedelta(days=i))
+        for i in range(size)
+    ])
+    weeks = {(start + timedelta(days=i)).isocalendar()[:2] for i in range(size)}
+    TopDownWeeklyTarget.objects.bulk_create([
+        TopDownWeeklyTarget(user=user, year=year, week=week, target_points=20 + week % 30)
+        for year, week in sorted(weeks)
+    ], ignore_conflicts=True)
+    rebuild_user(user.pk)
+
+
+# Equipment types whose sets are logged without a weight
+UNWEIGHTED_TYPES = {'Bodyweight', 'Resistance Band', 'Run', 'Other'}
+
+
+def seed_training_catalog(prefix="Seed", exercises=60, per_routine=6):
+    """
+    Create `exercises` exercises spread over every muscle group and equipment type, and one
+    "<prefix> <group> day" routine of up to `per_routine` of them per muscle group; returns both lists.
+    """
+    groups = [value for value, _ in Exercise.MUSCLE_GROUP_CHOICES]
+    types = [value for value, _ in Exercise.TYPE_CHOICES]
+    exercise_rows = Exercise.objects.bulk_create([
+        Exercise(name=f"{prefix} exercise {i:03d}", activity='Cardio' if types[i % len(types)] == 'Run' else 'Strength',
+                 type=types[i % len(types)], muscle_group=groups[i % len(groups)], training_points=1 + i % 5)
+        for i in range(exercises)
+    ])
+    routine_rows = Routine.objects.bulk_create([Routine(name=f"{prefix} {group} day") for group in groups])
+    for routine, group in zip(routine_rows, groups):
+        routine.exercises.set([exercise for exercise in exercise_rows if exercise.muscle_group == group][:per_routine])
+    return exercise_rows, routine_rows
+
+
+def seed_training_history(user, rng, routine_exercises, start, end):
+    """
+    Give `user` a plausible training history from `start` to `end`, drawn from `rng` (a random.Random).
+
+    Each user gets a training frequency (1-6 days a week), an adherence rate and a rotation of
+    2-4 routines from `routine_exercises` ({routine: [exercises]}). Every training day is a
+    RoutinePlan with one ExerciseLog per routine exercise; about one week in twelve is skipped
+    entirely. Completed logs get 2-5 sets whose load grows slowly over the weeks, and most weeks
+    get a TopDownWeeklyTarget near the planned points. Returns the number of rows per model.
+    """
+    days_per_week = min(max(round(rng.gauss(3.5, 1.2)), 1), 6)
+    adherence = rng.betavariate(8, 2)
+    rotation = rng.sample(list(routine_exercises), min(len(routine_exercises), rng.randint(2, 4)))
+    weekdays = sorted(rng.sample(range(7), days_per_week))
+    base_load = {}
+
+    plans, logs, set_specs, targets = [], [], [], []
+    week_start = start - timedelta(days=start.weekday())
+    session = 0
+    while week_start <= end:
+        weeks_in = (week_start - start).days // 7
+        skipped_week = rng.random() < 1 / 12
+        planned_points = 0
+        for weekday in weekdays:
+            day = week_start + timedelta(days=weekday)
+            if not start <= day <= end:
+                continue
+            routine = rotation[session % len(rotation)]
+            session += 1
+            plans.append(RoutinePlan(user=user, routine=routine, date=day))
+            trained = not skipped_week and rng.random() < adherence
+            for exercise in routine_exercises[routine]:
+                planned_points += exercise.training_points
+                completed = trained and rng.random() < 0.95
+                logs.append(ExerciseLog(user=user, exercise=exercise, date=day, completed=completed))
+                if not completed:
+                    set_specs.append(())
+                    continue
+                if exercise.type in UNWEIGHTED_TYPES:
+                    load = None
+                else:
+                    start_load = base_load.setdefault(exercise.pk, rng.lognormvariate(math.log(40), 0.5))
+                    load = start_load * (1 + 0.004 * weeks_in) * rng.gauss(1, 0.03)
+                reps = rng.randint(5, 12)
+                set_specs.append([
+                    (reps - (1 if n >= 2 and rng.random() < 0.3 else 0), _round_load(load), rng.random() < 0.97)
+                    for n in range(rng.choices([2, 3, 4, 5], weights=[1, 4, 3, 1])[0])
+                ])
+        if planned_points and rng.random() < 0.8:
+            year, week = week_start.isocalendar()[:2]
+            targets.append(TopDownWeeklyTarget(
+                user=user, year=year, week=week, target_points=max(round(planned_points * rng.gauss(1, 0.1)), 1),
+            ))
+        week_start += timedelta(days=7)
+
+    ExerciseLog.objects.bulk_create(logs, batch_size=1000)
+    sets = [
+        ExerciseSet(exercise_log=log, set_number=n, reps=reps, weight_kg=weight, completed=done)
+        for log, specs in zip(logs, set_specs)
+        for n, (reps, weight, done) in enumerate(specs, start=1)
+    ]
+    ExerciseSet.objects.bulk_create(sets, batch_size=1000)
+    RoutinePlan.objects.bulk_create(plans, batch_size=1000)
+    TopDownWeeklyTarget.objects.bulk_create(targets, batch_size=1000)
+    rebuild_user(user.pk)  # bulk_create sends no signals
+    return {'routine_plans': len(plans), 'exercise_logs': len(logs), 'exercise_sets': len(sets),
+            'weekly_targets': len(targets)}
+
+
+def _round_load(load):
+    """Round to the nearest 2.5 kg plate step (None stays None)."""
+    if load is None:
+        return None
+    return Decimal(max(round(load / 2.5), 1)) * Decimal('2.5')
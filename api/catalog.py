@@ -0,0 +1,38 @@
+"""
+In-process cache of the rendered exercise catalog.
+
+Each worker keeps the rendered JSON bytes of the exercise list keyed by the catalog version
+stored in DataVersion. Exercise saves/deletes bump that version in the database, so every
+gunicorn worker notices the change on its next request and re-renders once.
+"""
+import threading
+
+from .versions import current_versions
+
+CATALOG_KEY = 'exercise-catalog'
+
+_lock = threading.Lock()
+_cache = {'version': None, 'body': None}
+
+
+def current_version():
+    return current_versions(CATALOG_KEY)[0]
+
+
+def etag(version):
+    return f'"exercise-catalog-{version}"'
+
+
+def rendered(version, render):
+    """Return the cached bytes for `version`, calling `render()` to build them on a miss."""
+    if _cache['version'] == version:
+        return _cache['body']
+    body = render()
+    with _lock:
+        _cache.update(version=version, body=body)
+    return body
+
+
+def clear():
+    with _lock:
+        _cache.update(version=None, body=None)
@@ -0,0 +1,209 @@
+"""
+Process-wide LLM client for weekly analysis generation.
+
+get_client() lazily builds one client per process and reuses it, so the HTTP connection pool
+(and its keep-alive TLS sessions) survives across requests. Calls made through it are bounded
+by the configured timeouts/retries and recorded in AnalysisCallLog.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_MODEL = 'claude-sonnet-4-6'
+ANALYSIS_MAX_TOKENS = 1024
+
+_client = None
+_client_lock = threading.Lock()
+_call_context = contextvars.ContextVar('analysis_call_context', default={})
+
+
+def is_configured():
+    return settings.ANALYSIS_LLM_CLIENT == 'fake' or bool(os.environ.get('ANTHROPIC_API_KEY'))
+
+
+def get_client():
+    """Return the shared client selected by settings.ANALYSIS_LLM_CLIENT ('anthropic' or 'fake')."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = InstrumentedClient(_build_client())
+    return _client
+
+
+def reset_client():
+    """Drop the shared client, e.g. after changing settings in a shell or test."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def _build_client():
+    if settings.ANALYSIS_LLM_CLIENT == 'fake':
+        return FakeAnthropicClient()
+    import anthropic
+    return anthropic.Anthropic(
+        api_key=os.environ['ANTHROPIC_API_KEY'],
+        timeout=anthropic.Timeout(settings.ANALYSIS_LLM_READ_TIMEOUT, connect=settings.ANALYSIS_LLM_CONNECT_TIMEOUT),
+        max_retries=settings.ANALYSIS_LLM_MAX_RETRIES,
+    )
+
+
+@contextlib.contextmanager
+def call_context(**values):
+    """Attach user/year/week to the AnalysisCallLog rows of calls made inside the block."""
+    token = _call_context.set({**_call_context.get(), **values})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+class InstrumentedClient:
+    """Wraps an anthropic-compatible client, logging every messages call to AnalysisCallLog."""
+
+    def __init__(self, client):
+        self.client = client
+        self.messages = _InstrumentedMessages(client.messages)
+
+
+class _InstrumentedMessages:
+    def __init__(self, messages):
+        self._messages = messages
+
+    def create(self, **kwargs):
+        context = _call_context.get()
+        started = time.monotonic()
+        try:
+            with metrics.timed('external'):
+                message = self._messages.create(**kwargs)
+        except Exception as e:
+            _record(context, kwargs, started, error=e)
+            raise
+        _record(context, kwargs, started, usage=getattr(message, 'usage', None))
+        return message
+
+    def stream(self, **kwargs):
+        # The context is captured now: the stream may be consumed from other threads/contexts
+        return _InstrumentedStream(self._messages.stream(**kwargs), kwargs, _call_context.get())
+
+
+class _InstrumentedStream:
+    def __init__(self, manager, kwargs, context):
+        self._manager = manager
+        self._kwargs = kwargs
+        self._context = context
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        self._stream = self._manager.__enter__()
+        return self._stream
+
+    def __exit__(self, exc_type, exc, tb):
+        usage = None
+        if exc is None:
+            with contextlib.suppress(Exception):
+                usage = self._stream.get_final_message().usage
+        result = self._manager.__exit__(exc_type, exc, tb)
+        metrics.add_time('external', time.monotonic() - self._started)
+        _record(self._context, self._kwargs, self._started, usage=usage, error=exc, streamed=True)
+        return result
+
+
+def _record(context, kwargs, started, usage=None, error=None, streamed=False):
+    from .models import AnalysisCallLog
+
+    try:
+        AnalysisCallLog.objects.create(
+            user=context.get('user'),
+            year=context.get('year'),
+            week=context.get('week'),
+            model=kwargs.get('model', ''),
+            streamed=streamed,
+            latency_ms=round((time.monotonic() - started) * 1000),
+            input_tokens=getattr(usage, 'input_tokens', None) or 0,
+            output_tokens=getattr(usage, 'output_tokens', None) or 0,
+            success=error is None,
+            failure_reason='' if error is None else f"{type(error).__name__}: {error}"[:500],
+        )
+    except Exception:
+        # Instrumentation must never fail the call it measures
+        logger.exception("Could not record analysis call")
+
+
+class FakeAnthropicClient:
+    """
+    Offline stand-in for anthropic.Anthropic covering the calls made in this app.
+    Replies with a canned, valid analysis after an optional simulated latency.
+    """
+
+    def __init__(self, latency=0.0):
+        self.messages = _FakeMessages(latency)
+
+
+class _FakeMessages:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = []
+
+    def create(self, model, max_tokens, messages, **kwargs):
+        self.calls.append({'model': model, 'max_tokens': max_tokens, 'messages': messages})
+        if self.latency:
+            time.sleep(self.latency)
+        return self._message(model, messages)
+
+    def stream(self, model, max_tokens, messages, **kwargs):
+        self.calls.append({'model': model, 'max_tokens': max_tokens, 'messages': messages, 'stream': True})
+        return _FakeStream(self._message(model, messages), self.latency)
+
+    def _message(self, model, messages):
+        prompt = messages[-1]['content']
+        text = json.dumps({
+            'summary': 'Offline analysis generated by the fake client.',
+            'observations': [f'The prompt was {len(prompt)} characters long.'],
+            'suggestions': ['Configure ANTHROPIC_API_KEY for real feedback.'],
+        })
+        return SimpleNamespace(
+            content=[SimpleNamespace(type='text', text=text)],
+            usage=SimpleNamespace(input_tokens=len(prompt) // 4, output_tokens=len(text) // 4),
+            stop_reason='end_turn',
+            model=model,
+        )
+
+
+class _FakeStream:
+    """Mimics the context manager returned by anthropic's messages.stream()."""
+
+    def __init__(self, message, latency, chunk_size=16):
+        self._message = message
+        self._latency = latency
+        self._chunk_size = chunk_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        text = self._message.content[0].text
+        chunks = [text[i:i + self._chunk_size] for i in range(0, len(text), self._chunk_size)]
+        for chunk in chunks:
+            if self._latency:
+                time.sleep(self._latency / len(chunks))
+            yield chunk
+
+    def get_final_message(self):
+        return self._message
@@ -0,0 +1,233 @@
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.models import Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget, DailyPointsRollup, Tombstone
+from api.perf import summarize
+from api.sync import encode_token
+from api.versions import GLOBAL_KEY, current_versions
+
+# Write scenarios only touch days from here on, and the cleanup deletes everything after it
+FUTURE = date(2100, 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every API endpoint through the Django test client with JWT auth as the users created "
+        "by seed_fitness_data, and print p50/p95/p99 latency, query counts and response bytes per "
+        "endpoint as JSON. Write scenarios use days from 2100 on, which are deleted afterwards. "
+        "Compare runs across commits with --baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='seed', help="Username prefix given to seed_fitness_data")
+        parser.add_argument('--users', type=int, default=5, help="Seeded users to rotate through")
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per endpoint")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per endpoint first")
+        parser.add_argument('--only', help="Run only endpoints whose name contains this")
+        parser.add_argument('--accept-encoding', default='gzip', help="Accept-Encoding sent with every request")
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+        parser.add_argument('--baseline', help="Earlier JSON report to compare against (summary on stderr)")
+
+    def handle(self, *args, prefix, users, requests, warmup, only, accept_encoding, output, baseline, **options):
+        bench_users = list(get_user_model().objects.filter(username__startswith=f"{prefix}-").order_by('username')[:users])
+        if not bench_users:
+            raise CommandError(f"No '{prefix}-*' users; run `manage.py seed_fitness_data` first.")
+        contexts = [self._context(user, accept_encoding) for user in bench_users]
+        scenarios = [scenario for scenario in _scenarios() if not only or only in scenario[0]]
+
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(None)
+            return execute(sql, params, many, context)
+
+        results = []
+        counter = 0
+        try:
+            for name, method, build in scenarios:
+                latencies, query_counts, sizes, statuses = [], [], [], set()
+                for i in range(warmup + requests):
+                    ctx = contexts[i % len(contexts)]
+                    counter += 1
+                    path, data = build(ctx, counter)
+                    queries.clear()
+                    with connection.execute_wrapper(count):
+                        started = time.perf_counter()
+                        response = getattr(ctx['client'], method)(path, data, format='json')
+                        elapsed = (time.perf_counter() - started) * 1000
+                    if response.status_code >= 400:
+                        raise CommandError(f"{method.upper()} {path} answered {response.status_code}: {response.content[:300]}")
+                    if i < warmup:
+                        continue
+                    latencies.append(elapsed)
+                    query_counts.append(len(queries))
+                    sizes.append(len(response.content))
+                    statuses.add(response.status_code)
+                results.append({
+                    'name': name,
+                    'method': method.upper(),
+                    'statuses': sorted(statuses),
+                    'latency_ms': _rounded(summarize(latencies, pcts=(50, 95, 99))),
+                    'queries': _rounded(summarize(query_counts, pcts=(50, 99))),
+                    'bytes': _rounded(summarize(sizes, pcts=(50,))),
+                })
+        finally:
+            self._cleanup(bench_users)
+
+        report = {'meta': self._meta(bench_users, requests, accept_encoding), 'endpoints': results}
+        text = json.dumps(report, indent=2)
+        if output:
+            with open(output, 'w') as f:
+                f.write(text + '\n')
+        else:
+            self.stdout.write(text)
+        if baseline:
+            with open(baseline) as f:
+                self._compare(json.load(f), report)
+
+    def _context(self, user, accept_encoding):
+        """Client and ids one user's requests need."""
+        client = APIClient(HTTP_HOST='localhost', HTTP_ACCEPT_ENCODING=accept_encoding)
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        logs = ExerciseLog.objects.filter(user=user)
+        exercise_ids = list(logs.order_by().values_list('exercise_id', flat=True).distinct()[:5])
+        if not exercise_ids:
+            raise CommandError(f"{user.username} has no exercise logs; reseed with seed_fitness_data.")
+        # An own log for the PATCH and set scenarios, so the seeded history is left untouched
+        scratch, _ = ExerciseLog.objects.get_or_create(user=user, exercise_id=exercise_ids[0], date=FUTURE)
+        today = date.today()
+        return {
+            'client': client,
+            'exercise_ids': exercise_ids,
+            'routine_id': RoutinePlan.objects.filter(user=user).values_list('routine_id', flat=True).first()
+            or Routine.objects.values_list('pk', flat=True).first(),
+            'log_id': logs.filter(sets__isnull=False).values_list('pk', flat=True).first(),
+            'scratch_log_id': scratch.pk,
+            'plan_id': RoutinePlan.objects.filter(user=user).values_list('pk', flat=True).first(),
+            'set_id': ExerciseSet.objects.filter(exercise_log__user=user).values_list('pk', flat=True).first(),
+            'target_id': TopDownWeeklyTarget.objects.filter(user=user).values_list('pk', flat=True).first(),
+            'kpi_range': f"start_date={today - timedelta(days=90)}&end_date={today}",
+            'since': encode_token(timezone.now(), current_versions(GLOBAL_KEY)[0]),
+        }
+
+    def _cleanup(self, users):
+        """Delete what the write scenarios created, and the tombstones and rollup rows that left behind."""
+        started = timezone.now()
+        ExerciseLog.objects.filter(user__in=users, date__gte=FUTURE).delete()
+        RoutinePlan.objects.filter(user__in=users, date__gte=FUTURE).delete()
+        TopDownWeeklyTarget.objects.filter(user__in=users, year__gte=FUTURE.year).delete()
+        DailyPointsRollup.objects.filter(user__in=users, date__gte=FUTURE).delete()
+        Tombstone.objects.filter(user__in=users, deleted_at__gte=started).delete()
+
+    def _meta(self, users, requests, accept_encoding):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': datetime.now().astimezone().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'users': len(users),
+            'exercise_logs_per_user': ExerciseLog.objects.filter(user__in=users).count() // len(users),
+            'requests': requests,
+            'accept_encoding': accept_encoding,
+        }
+
+    def _compare(self, before, after):
+        old = {row['name']: row for row in before['endpoints']}
+        sys.stderr.write(f"p50 latency and queries, {before['meta'].get('commit')} -> {after['meta'].get('commit')}:\n")
+        for row in after['endpoints']:
+            prev = old.get(row['name'])
+            if prev is None:
+                sys.stderr.write(f"  {row['name']:<28} new\n")
+                continue
+            was, now = prev['latency_ms']['p50'], row['latency_ms']['p50']
+            change = f"{(now - was) / was * 100:+6.1f}%" if was else "    n/a"
+            sys.stderr.write(
+                f"  {row['name']:<28} {was:9.2f} -> {now:9.2f} ms {change}   "
+                f"queries {prev['queries']['p50']:g} -> {row['queries']['p50']:g}\n"
+            )
+
+
+def _rounded(summary):
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in summary.items()}
+
+
+def _future_day(i):
+    return (FUTURE + timedelta(days=i)).isoformat()
+
+
+def _get(path):
+    """Build function for a GET of `path`, with {name} placeholders filled from the user's context."""
+    return lambda ctx, i: (path.format(**ctx), None)
+
+
+def _scenarios():
+    """(name, method, build) triples; build(context, i) returns (path, data) for the i-th request overall."""
+    return [
+        ('exercises', 'get', _get('/api/exercises/')),
+        ('routines', 'get', _get('/api/routines/')),
+        ('routines normalized', 'get', _get('/api/routines/?format=normalized')),
+        ('routine-plans', 'get', _get('/api/routine-plans/')),
+        ('routine-plans normalized', 'get', _get('/api/routine-plans/?format=normalized')),
+        ('routine-plans page', 'get', _get('/api/routine-plans/?page_size=100')),
+        ('routine-plan detail', 'get', _get('/api/routine-plans/{plan_id}/')),
+        ('exercise-logs', 'get', _get('/api/exercise-logs/')),
+        ('exercise-logs page', 'get', _get('/api/exercise-logs/?page_size=100')),
+        ('exercise-log detail', 'get', _get('/api/exercise-logs/{log_id}/')),
+        ('exercise-sets', 'get', _get('/api/exercise-sets/')),
+        ('exercise-set detail', 'get', _get('/api/exercise-sets/{set_id}/')),
+        ('weekly-targets', 'get', _get('/api/weekly-targets/')),
+        ('weekly-target detail', 'get', _get('/api/weekly-targets/{target_id}/')),
+        ('historical_stats', 'get', _get('/api/weekly-stats/historical_stats/?weeks_back=12')),
+        ('kpi_summary', 'get', _get('/api/weekly-stats/kpi_summary/?{kpi_range}')),
+        ('analysis', 'get', _get('/api/weekly-stats/analysis/')),
+        ('analysis-jobs', 'get', _get('/api/analysis-jobs/')),
+        ('sync snapshot', 'get', _get('/api/sync/')),
+        ('sync delta', 'get', _get('/api/sync/?since={since}')),
+        ('exercise-log create', 'post', lambda ctx, i: ('/api/exercise-logs/', {
+            'exercise': ctx['exercise_ids'][0], 'date': _future_day(i), 'completed': True,
+        })),
+        ('exercise-log update', 'patch', lambda ctx, i: (f"/api/exercise-logs/{ctx['scratch_log_id']}/", {
+            'completed': i % 2 == 0,
+        })),
+        ('exercise-logs bulk_upsert', 'post', lambda ctx, i: ('/api/exercise-logs/bulk_upsert/', {
+            'date': _future_day(i), 'items': [{'exercise': pk, 'completed': True} for pk in ctx['exercise_ids']],
+        })),
+        ('exercise-set create', 'post', lambda ctx, i: ('/api/exercise-sets/', {
+            'exercise_log': ctx['scratch_log_id'], 'reps': 8, 'weight_kg': '60.00',
+        })),
+        ('routine-plan create', 'post', lambda ctx, i: ('/api/routine-plans/', {
+            'routine': ctx['routine_id'], 'date': _future_day(i),
+        })),
+        ('routine-plans schedule', 'post', lambda ctx, i: ('/api/routine-plans/schedule/', {
+            'routine': ctx['routine_id'], 'start_date': _future_day(i), 'weeks': 4, 'on_conflict': 'overwrite',
+        })),
+        ('weekly-target create', 'post', lambda ctx, i: ('/api/weekly-targets/', {
+            'year': FUTURE.year + i // 52, 'week': 1 + i % 52, 'target_points': 40,
+        })),
+        ('batch', 'post', lambda ctx, i: ('/api/batch/', {'operations': [
+            {'method': 'POST', 'resource': 'exercise-logs',
+             'data': {'exercise': ctx['exercise_ids'][0], 'date': _future_day(i), 'completed': True}},
+            {'method': 'PATCH', 'resource': 'exercise-logs', 'id': ctx['scratch_log_id'], 'data': {'completed': False}},
+            {'method': 'POST', 'resource': 'exercise-sets', 'data': {'exercise_log': ctx['scratch_log_id'], 'reps': 5}},
+        ]})),
+    ]
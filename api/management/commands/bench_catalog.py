@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+
+from api import catalog
+from api.models import Exercise
+from api.perf import summarize
+from api.versions import bump
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark GET /api/exercises/ with and without the in-process catalog cache on a synthetic "
+        "catalog. Runs inside a transaction that is rolled back, so it leaves the database untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=5000, help="Synthetic exercises to add (default 5000)")
+        parser.add_argument('--requests', type=int, default=50, help="Requests per scenario")
+
+    def handle(self, *args, size, requests, **options):
+        client = Client(HTTP_HOST='localhost')
+        with transaction.atomic():
+            Exercise.objects.bulk_create([
+                Exercise(name=f"Bench exercise {i:05d}", activity='Strength', type='Barbell',
+                         muscle_group='Legs', training_points=1 + i % 5)
+                for i in range(size)
+            ])
+            bump(catalog.CATALOG_KEY)  # bulk_create sends no signals
+            try:
+                uncached = self._run(client, requests, clear_cache=True)
+                cached = self._run(client, requests, clear_cache=False)
+                revalidated = self._run(client, requests, clear_cache=False, conditional=True)
+            finally:
+                catalog.clear()
+                transaction.set_rollback(True)
+
+        total = Exercise.objects.count() + size
+        self.stdout.write(f"GET /api/exercises/ with {total} exercises, {requests} requests each (ms):")
+        for label, (timings, body_bytes) in (
+            ('serialize every request', uncached),
+            ('in-process cache', cached),
+            ('If-None-Match (304)', revalidated),
+        ):
+            stats = summarize(timings)
+            self.stdout.write(
+                f"  {label:<24} p50={stats['p50']:8.2f}  p95={stats['p95']:8.2f}  "
+                f"mean={stats['mean']:8.2f}  bytes={body_bytes}"
+            )
+
+    def _run(self, client, requests, clear_cache, conditional=False):
+        headers = {}
+        if conditional:
+            headers['HTTP_IF_NONE_MATCH'] = client.get('/api/exercises/')['ETag']
+        client.get('/api/exercises/', **headers)  # warm-up
+        timings = []
+        for _ in range(requests):
+            if clear_cache:
+                catalog.clear()
+            started = time.perf_counter()
+            response = client.get('/api/exercises/', **headers)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings, len(response.content)
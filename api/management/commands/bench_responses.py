@@ -0,0 +1,82 @@
+import json
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import catalog, middleware
+from api.benchdata import seed_catalog, seed_user
+from api.perf import summarize
+from api.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Report bytes on the wire (identity, gzip and brotli) and JSON render time (stdlib vs "
+        "FastJSONRenderer) for the main GET endpoints on a synthetic user. Runs inside a "
+        "transaction that is rolled back, so it leaves the database untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000, help="Exercise logs and routine plans to seed")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed renders per renderer and endpoint")
+
+    def handle(self, *args, size, repeat, **options):
+        today = date.today()
+        start = today - timedelta(days=size)
+        endpoints = [
+            '/api/exercises/',
+            '/api/routines/',
+            '/api/routine-plans/',
+            '/api/exercise-logs/',
+            '/api/weekly-stats/historical_stats/?weeks_back=12',
+            f'/api/weekly-stats/kpi_summary/?start_date={today - timedelta(days=90)}&end_date={today}',
+        ]
+        encodings = ['identity', 'gzip'] + (['br'] if middleware.brotli else [])
+
+        client = APIClient(HTTP_HOST='localhost')
+        rows = []
+        with transaction.atomic():
+            try:
+                exercises, routines = seed_catalog("Bench response")
+                client.force_authenticate(seed_user("bench-responses", size, exercises, routines, start=start))
+                catalog.clear()
+                for path in endpoints:
+                    wire = {}
+                    for encoding in encodings:
+                        response = client.get(path, HTTP_ACCEPT_ENCODING=encoding)
+                        if response.status_code != 200:
+                            raise CommandError(f"GET {path} answered {response.status_code}")
+                        wire[encoding] = len(response.content)
+                    # The catalog is served from pre-rendered bytes, other views carry response.data
+                    data = getattr(response, 'data', None)
+                    if data is None:
+                        data = json.loads(client.get(path).content)
+                    stdlib, fast = JSONRenderer(), FastJSONRenderer()
+                    if stdlib.render(data) != fast.render(data):
+                        raise CommandError(f"GET {path}: FastJSONRenderer output differs from JSONRenderer.")
+                    rows.append((path, wire, self._time(stdlib, data, repeat), self._time(fast, data, repeat)))
+            finally:
+                catalog.clear()
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{size} logs/plans; render p50 of {repeat} runs in ms "
+            f"({'orjson' if orjson else 'orjson not installed, stdlib fallback'}); "
+            f"bytes per Accept-Encoding{'' if middleware.brotli else ' (Brotli not installed)'}:"
+        )
+        for path, wire, stdlib_ms, fast_ms in rows:
+            sizes = "  ".join(f"{encoding}={wire[encoding]}" for encoding in encodings)
+            self.stdout.write(f"  {path}")
+            self.stdout.write(f"      render stdlib={stdlib_ms:8.2f}  fast={fast_ms:8.2f}    {sizes}")
+
+    def _time(self, renderer, data, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            renderer.render(data)
+            timings.append((time.perf_counter() - started) * 1000)
+        return summarize(timings)['p50']
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from api.benchdata import seed_catalog, seed_user
+from api.models import RoutinePlan, ExerciseLog
+from api.perf import summarize
+from api.readers import exercise_log_rows, routine_plan_rows
+from api.serializers import ExerciseLogSerializer, RoutinePlanSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that the fast read path renders byte-for-byte the same JSON as the DRF serializers for "
+        "exercise logs and routine plans, then time both at several row counts. Runs inside a "
+        "transaction that is rolled back, so it leaves the database untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                            help="Row counts to benchmark (default 100 1000 10000)")
+        parser.add_argument('--repeat', type=int, default=5, help="Timed runs per path and size")
+
+    def handle(self, *args, sizes, repeat, **options):
+        renderer = JSONRenderer()
+        with transaction.atomic():
+            try:
+                exercises, routines = seed_catalog("Bench serializer")
+                results = []
+                for size in sizes:
+                    user = seed_user(f"bench-serializers-{size}", size, exercises, routines)
+                    for label, queryset, serializer_class, build_rows in (
+                        ('exercise-logs', self._logs(user), ExerciseLogSerializer, exercise_log_rows),
+                        ('routine-plans', self._plans(user), RoutinePlanSerializer, routine_plan_rows),
+                    ):
+                        # .all() clones the queryset, so every run queries afresh
+                        def serializer_path():
+                            return renderer.render(serializer_class(queryset.all(), many=True).data)
+
+                        def fast_path():
+                            return renderer.render(build_rows(queryset.all()))
+
+                        body = fast_path()
+                        if serializer_path() != body:
+                            raise CommandError(f"{label} at {size} rows: fast path output differs from the serializer.")
+                        results.append((label, size, self._time(serializer_path, repeat),
+                                        self._time(fast_path, repeat), len(body)))
+            finally:
+                transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS("Fast path output is byte-equal to the serializers."))
+        self.stdout.write(f"Query + serialize + render, p50 of {repeat} runs (ms):")
+        for label, size, slow, fast, body_bytes in results:
+            self.stdout.write(
+                f"  {label:<14} {size:>6} rows  serializer={slow:9.2f}  fast={fast:9.2f}  "
+                f"speedup={slow / fast if fast else 0:5.1f}x  bytes={body_bytes}"
+            )
+
+    def _logs(self, user):
+        # Same queryset as ExerciseLogViewSet.get_queryset
+        return ExerciseLog.objects.filter(user=user).select_related('exercise').prefetch_related(
+            'sets'
+        ).order_by('date', 'exercise__name')
+
+    def _plans(self, user):
+        # Same queryset as RoutinePlanViewSet.get_queryset
+        return RoutinePlan.objects.filter(user=user).select_related('routine').prefetch_related(
+            'routine__exercises'
+        ).order_by('date')
+
+    def _time(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return summarize(timings)['p50']
@@ -0,0 +1,142 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Q
+
+from api import llm
+from api.analysis import (
+    DEFAULT_HISTORY_WEEKS, build_week_data_for_users, fingerprint, generate_analysis, is_fresh,
+)
+from api.models import RoutinePlan, ExerciseLog, WeeklyAnalysis
+from api.perf import summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-generate weekly analyses for every user with activity in an ISO week, calling the "
+        "model concurrently. Users whose stored analysis is still fresh are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help="ISO year (default: last week's)")
+        parser.add_argument('--week', type=int, help="ISO week (default: last week)")
+        parser.add_argument('--history-weeks', type=int, default=DEFAULT_HISTORY_WEEKS)
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent model calls")
+        parser.add_argument('--rate', type=float, default=2.0, help="Maximum calls started per second (0 = unlimited)")
+        parser.add_argument('--retries', type=int, default=3, help="Retries per user after a failed call")
+        parser.add_argument('--batch-size', type=int, default=200, help="Users whose week data is built per bulk fetch")
+        parser.add_argument('--force', action='store_true', help="Regenerate fresh analyses too")
+        parser.add_argument('--fake', action='store_true', help="Use the offline fake client")
+        parser.add_argument('--fake-latency', type=float, default=0.5, help="Simulated seconds per fake call")
+
+    def handle(self, *args, **options):
+        if options['retries'] < 0:
+            raise CommandError("--retries must be 0 or more.")
+        if options['year'] is None or options['week'] is None:
+            year, week = (date.today() - timedelta(weeks=1)).isocalendar()[:2]
+        else:
+            year, week = options['year'], options['week']
+        try:
+            week_start = datetime.fromisocalendar(year, week, 1).date()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['fake']:
+            client = llm.InstrumentedClient(llm.FakeAnthropicClient(latency=options['fake_latency']))
+        elif llm.is_configured():
+            client = llm.get_client()
+        else:
+            raise CommandError("ANTHROPIC_API_KEY is not configured; pass --fake to run offline.")
+
+        week_range = [week_start, week_start + timedelta(days=6)]
+        active = Q(pk__in=RoutinePlan.objects.filter(date__range=week_range).values('user_id')) | Q(
+            pk__in=ExerciseLog.objects.filter(date__range=week_range).values('user_id')
+        )
+        users = {u.pk: u for u in get_user_model().objects.filter(active)}
+        self.stdout.write(f"W{week:02d} {year}: {len(users)} active user(s).")
+
+        limiter = _RateLimiter(options['rate'])
+        latencies, failures = [], []
+        skipped = 0
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            user_ids = sorted(users)
+            for i in range(0, len(user_ids), options['batch_size']):
+                batch = user_ids[i:i + options['batch_size']]
+                week_data = build_week_data_for_users(batch, year, week, history_weeks=options['history_weeks'])
+                stored = {
+                    a.user_id: a for a in WeeklyAnalysis.objects.filter(user_id__in=batch, year=year, week=week)
+                }
+                futures = {}
+                for user_id in batch:
+                    existing = stored.get(user_id)
+                    if not options['force'] and existing and is_fresh(existing, fingerprint(week_data[user_id])):
+                        skipped += 1
+                        continue
+                    futures[pool.submit(
+                        self._generate, users[user_id], year, week, week_data[user_id], options, client, limiter
+                    )] = user_id
+                for future in as_completed(futures):
+                    elapsed, error = future.result()
+                    if error is None:
+                        latencies.append(elapsed)
+                    else:
+                        failures.append((users[futures[future]].username, error))
+
+        wall = time.monotonic() - started
+        for username, error in failures:
+            self.stderr.write(f"Failed for {username}: {error}")
+
+        stats = summarize(latencies)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(latencies)}, skipped {skipped} fresh, failed {len(failures)} "
+            f"in {wall:.2f}s ({len(latencies) / wall if wall else 0:.2f} analyses/s)."
+        ))
+        self.stdout.write(
+            "Per-call latency: " + ", ".join(
+                f"{key}={stats[key]:.3f}s" for key in ('mean', 'p50', 'p90', 'p95', 'p99', 'max')
+            )
+        )
+
+    def _generate(self, user, year, week, week_data, options, client, limiter):
+        """Returns (seconds for the successful attempt, None) or (None, last error)."""
+        try:
+            for attempt in range(options['retries'] + 1):
+                limiter.wait()
+                started = time.monotonic()
+                try:
+                    generate_analysis(user, year, week, client=client, week_data=week_data)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    if attempt < options['retries']:
+                        time.sleep(min(2 ** attempt, 30) * random.uniform(0.5, 1.5))
+                else:
+                    return time.monotonic() - started, None
+            return None, error
+        finally:
+            connections.close_all()
+
+
+class _RateLimiter:
+    """Spaces call starts at least 1/rate seconds apart across all worker threads."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(max(slot - now, 0))
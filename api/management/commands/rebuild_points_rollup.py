@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.models import DailyPointsRollup
+from api.rollups import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyPointsRollup table from the raw RoutinePlan and ExerciseLog rows, one user per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help="Only rebuild the given user id (may be repeated)")
+
+    def handle(self, *args, user_ids=None, **options):
+        count = rebuild_all(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt daily points rollup for {count} user(s); {DailyPointsRollup.objects.count()} row(s) total."
+        ))
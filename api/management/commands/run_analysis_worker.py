@@ -0,0 +1,72 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from api import llm
+from api.analysis import claim_next_job, run_job
+from api.models import AnalysisJob
+
+
+class Command(BaseCommand):
+    help = "Drain queued AnalysisJob rows, generating weekly analyses on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Concurrent LLM calls (default 4)")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds between queue polls when idle")
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+        parser.add_argument('--requeue-after', type=int, default=600,
+                            help="Requeue jobs left running for this many seconds by a dead worker")
+
+    def handle(self, *args, threads, poll_interval, once, requeue_after, **options):
+        requeued = AnalysisJob.objects.filter(
+            status=AnalysisJob.STATUS_RUNNING,
+            started_at__lt=timezone.now() - timedelta(seconds=requeue_after),
+        ).update(status=AnalysisJob.STATUS_PENDING, started_at=None)
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        client = llm.get_client()  # shared across threads; the HTTP client is thread-safe
+        self.stdout.write(f"Analysis worker started with {threads} thread(s).")
+
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            try:
+                while True:
+                    while len(in_flight) < threads:
+                        job = claim_next_job()
+                        if job is None:
+                            break
+                        in_flight.add(pool.submit(self._run, job, client))
+
+                    if not in_flight:
+                        if once:
+                            break
+                        time.sleep(poll_interval)
+                        continue
+
+                    done, in_flight = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._report(future.result())
+            except KeyboardInterrupt:
+                self.stdout.write(f"Interrupted; finishing {len(in_flight)} running job(s).")
+                for future in in_flight:
+                    self._report(future.result())
+
+    def _run(self, job, client):
+        try:
+            return run_job(job, client=client)
+        finally:
+            # Each pool thread holds its own DB connection
+            connections.close_all()
+
+    def _report(self, job):
+        elapsed = (job.finished_at - job.started_at).total_seconds()
+        line = f"Job {job.pk} ({job.user.username} W{job.week:02d} {job.year}) {job.status} in {elapsed:.2f}s"
+        if job.status == AnalysisJob.STATUS_FAILED:
+            self.stderr.write(f"{line}: {job.error}")
+        else:
+            self.stdout.write(self.style.SUCCESS(line))
@@ -0,0 +1,92 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api import catalog
+from api.benchdata import seed_training_catalog, seed_training_history
+from api.models import (
+    Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget, DailyPointsRollup, WeeklyAnalysis,
+    AnalysisJob, Tombstone, DataVersion,
+)
+from api.versions import bump, user_key
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate users named <prefix>-0000, <prefix>-0001, ... with years of routine plans, "
+        "exercise logs, sets and weekly targets ending today, for local latency work (see bench_api). "
+        "Uses the existing routines, or creates a synthetic catalog when there are none."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--years', type=float, default=2, help="History per user, ending today")
+        parser.add_argument('--prefix', default='seed', help="Username prefix (default 'seed')")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data")
+        parser.add_argument('--clear', action='store_true', help="Delete earlier users with this prefix first")
+
+    def handle(self, *args, users, years, prefix, seed, clear, **options):
+        User = get_user_model()
+        existing = User.objects.filter(username__startswith=f"{prefix}-")
+        if existing.exists():
+            if not clear:
+                raise CommandError(f"{existing.count()} '{prefix}-*' users already exist; pass --clear to replace them.")
+            self._delete(existing)
+
+        routine_exercises = {
+            routine: list(routine.exercises.all())
+            for routine in Routine.objects.prefetch_related('exercises')
+        }
+        routine_exercises = {routine: exercises for routine, exercises in routine_exercises.items() if exercises}
+        if not routine_exercises:
+            _, routines = seed_training_catalog()
+            routine_exercises = {routine: list(routine.exercises.all()) for routine in routines}
+            catalog.clear()
+            bump(catalog.CATALOG_KEY)  # bulk_create sends no signals
+
+        rng = random.Random(seed)
+        end = date.today()
+        start = end - timedelta(days=round(365 * years))
+        year, week = end.isocalendar()[:2]
+        totals = {}
+        started = time.perf_counter()
+        for i in range(users):
+            with transaction.atomic():
+                user = User.objects.create_user(f"{prefix}-{i:04d}")
+                counts = seed_training_history(user, rng, routine_exercises, start, end)
+                # A stored analysis for this week, so GET weekly-stats/analysis/ does its freshness check
+                WeeklyAnalysis.objects.create(user=user, year=year, week=week, content={
+                    'summary': "Seeded analysis.", 'observations': [], 'suggestions': [],
+                })
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"Seeded {users} user(s) from {start} to {end} in {elapsed:.1f}s: "
+            + ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in totals.items())
+        )
+
+    def _delete(self, users):
+        user_ids = list(users.values_list('pk', flat=True))
+        with transaction.atomic():
+            # The rows are throwaway: skip the per-row delete signals (tombstones, rollup
+            # refreshes) a cascading delete of years of history would run
+            for queryset in (
+                ExerciseSet.objects.filter(exercise_log__user__in=user_ids),
+                ExerciseLog.objects.filter(user__in=user_ids),
+                RoutinePlan.objects.filter(user__in=user_ids),
+                TopDownWeeklyTarget.objects.filter(user__in=user_ids),
+                DailyPointsRollup.objects.filter(user__in=user_ids),
+                WeeklyAnalysis.objects.filter(user__in=user_ids),
+                AnalysisJob.objects.filter(user__in=user_ids),
+                Tombstone.objects.filter(user__in=user_ids),
+            ):
+                queryset._raw_delete(queryset.db)
+            DataVersion.objects.filter(key__in=[user_key(user_id) for user_id in user_ids]).delete()
+            users.model.objects.filter(pk__in=user_ids).delete()
+        self.stdout.write(f"Deleted {len(user_ids)} earlier user(s).")
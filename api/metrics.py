@@ -0,0 +1,188 @@
+"""
+Per-request timings (for the Server-Timing header) and per-view aggregates in Prometheus text
+format (for the staff-only /metrics endpoint).
+
+ServerTimingMiddleware starts a RequestTimings for each request; code that does measurable
+work outside the database wraps it in `timed('serialize')` or `timed('external')`, which is a
+no-op outside a request. Aggregates live in process memory, so each worker reports its own
+counters, as Prometheus expects from a multi-process server scraped per instance.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+_lock = threading.Lock()
+_views = {}
+
+
+class RequestTimings:
+    """Time spent by one request, in seconds, by kind."""
+    __slots__ = ('db_queries', 'db', 'serialize', 'external')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.external = 0.0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """For connection.execute_wrapper(): count and time every query."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.db_queries += 1
+
+    def server_timing(self, total):
+        """Server-Timing header value (durations in milliseconds)."""
+        parts = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={self.db * 1000:.1f};desc="{self.db_queries} queries"',
+            f'ser;dur={self.serialize * 1000:.1f}',
+        ]
+        if self.external:
+            parts.append(f'ext;dur={self.external * 1000:.1f}')
+        return ', '.join(parts)
+
+
+@contextlib.contextmanager
+def request_timings():
+    """Collect timed() work of the current request (or task) into a fresh RequestTimings."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def timed(kind):
+    """Add the block's duration to the current request's `kind` ('serialize' or 'external')."""
+    if _current.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(kind, time.perf_counter() - started)
+
+
+def add_time(kind, seconds):
+    """Add `seconds` to the current request's `kind`, for work that does not fit in a with block."""
+    timings = _current.get()
+    if timings is not None:
+        setattr(timings, kind, getattr(timings, kind) + seconds)
+
+
+class _ViewMetrics:
+    __slots__ = ('duration_buckets', 'duration_sum', 'count', 'query_buckets', 'queries',
+                 'db', 'serialize', 'external', 'statuses')
+
+    def __init__(self):
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_sum = 0.0
+        self.count = 0
+        self.query_buckets = [0] * len(QUERY_BUCKETS)
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.external = 0.0
+        self.statuses = {}
+
+
+def record(view, method, status, total, timings):
+    """Add one finished request to the aggregates of (view, method)."""
+    with _lock:
+        metrics = _views.get((view, method))
+        if metrics is None:
+            metrics = _views[(view, method)] = _ViewMetrics()
+        _observe(metrics.duration_buckets, DURATION_BUCKETS, total)
+        _observe(metrics.query_buckets, QUERY_BUCKETS, timings.db_queries)
+        metrics.duration_sum += total
+        metrics.count += 1
+        metrics.queries += timings.db_queries
+        metrics.db += timings.db
+        metrics.serialize += timings.serialize
+        metrics.external += timings.external
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+
+def _observe(counts, bounds, value):
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            counts[i] += 1
+            return
+
+
+def reset():
+    """Forget all aggregates (tests, or a shell)."""
+    with _lock:
+        _views.clear()
+
+
+def render():
+    """All aggregates in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        views = [(view, method, _copy(metrics)) for (view, method), metrics in sorted(_views.items())]
+
+    lines = []
+
+    def family(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+
+    def histogram(name, help_text, buckets, counts_of, sum_of):
+        samples = []
+        for view, method, metrics in views:
+            labels = _labels(view=view, method=method)
+            cumulative = 0
+            for bound, count in zip(buckets, counts_of(metrics)):
+                cumulative += count
+                samples.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            samples.append(f'{name}_bucket{{{labels},le="+Inf"}} {metrics.count}')
+            samples.append(f'{name}_sum{{{labels}}} {sum_of(metrics)}')
+            samples.append(f'{name}_count{{{labels}}} {metrics.count}')
+        family(name, 'histogram', help_text, samples)
+
+    def counter(name, help_text, value_of):
+        family(name, 'counter', help_text, [
+            f'{name}{{{_labels(view=view, method=method)}}} {value_of(metrics)}' for view, method, metrics in views
+        ])
+
+    family('http_requests_total', 'counter', 'Requests by view, method and status code.', [
+        f'http_requests_total{{{_labels(view=view, method=method, status=status)}}} {count}'
+        for view, method, metrics in views
+        for status, count in sorted(metrics.statuses.items())
+    ])
+    histogram('http_request_duration_seconds', 'Time spent in the middleware stack and view.',
+              DURATION_BUCKETS, lambda m: m.duration_buckets, lambda m: m.duration_sum)
+    histogram('http_request_db_queries', 'Database queries per request.',
+              QUERY_BUCKETS, lambda m: m.query_buckets, lambda m: m.queries)
+    counter('http_request_db_seconds_total', 'Time spent executing database queries.', lambda m: m.db)
+    counter('http_request_serialize_seconds_total', 'Time spent rendering response bodies.', lambda m: m.serialize)
+    counter('http_request_external_seconds_total', 'Time spent in external (LLM) calls.', lambda m: m.external)
+    return '\n'.join(lines) + '\n'
+
+
+def _copy(metrics):
+    copy = _ViewMetrics()
+    for name in _ViewMetrics.__slots__:
+        value = getattr(metrics, name)
+        setattr(copy, name, value.copy() if isinstance(value, (list, dict)) else value)
+    return copy
+
+
+def _labels(**values):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in values.items()
+    )
@@ -0,0 +1,184 @@
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+import cProfile
+import random
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import metrics, profiling
+
+_COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'image/svg+xml')
+# Anything else is reported as 'other', so odd methods cannot grow the /metrics label set
+_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class ServerTimingMiddleware:
+    """
+    Time each request and report it in a Server-Timing header: total, db (with the query
+    count), ser (response rendering) and ext (LLM calls, when there were any). The same figures
+    are aggregated per view for /metrics. Place it first, so the total covers every other
+    middleware; for streaming responses it covers the time until streaming starts.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with metrics.request_timings() as timings, connection.execute_wrapper(timings.execute_wrapper):
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = timings.server_timing(total)
+        match = request.resolver_match
+        metrics.record(
+            (match.view_name or match._func_path) if match else 'unmatched',
+            request.method if request.method in _METHODS else 'other',
+            response.status_code, total, timings,
+        )
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Compress buffered responses of at least COMPRESSION_MIN_BYTES with brotli (when installed)
+    or gzip, following the client's Accept-Encoding.
+
+    Streaming responses are left alone: WhiteNoise serves its own pre-compressed files and the
+    Server-Sent Events stream must reach the client event by event. Place it just below
+    SecurityMiddleware so the CORS headers added further down are kept untouched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not response.get('Content-Type', '').startswith(_COMPRESSIBLE_TYPES)
+            or len(response.content) < settings.COMPRESSION_MIN_BYTES
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding == 'br':
+            compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        elif encoding == 'gzip':
+            # Same BREACH mitigation (random filler bytes) as Django's GZipMiddleware
+            compressed = compress_string(response.content, max_random_bytes=GZipMiddleware.max_random_bytes)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The representation changed, so a strong validator has to become weak (RFC 9110 8.8.1)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick 'br', 'gzip' or None from an Accept-Encoding header, honouring q=0 and preferring brotli."""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    for coding in ('br', 'gzip') if brotli else ('gzip',):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Run a request under cProfile and record its SQL when a staff user adds ?profile=1 (admin
+    session or staff JWT), or for a PROFILING_SAMPLE_RATE fraction of all requests. Staff
+    profiles are always stored and named in an X-Profile-Report header; sampled ones only when
+    the request took at least PROFILING_SLOW_MS. Reports are listed at /admin/profiles/.
+
+    PROFILING_ENABLED=false removes the middleware at startup. Otherwise a request that is not
+    profiled costs a substring check of the query string, plus a random() call when sampling
+    is on. Place it below AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if 'profile=1' in request.META.get('QUERY_STRING', '') and request.GET.get('profile') == '1' and _is_staff(request):
+            return self._profile(request, 'staff')
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self._profile(request, 'sampled')
+        return self.get_response(request)
+
+    def _profile(self, request, trigger):
+        profiler = cProfile.Profile()
+        recorder = profiling.SQLRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is already active in this thread
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        if trigger == 'staff' or duration_ms >= settings.PROFILING_SLOW_MS:
+            user = getattr(request, 'user', None)
+            match = request.resolver_match
+            name = profiling.save_report({
+                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'trigger': trigger,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view': match.view_name if match else None,
+                'user': user.get_username() if user is not None and user.is_authenticated else None,
+                'status': response.status_code,
+                'duration_ms': round(duration_ms, 3),
+            }, profiler, recorder)
+            if trigger == 'staff':
+                response['X-Profile-Report'] = name
+        return response
+
+
+def _is_staff(request):
+    """Whether the admin session or the request's JWT belongs to an active staff user."""
+    if request.user.is_active and request.user.is_staff:
+        return True
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_active and authenticated[0].is_staff
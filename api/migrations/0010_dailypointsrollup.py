@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_exerciseset'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPointsRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('planned_points', models.PositiveIntegerField(default=0)),
+                ('completed_points', models.PositiveIntegerField(default=0)),
+                ('completed_planned_points', models.PositiveIntegerField(default=0, help_text='Completed points matched against a planned occurrence of the exercise in the same ISO week')),
+                ('completed_unplanned_points', models.PositiveIntegerField(default=0, help_text='Completed points exceeding the planned occurrences of the exercise in the same ISO week')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Points Rollup',
+                'verbose_name_plural': 'Daily Points Rollups',
+                'ordering': ['date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weeklyanalysis',
+            name='input_hash',
+            field=models.CharField(blank=True, help_text='SHA-256 of the week data and prompt version the content was generated from', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='weeklyanalysis',
+            name='prompt_version',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Prompt template version used for the content'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_weeklyanalysis_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisCallLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField(blank=True, null=True)),
+                ('week', models.PositiveIntegerField(blank=True, help_text='ISO 8601 week number of the analysed week', null=True)),
+                ('model', models.CharField(max_length=100)),
+                ('streamed', models.BooleanField(default=False)),
+                ('latency_ms', models.PositiveIntegerField()),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('success', models.BooleanField(default=True)),
+                ('failure_reason', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Analysis Call Log',
+                'verbose_name_plural': 'Analysis Call Logs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_exerciselog_user_date_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(help_text='sync/ collection the row belonged to', max_length=32)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'ordering': ['deleted_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='exerciselog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Last change, for delta sync'),
+        ),
+        migrations.AddField(
+            model_name='exerciseset',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Last change, for delta sync'),
+        ),
+        migrations.AddField(
+            model_name='routineplan',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Last change, for delta sync'),
+        ),
+        migrations.AddField(
+            model_name='topdownweeklytarget',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Last change, for delta sync'),
+        ),
+        migrations.AddIndex(
+            model_name='exerciselog',
+            index=models.Index(fields=['user', 'updated_at'], name='exerciselog_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='routineplan',
+            index=models.Index(fields=['user', 'updated_at'], name='routineplan_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topdownweeklytarget',
+            index=models.Index(fields=['user', 'updated_at'], name='weeklytarget_user_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:21
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_duplicate_jobs(apps, schema_editor):
+    """Keep the newest unfinished job per user and week; the constraint below allows only one."""
+    AnalysisJob = apps.get_model('api', 'AnalysisJob')
+    seen = set()
+    duplicates = []
+    for job_id, user_id, year, week in AnalysisJob.objects.filter(status__in=['pending', 'running']).order_by(
+        '-created_at', '-pk'
+    ).values_list('pk', 'user_id', 'year', 'week').iterator():
+        if (user_id, year, week) in seen:
+            duplicates.append(job_id)
+        seen.add((user_id, year, week))
+    AnalysisJob.objects.filter(pk__in=duplicates).update(
+        status='failed', error='Superseded by a newer job for the same week', finished_at=timezone.now(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_sync_change_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='analysisjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('user', 'year', 'week'), name='analysisjob_one_unfinished_per_week'),
+        ),
+    ]
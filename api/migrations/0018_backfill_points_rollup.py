@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def backfill_points_rollup(apps, schema_editor):
+    """
+    Fill DailyPointsRollup for existing data: the stats, KPI and analysis endpoints read only
+    the rollup. This runs the same code as `manage.py rebuild_points_rollup` (and so the live
+    models) rather than a copy of it, so the backfill cannot drift from what the signal
+    handlers maintain. On an empty database it finds no users and does nothing.
+    """
+    from api.rollups import rebuild_all
+    rebuild_all()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_analysisjob_one_unfinished_per_week'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_points_rollup, migrations.RunPython.noop),
+    ]
@@ -85,10 +85,12 @@ class RoutinePlan(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     routine = models.ForeignKey(Routine, on_delete=models.CASCADE)
     date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last change, for delta sync")
 
     class Meta:
         # Ensure a user can only plan one routine per day
         unique_together = ('user', 'date')
+        indexes = [models.Index(fields=['user', 'updated_at'], name='routineplan_user_updated_idx')]
         ordering = ['date']
         verbose_name = "Routine Plan"
         verbose_name_plural = "Routine Plans"
@@ -103,10 +105,16 @@ class ExerciseLog(models.Model):
     exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
     date = models.DateField()
     completed = models.BooleanField(default=False, help_text="Indicates if the exercise was completed on this date")
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last change, for delta sync")
 
     class Meta:
         # Ensure only one log entry per user, exercise, and date
         unique_together = ('user', 'exercise', 'date')
+        indexes = [
+            # Serves per-user date-range scans and keyset pagination on (date, exercise__name, id)
+            models.Index(fields=['user', 'date'], name='exerciselog_user_date_idx'),
+            models.Index(fields=['user', 'updated_at'], name='exerciselog_user_updated_idx'),
+        ]
         ordering = ['date', 'exercise__name']
         verbose_name = "Exercise Log"
         verbose_name_plural = "Exercise Logs"
@@ -123,6 +131,7 @@ class ExerciseSet(models.Model):
     reps = models.PositiveSmallIntegerField()
     weight_kg = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, help_text="Last change, for delta sync")
 
     class Meta:
         ordering = ['set_number']
@@ -144,10 +153,12 @@ class TopDownWeeklyTarget(models.Model):
         validators=[MinValueValidator(0)],
         help_text="The target training points for the week"
     )
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last change, for delta sync")
 
     class Meta:
         # Ensure only one target per user, year, and week
         unique_together = ('user', 'year', 'week')
+        indexes = [models.Index(fields=['user', 'updated_at'], name='weeklytarget_user_updated_idx')]
         ordering = ['year', 'week']
         verbose_name = "Top-Down Weekly Target"
         verbose_name_plural = "Top-Down Weekly Targets"
@@ -162,6 +173,8 @@ class WeeklyAnalysis(models.Model):
     year = models.PositiveIntegerField()
     week = models.PositiveIntegerField(help_text="ISO 8601 week number")
     content = models.JSONField(help_text="Structured analysis: summary, observations, suggestions")
+    input_hash = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the week data and prompt version the content was generated from")
+    prompt_version = models.PositiveSmallIntegerField(default=0, help_text="Prompt template version used for the content")
     generated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -172,3 +185,135 @@ class WeeklyAnalysis(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - W{self.week:02d} {self.year}"
+
+
+class DailyPointsRollup(models.Model):
+    """
+    Denormalised per-user, per-day training point totals backing the weekly stats endpoints.
+    Maintained incrementally by the signal handlers in api/signals.py; rebuild with
+    `manage.py rebuild_points_rollup`.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    date = models.DateField()
+    planned_points = models.PositiveIntegerField(default=0)
+    completed_points = models.PositiveIntegerField(default=0)
+    completed_planned_points = models.PositiveIntegerField(
+        default=0,
+        help_text="Completed points matched against a planned occurrence of the exercise in the same ISO week"
+    )
+    completed_unplanned_points = models.PositiveIntegerField(
+        default=0,
+        help_text="Completed points exceeding the planned occurrences of the exercise in the same ISO week"
+    )
+
+    class Meta:
+        unique_together = ('user', 'date')
+        ordering = ['date']
+        verbose_name = "Daily Points Rollup"
+        verbose_name_plural = "Daily Points Rollups"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}: {self.completed_points}/{self.planned_points} points"
+
+
+class DataVersion(models.Model):
+    """
+    Monotonically increasing change counter used to build ETags for derived endpoints.
+    Keys are 'user:<id>' for a user's own rows and 'global' for the shared exercise/routine catalog.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Data Version"
+        verbose_name_plural = "Data Versions"
+
+    def __str__(self):
+        return f"{self.key}: v{self.version}"
+
+
+class AnalysisJob(models.Model):
+    """Queued request to (re)generate a WeeklyAnalysis, drained by `manage.py run_analysis_worker`."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    UNFINISHED_STATUSES = [STATUS_PENDING, STATUS_RUNNING]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    year = models.PositiveIntegerField()
+    week = models.PositiveIntegerField(help_text="ISO 8601 week number")
+    history_weeks = models.PositiveSmallIntegerField(default=4, help_text="Weeks of history included in the prompt")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+        constraints = [
+            # At most one queued or running job per user and week, even when two requests race
+            models.UniqueConstraint(
+                fields=['user', 'year', 'week'], condition=models.Q(status__in=['pending', 'running']),
+                name='analysisjob_one_unfinished_per_week',
+            ),
+        ]
+        verbose_name = "Analysis Job"
+        verbose_name_plural = "Analysis Jobs"
+
+    def __str__(self):
+        return f"{self.user.username} - W{self.week:02d} {self.year}: {self.status}"
+
+
+class AnalysisCallLog(models.Model):
+    """One LLM call made for weekly analysis generation, with its latency and token usage."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    year = models.PositiveIntegerField(null=True, blank=True)
+    week = models.PositiveIntegerField(null=True, blank=True, help_text="ISO 8601 week number of the analysed week")
+    model = models.CharField(max_length=100)
+    streamed = models.BooleanField(default=False)
+    latency_ms = models.PositiveIntegerField()
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    success = models.BooleanField(default=True)
+    failure_reason = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Analysis Call Log"
+        verbose_name_plural = "Analysis Call Logs"
+
+    def __str__(self):
+        outcome = "ok" if self.success else "failed"
+        return f"{self.model} {outcome} in {self.latency_ms}ms ({self.input_tokens}+{self.output_tokens} tokens)"
+
+
+class Tombstone(models.Model):
+    """
+    Marker left when a synced row (exercise log, set, routine plan or weekly target) is deleted,
+    so sync/ can tell clients to drop it. Pruned after SYNC_TOMBSTONE_RETENTION_DAYS.
+    """
+    # No database constraint: tombstones written while the user itself is being deleted must not
+    # block that delete. Leftovers are removed by prune_sync_tombstones.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+',
+    )
+    collection = models.CharField(max_length=32, help_text="sync/ collection the row belonged to")
+    object_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx')]
+
+    def __str__(self):
+        return f"{self.collection} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
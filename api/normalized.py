@@ -0,0 +1,45 @@
+"""Sideloaded payloads for ?format=normalized: each routine and exercise is serialized once."""
+from collections import defaultdict
+
+from .models import Exercise, Routine
+from .serializers import ExerciseSerializer
+
+
+def routines_and_exercises(routine_ids):
+    """
+    Return ({routine_id: {'id', 'name', 'exercises': [ids]}}, {exercise_id: exercise}) for the
+    given routines in three queries. Map keys are strings, as they will be in the JSON.
+    """
+    routine_ids = set(routine_ids)
+    members = defaultdict(list)
+    for routine_id, exercise_id in Routine.exercises.through.objects.filter(
+        routine_id__in=routine_ids
+    ).order_by('exercise__name').values_list('routine_id', 'exercise_id'):
+        members[routine_id].append(exercise_id)
+
+    routines = {
+        str(routine_id): {'id': routine_id, 'name': name, 'exercises': members[routine_id]}
+        for routine_id, name in Routine.objects.filter(pk__in=routine_ids).values_list('id', 'name')
+    }
+    exercise_ids = {exercise_id for ids in members.values() for exercise_id in ids}
+    exercises = {
+        str(data['id']): data
+        for data in ExerciseSerializer(Exercise.objects.filter(pk__in=exercise_ids), many=True).data
+    }
+    return routines, exercises
+
+
+def normalized_plans(plans):
+    """{'routine_plans': [...], 'routines': {...}, 'exercises': {...}} for a RoutinePlan queryset."""
+    rows = list(plans.values('id', 'user', 'routine', 'date'))
+    routines, exercises = routines_and_exercises(row['routine'] for row in rows)
+    for row in rows:
+        row['date'] = row['date'].isoformat()
+    return {'routine_plans': rows, 'routines': routines, 'exercises': exercises}
+
+
+def normalized_routines(queryset):
+    """{'routines': [...], 'exercises': {...}} for a Routine queryset, keeping its order."""
+    routine_ids = list(queryset.values_list('id', flat=True))
+    routines, exercises = routines_and_exercises(routine_ids)
+    return {'routines': [routines[str(pk)] for pk in routine_ids], 'exercises': exercises}
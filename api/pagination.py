@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+from datetime import date
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset (cursor) pagination over a unique composite `ordering`.
+
+    Only active when the request passes ?cursor= or ?page_size=, so clients that expect a plain
+    list keep getting one. Pages are fetched with a `WHERE (a, b, c) > (...)` style filter
+    instead of OFFSET, so deep pages cost the same as the first one given a matching index.
+    Responses look like {"next": <url or null>, "results": [...]}.
+    """
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    default_page_size = 100
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor, queryset.model)))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.next_position = None
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            self.next_position = [self._position_value(rows[-1], field) for field in self.ordering]
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.default_page_size))
+        except ValueError:
+            size = self.default_page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def encode_cursor(self, position):
+        raw = json.dumps([v.isoformat() if isinstance(v, date) else v for v in position])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, model):
+        """The position in `cursor`, each value parsed by its ordering field of `model`."""
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if not isinstance(position, list) or len(position) != len(self.ordering) or None in position:
+                raise ValueError(position)
+            return [
+                self._ordering_field(model, field).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (binascii.Error, ValidationError, TypeError, ValueError):
+            # A cursor we did not issue, e.g. ["notadate", "a", 1]: a 404 rather than a 500
+            raise NotFound('Invalid cursor')
+
+    def _after(self, position):
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        clauses = []
+        for i, field in enumerate(self.ordering):
+            equal = {f: v for f, v in zip(self.ordering[:i], position[:i])}
+            clauses.append(Q(**equal, **{f'{field}__gt': position[i]}))
+        return reduce(or_, clauses)
+
+    @staticmethod
+    def _ordering_field(model, field):
+        *path, last = field.split('__')
+        for name in path:
+            model = model._meta.get_field(name).related_model
+        return model._meta.get_field(last)
+
+    @staticmethod
+    def _position_value(obj, field):
+        *path, last = field.split('__')
+        for name in path:
+            obj = getattr(obj, name)
+        # Foreign keys are compared by id, without loading the related row
+        if hasattr(obj, f'{last}_id'):
+            return getattr(obj, f'{last}_id')
+        return getattr(obj, last)
+
+
+class ExerciseLogPagination(KeysetPagination):
+    ordering = ('date', 'exercise__name', 'id')
+
+
+class RoutinePlanPagination(KeysetPagination):
+    ordering = ('date', 'id')
+
+
+class ExerciseSetPagination(KeysetPagination):
+    ordering = ('exercise_log', 'set_number')
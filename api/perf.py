@@ -0,0 +1,23 @@
+"""Small helpers for summarising latency samples."""
+import math
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted sequence (0 for an empty one)."""
+    if not sorted_values:
+        return 0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(values, pcts=(50, 90, 95, 99)):
+    """{'count', 'mean', 'p50', ..., 'max'} for a list of numbers."""
+    ordered = sorted(values)
+    summary = {
+        'count': len(ordered),
+        'mean': sum(ordered) / len(ordered) if ordered else 0,
+    }
+    for pct in pcts:
+        summary[f'p{pct}'] = percentile(ordered, pct)
+    summary['max'] = ordered[-1] if ordered else 0
+    return summary
@@ -0,0 +1,112 @@
+"""
+Profiling reports written by ProfilingMiddleware: cProfile statistics plus every SQL query of
+one request, kept in PROFILING_DIR as a ring buffer of the newest PROFILING_MAX_REPORTS.
+
+Each report is a <name>.json (request details, the SQL list and the top of the profile as
+text) and a <name>.prof (the raw stats, for pstats or snakeviz). Names sort chronologically.
+"""
+import io
+import json
+import os
+import pstats
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.http import Http404
+
+# Profile lines kept in the JSON report (sorted by cumulative time); the .prof file has them all
+PROFILE_LINES = 60
+# Queries kept per report; the count and total time still cover all of them
+MAX_QUERIES = 2000
+DOWNLOAD_KINDS = ('json', 'prof')
+
+_NAME = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{8}$')
+_lock = threading.Lock()
+
+
+class SQLRecorder:
+    """connection.execute_wrapper() that keeps every query with its parameters and duration."""
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.total += elapsed
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'sql': sql,
+                    'params': repr(params)[:500],
+                    'many': many,
+                    'ms': round(elapsed * 1000, 3),
+                })
+
+
+def save_report(details, profiler, recorder):
+    """Store a report of `details` (a dict about the request) and return its name."""
+    directory = Path(settings.PROFILING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{secrets.token_hex(4)}"
+
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(PROFILE_LINES)
+    report = {
+        'name': name,
+        **details,
+        'queries': recorder.count,
+        'db_ms': round(recorder.total * 1000, 3),
+        'sql': recorder.queries,
+        'profile': text.getvalue(),
+    }
+    profiler.dump_stats(directory / f'{name}.prof')
+    # Written under a temporary name, so the list page never reads half a report
+    partial = directory / f'{name}.json.tmp'
+    partial.write_text(json.dumps(report, indent=1, default=str))
+    os.replace(partial, directory / f'{name}.json')
+    _prune(directory)
+    return name
+
+
+def _prune(directory):
+    with _lock:
+        names = sorted(path.stem for path in directory.glob('*.json'))
+        for name in names[:max(len(names) - settings.PROFILING_MAX_REPORTS, 0)]:
+            for kind in DOWNLOAD_KINDS:
+                (directory / f'{name}.{kind}').unlink(missing_ok=True)
+
+
+def list_reports():
+    """The stored reports without their SQL and profile text, newest first."""
+    directory = Path(settings.PROFILING_DIR)
+    reports = []
+    for path in sorted(directory.glob('*.json'), reverse=True):
+        try:
+            report = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # pruned or replaced meanwhile
+        report.pop('sql', None)
+        report.pop('profile', None)
+        reports.append(report)
+    return reports
+
+
+def report_file(name, kind):
+    """Path of one stored report file; Http404 for unknown or malformed names."""
+    if kind not in DOWNLOAD_KINDS or not _NAME.match(name):
+        raise Http404("No such profiling report")
+    path = Path(settings.PROFILING_DIR) / f'{name}.{kind}'
+    if not path.is_file():
+        raise Http404("No such profiling report")
+    return path
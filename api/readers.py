@@ -0,0 +1,92 @@
+"""
+Read-only fast paths for the hot list endpoints and sync/.
+
+They build the same JSON as the model serializers (same keys, order and value formats) from .values() rows, skipping DRF's per-row field objects and model
+instances. `python manage.py bench_serializers` checks the output stays byte-equal.
+"""
+from collections import defaultdict
+
+from .models import Exercise, ExerciseSet, Routine
+from .serializers import ExerciseSerializer, ExerciseSetSerializer, TopDownWeeklyTargetSerializer
+
+_EXERCISE_FIELDS = ExerciseSerializer.Meta.fields
+# Formats weights exactly like the serializer does (string with two decimals by default)
+_weight_field = ExerciseSetSerializer().fields['weight_kg']
+
+
+def exercise_log_rows(queryset):
+    """ExerciseLogSerializer(queryset, many=True).data as plain dicts, in two queries."""
+    logs = list(
+        queryset.prefetch_related(None)
+        .values_list('id', 'user', 'exercise', 'exercise__name', 'date', 'completed')
+    )
+    sets = defaultdict(list)
+    for row in exercise_set_rows(
+        ExerciseSet.objects.filter(exercise_log__in=[log[0] for log in logs]).order_by('set_number')
+    ):
+        sets[row['exercise_log']].append(row)
+    return [
+        {
+            'id': log_id,
+            'user': user_id,
+            'exercise': exercise_id,
+            'exercise_name': exercise_name,
+            'date': day.isoformat(),
+            'completed': completed,
+            'sets': sets.get(log_id, []),
+        }
+        for log_id, user_id, exercise_id, exercise_name, day, completed in logs
+    ]
+
+
+def exercise_set_rows(queryset):
+    """ExerciseSetSerializer(queryset, many=True).data as plain dicts, in one query."""
+    to_weight = _weight_field.to_representation
+    return [
+        {
+            'id': set_id,
+            'exercise_log': log_id,
+            'set_number': set_number,
+            'reps': reps,
+            'weight_kg': None if weight_kg is None else to_weight(weight_kg),
+            'completed': completed,
+        }
+        for set_id, log_id, set_number, reps, weight_kg, completed in queryset.values_list(
+            'id', 'exercise_log', 'set_number', 'reps', 'weight_kg', 'completed'
+        )
+    ]
+
+
+def weekly_target_rows(queryset):
+    """TopDownWeeklyTargetSerializer(queryset, many=True).data as plain dicts, in one query."""
+    return list(queryset.values(*TopDownWeeklyTargetSerializer.Meta.fields))
+
+
+def routine_plan_rows(queryset):
+    """RoutinePlanSerializer(queryset, many=True).data as plain dicts, in three queries."""
+    plans = list(
+        queryset.prefetch_related(None).values_list('id', 'user', 'routine', 'routine__name', 'date')
+    )
+    members = defaultdict(list)
+    for routine_id, exercise_id in Routine.exercises.through.objects.filter(
+        routine_id__in={plan[2] for plan in plans}
+    ).order_by('exercise__name').values_list('routine_id', 'exercise_id'):
+        members[routine_id].append(exercise_id)
+
+    exercise_ids = {exercise_id for ids in members.values() for exercise_id in ids}
+    exercises = {
+        row['id']: row for row in Exercise.objects.filter(pk__in=exercise_ids).values(*_EXERCISE_FIELDS)
+    }
+    # One list per routine, shared by every plan of that routine
+    details = {routine_id: [exercises[pk] for pk in ids] for routine_id, ids in members.items()}
+    return [
+        {
+            'id': plan_id,
+            'user': user_id,
+            'routine': routine_id,
+            'routine_name': routine_name,
+            'exercises_details': details.get(routine_id, []),
+            'date': day.isoformat(),
+        }
+        for plan_id, user_id, routine_id, routine_name, day in plans
+    ]
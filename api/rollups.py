@@ -0,0 +1,145 @@
+"""
+Maintenance of the DailyPointsRollup table.
+
+Rollup rows are always recomputed for whole ISO weeks: planned-vs-completed matching is done
+per exercise across the week (the first N completions of an exercise planned N times in a week
+count as planned, the rest as unplanned), so the weekly sums of the per-day columns match the
+week-level figures the stats endpoints report.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+
+from .models import Routine, RoutinePlan, ExerciseLog, DailyPointsRollup
+
+
+def week_start_of(day):
+    """Monday of the ISO week containing `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def compute_daily_points(user_id, start=None, end=None):
+    """
+    Compute rollup values for one user from the raw plan/log tables.
+
+    `start` and `end` should be Monday/Sunday aligned so that every week is seen in full.
+    Returns {date: {'planned_points', 'completed_points', 'completed_planned_points',
+    'completed_unplanned_points'}} containing only the days that have any points.
+    """
+    plans = RoutinePlan.objects.filter(user_id=user_id)
+    logs = ExerciseLog.objects.filter(user_id=user_id, completed=True)
+    if start is not None:
+        plans = plans.filter(date__gte=start)
+        logs = logs.filter(date__gte=start)
+    if end is not None:
+        plans = plans.filter(date__lte=end)
+        logs = logs.filter(date__lte=end)
+
+    plan_rows = list(plans.values_list('date', 'routine_id'))
+    routine_exercises = defaultdict(list)
+    if plan_rows:
+        through = Routine.exercises.through.objects.filter(
+            routine_id__in={routine_id for _, routine_id in plan_rows}
+        ).values_list('routine_id', 'exercise_id', 'exercise__training_points')
+        for routine_id, exercise_id, points in through:
+            routine_exercises[routine_id].append((exercise_id, points))
+
+    log_rows = sorted(logs.values_list('date', 'exercise_id', 'exercise__training_points'))
+
+    days = defaultdict(lambda: {
+        'planned_points': 0,
+        'completed_points': 0,
+        'completed_planned_points': 0,
+        'completed_unplanned_points': 0,
+    })
+
+    planned_occ = defaultdict(Counter)  # week start -> exercise id -> planned occurrences
+    for day, routine_id in plan_rows:
+        week = week_start_of(day)
+        for exercise_id, points in routine_exercises[routine_id]:
+            planned_occ[week][exercise_id] += 1
+            days[day]['planned_points'] += points
+
+    # Logs are walked in date order, so earlier completions consume the planned occurrences first
+    for day, exercise_id, points in log_rows:
+        remaining = planned_occ[week_start_of(day)]
+        metrics = days[day]
+        metrics['completed_points'] += points
+        if remaining[exercise_id] > 0:
+            remaining[exercise_id] -= 1
+            metrics['completed_planned_points'] += points
+        else:
+            metrics['completed_unplanned_points'] += points
+
+    return {day: metrics for day, metrics in days.items() if any(metrics.values())}
+
+
+def refresh_user_weeks(user_id, week_starts):
+    """Recompute the rollup rows of `user_id` for the span of ISO weeks covering `week_starts`."""
+    week_starts = sorted(set(week_starts))
+    if not week_starts:
+        return
+    start = week_starts[0]
+    end = week_starts[-1] + timedelta(days=6)
+    _write_rollup(user_id, compute_daily_points(user_id, start, end), start, end)
+
+
+def rebuild_user(user_id):
+    """Recompute every rollup row of `user_id` from scratch, replacing them in one transaction."""
+    with transaction.atomic():
+        _write_rollup(user_id, compute_daily_points(user_id))
+
+
+def rebuild_all(user_ids=None):
+    """
+    Rebuild the rollup of `user_ids`, or of every user with plans or logs (dropping the rows
+    of everyone else). Users are replaced one transaction at a time, so an interrupted run
+    leaves the users it did not reach with their previous rows, never with none.
+    Returns the number of users rebuilt.
+    """
+    if user_ids is None:
+        user_ids = set(RoutinePlan.objects.values_list('user_id', flat=True).distinct())
+        user_ids |= set(ExerciseLog.objects.values_list('user_id', flat=True).distinct())
+        DailyPointsRollup.objects.exclude(user_id__in=user_ids).delete()
+    user_ids = sorted(user_ids)
+    for user_id in user_ids:
+        rebuild_user(user_id)
+    return len(user_ids)
+
+
+def _write_rollup(user_id, daily, start=None, end=None):
+    stale = DailyPointsRollup.objects.filter(user_id=user_id).exclude(date__in=list(daily))
+    if start is not None:
+        stale = stale.filter(date__range=[start, end])
+    with transaction.atomic():
+        stale.delete()
+        if daily:
+            DailyPointsRollup.objects.bulk_create(
+                [DailyPointsRollup(user_id=user_id, date=day, **metrics) for day, metrics in daily.items()],
+                update_conflicts=True,
+                unique_fields=['user', 'date'],
+                update_fields=[
+                    'planned_points', 'completed_points',
+                    'completed_planned_points', 'completed_unplanned_points',
+                ],
+            )
+
+
+def schedule_refresh(pairs):
+    """
+    Refresh the weeks touched by an iterable of (user_id, date) pairs once the current
+    transaction commits (immediately in autocommit mode). Deferring avoids writing rollup
+    rows for a user that is being deleted in the same cascade.
+    """
+    weeks = defaultdict(set)
+    for user_id, day in pairs:
+        weeks[user_id].add(week_start_of(day))
+    if not weeks:
+        return
+
+    def flush():
+        for user_id, week_starts in weeks.items():
+            refresh_user_weeks(user_id, week_starts)
+
+    transaction.on_commit(flush)
@@ -0,0 +1,74 @@
+"""Expansion of recurring routine schedules into RoutinePlan rows, written with one bulk_create."""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+
+from .models import RoutinePlan
+from .rollups import schedule_refresh
+from .versions import schedule_bump, user_key
+
+
+class ScheduleConflict(Exception):
+    """Raised under the 'fail' policy when some of the days already have a plan."""
+
+    def __init__(self, dates):
+        super().__init__(f"{len(dates)} day(s) already planned")
+        self.dates = dates
+
+
+def schedule_plans(user, routine_by_weekday, start_date, weeks, on_conflict):
+    """
+    Plan `routine_by_weekday[day.weekday()]` on every day of `weeks` weeks from `start_date`.
+
+    `on_conflict` decides what happens to days that already have a plan: 'skip' keeps them,
+    'overwrite' replaces their routine and 'fail' raises ScheduleConflict without writing
+    anything. Returns a summary dict of the counts.
+    """
+    end_date = start_date + timedelta(weeks=weeks, days=-1)
+    wanted = {}
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in routine_by_weekday:
+            wanted[day] = routine_by_weekday[day.weekday()]
+        day += timedelta(days=1)
+
+    with transaction.atomic():
+        existing = dict(
+            RoutinePlan.objects.filter(user=user, date__in=wanted).values_list('date', 'routine_id')
+        )
+        if existing and on_conflict == 'fail':
+            raise ScheduleConflict(sorted(existing))
+        if on_conflict == 'skip':
+            days = [day for day in wanted if day not in existing]
+        else:
+            days = list(wanted)
+        plans = [RoutinePlan(user=user, routine_id=wanted[day], date=day) for day in days]
+
+        if on_conflict == 'overwrite':
+            RoutinePlan.objects.bulk_create(
+                plans, update_conflicts=True, unique_fields=['user', 'date'], update_fields=['routine', 'updated_at'],
+            )
+        elif on_conflict == 'skip':
+            # ignore_conflicts also covers days planned concurrently since the lookup above
+            RoutinePlan.objects.bulk_create(plans, ignore_conflicts=True)
+        else:
+            try:
+                with transaction.atomic():
+                    RoutinePlan.objects.bulk_create(plans)
+            except IntegrityError:
+                raise ScheduleConflict(sorted(
+                    RoutinePlan.objects.filter(user=user, date__in=wanted).values_list('date', flat=True)
+                ))
+
+        # bulk_create sends no signals
+        schedule_refresh((user.pk, day) for day in days)
+        schedule_bump(user_key(user.pk))
+
+    overwritten = [day for day in days if day in existing]
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'created': len(days) - len(overwritten),
+        'overwritten': len(overwritten),
+        'skipped': len(wanted) - len(days),
+    }
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Exercise, Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget
+from rest_framework.exceptions import NotFound
+from .models import Exercise, Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget, AnalysisJob
+from .upserts import set_log_completed, upsert_exercise_log
 
 class ExerciseSerializer(serializers.ModelSerializer):
     """Serializer for the Exercise model."""
@@ -66,6 +68,61 @@ class ExerciseSetSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'set_number']
 
 
+class RoutinePlanScheduleSerializer(serializers.Serializer):
+    """
+    Input of routine-plans/schedule: either one `routine` for every day or a `weekdays` map
+    ({"monday": routine_id, ...}), expanded over `weeks` weeks from `start_date`.
+    """
+    WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+    CONFLICT_CHOICES = ['skip', 'overwrite', 'fail']
+
+    routine = serializers.IntegerField(required=False)
+    weekdays = serializers.DictField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    start_date = serializers.DateField()
+    weeks = serializers.IntegerField(min_value=1, max_value=52)
+    on_conflict = serializers.ChoiceField(choices=CONFLICT_CHOICES, default='skip')
+
+    def validate_weekdays(self, weekdays):
+        unknown = sorted(set(weekdays) - set(self.WEEKDAYS))
+        if unknown:
+            raise serializers.ValidationError(f"Unknown weekday(s): {unknown}")
+        return weekdays
+
+    def validate(self, attrs):
+        if ('routine' in attrs) == ('weekdays' in attrs):
+            raise serializers.ValidationError("Give exactly one of routine or weekdays.")
+        if 'routine' in attrs:
+            routine_by_weekday = dict.fromkeys(range(7), attrs.pop('routine'))
+        else:
+            routine_by_weekday = {self.WEEKDAYS.index(name): pk for name, pk in attrs.pop('weekdays').items()}
+        # All routine ids in one query instead of one PrimaryKeyRelatedField lookup each
+        ids = set(routine_by_weekday.values())
+        missing = ids - set(Routine.objects.filter(pk__in=ids).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError(f"Unknown routine id(s): {sorted(missing)}")
+        attrs['routine_by_weekday'] = routine_by_weekday
+        return attrs
+
+
+class ExerciseSetBulkItemSerializer(serializers.ModelSerializer):
+    """One set of an exercise-sets/bulk request; the backend assigns set_number."""
+    class Meta:
+        model = ExerciseSet
+        fields = ['reps', 'weight_kg', 'completed']
+
+
+class ExerciseSetBulkCreateSerializer(serializers.Serializer):
+    """Input of exercise-sets/bulk: the parent log and the sets to append to it, in order."""
+    exercise_log = serializers.PrimaryKeyRelatedField(queryset=ExerciseLog.objects.all())
+    sets = ExerciseSetBulkItemSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class ExerciseSetReorderSerializer(serializers.Serializer):
+    """Input of exercise-sets/reorder: every set id of the log, in the new order."""
+    exercise_log = serializers.PrimaryKeyRelatedField(queryset=ExerciseLog.objects.all())
+    order = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
 class ExerciseLogSerializer(serializers.ModelSerializer):
     """Serializer for the ExerciseLog model."""
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -81,28 +138,50 @@ class ExerciseLogSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Automatically set the user to the request user
         validated_data['user'] = self.context['request'].user
-        # Use get_or_create to handle the unique_together constraint gracefully
-        # This allows for updating the 'completed' status if an entry already exists
-        instance, created = ExerciseLog.objects.get_or_create(
-            user=validated_data['user'],
-            exercise=validated_data['exercise'],
-            date=validated_data['date'],
-            defaults={'completed': validated_data.get('completed', False)}
+        if 'completed' not in validated_data:
+            # Nothing to write on an existing row, so keep its completed flag as it is
+            instance, created = ExerciseLog.objects.get_or_create(
+                user=validated_data['user'],
+                exercise=validated_data['exercise'],
+                date=validated_data['date'],
+            )
+            return instance
+        # One upsert statement instead of get_or_create plus save; safe under concurrent toggles
+        return upsert_exercise_log(
+            validated_data['user'], validated_data['exercise'], validated_data['date'], validated_data['completed'],
         )
-        # If the instance was not created (it already existed), update 'completed' status
-        if not created:
-            instance.completed = validated_data.get('completed', instance.completed)
-            instance.save()
-        return instance
 
     def update(self, instance, validated_data):
         # Standard update logic, but user, exercise, and date shouldn't change
         # Only 'completed' status should be updatable via PUT/PATCH
-        instance.completed = validated_data.get('completed', instance.completed)
-        instance.save()
+        completed = validated_data.get('completed', instance.completed)
+        if not set_log_completed(instance, completed):
+            raise NotFound("This exercise log was deleted.")
         return instance
 
 
+class ExerciseLogBulkItemSerializer(serializers.Serializer):
+    """One checkbox of a bulk day check-off."""
+    exercise = serializers.IntegerField()
+    completed = serializers.BooleanField()
+
+
+class ExerciseLogBulkUpsertSerializer(serializers.Serializer):
+    """Input of exercise-logs/bulk_upsert: one date and the completed flag of each exercise."""
+    date = serializers.DateField()
+    items = ExerciseLogBulkItemSerializer(many=True, allow_empty=False, max_length=500)
+
+    def validate_items(self, items):
+        # Plain ids are checked in one query instead of one PrimaryKeyRelatedField lookup per item
+        exercise_ids = [item['exercise'] for item in items]
+        if len(set(exercise_ids)) != len(exercise_ids):
+            raise serializers.ValidationError("Each exercise may appear only once.")
+        missing = set(exercise_ids) - set(Exercise.objects.filter(pk__in=exercise_ids).values_list('pk', flat=True))
+        if missing:
+            raise serializers.ValidationError(f"Unknown exercise id(s): {sorted(missing)}")
+        return items
+
+
 class TopDownWeeklyTargetSerializer(serializers.ModelSerializer):
     """Serializer for the TopDownWeeklyTarget model."""
     user = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -130,3 +209,32 @@ class TopDownWeeklyTargetSerializer(serializers.ModelSerializer):
         instance.target_points = validated_data.get('target_points', instance.target_points)
         instance.save()
         return instance
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    """One operation of a batch/ request, addressed like the equivalent single API call."""
+    RESOURCES = ['routine-plans', 'exercise-logs', 'exercise-sets', 'weekly-targets']
+    METHODS = ['POST', 'PUT', 'PATCH', 'DELETE']
+
+    method = serializers.ChoiceField(choices=METHODS)
+    resource = serializers.ChoiceField(choices=RESOURCES)
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if (attrs['method'] == 'POST') == ('id' in attrs):
+            raise serializers.ValidationError("POST takes no id; PUT, PATCH and DELETE require one.")
+        return attrs
+
+
+class BatchSerializer(serializers.Serializer):
+    """Input of batch/: operations applied in order, all or nothing."""
+    operations = BatchOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    """Read-only view of a queued weekly analysis job."""
+    class Meta:
+        model = AnalysisJob
+        fields = ['id', 'year', 'week', 'status', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
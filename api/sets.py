@@ -0,0 +1,53 @@
+"""
+Set numbering for ExerciseSet rows. Callers hold the parent ExerciseLog row lock
+(lock_exercise_log inside transaction.atomic), so concurrent requests for the same log
+allocate and rewrite numbers one at a time.
+"""
+from django.db.models import Case, F, Max, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+
+from .models import ExerciseLog, ExerciseSet
+from .versions import schedule_bump, user_key
+
+
+def lock_exercise_log(user, exercise_log_id):
+    """SELECT ... FOR UPDATE the log; raises PermissionDenied unless `user` owns it."""
+    exercise_log = ExerciseLog.objects.select_for_update().get(pk=exercise_log_id)
+    if exercise_log.user_id != user.pk:
+        raise PermissionDenied()
+    return exercise_log
+
+
+def next_set_number(exercise_log):
+    return (ExerciseSet.objects.filter(exercise_log=exercise_log).aggregate(m=Max('set_number'))['m'] or 0) + 1
+
+
+def append_sets(exercise_log, items):
+    """Insert one set per validated item after the log's last set; returns the new sets in order."""
+    first = next_set_number(exercise_log)
+    ExerciseSet.objects.bulk_create([
+        ExerciseSet(exercise_log=exercise_log, set_number=first + i, **item) for i, item in enumerate(items)
+    ])
+    # bulk_create sends no post_save, which is what bumps the user's data version
+    schedule_bump(user_key(exercise_log.user_id))
+    return list(ExerciseSet.objects.filter(exercise_log=exercise_log, set_number__gte=first).order_by('set_number'))
+
+
+def renumber_sets(exercise_log, set_ids, current_max):
+    """
+    Number the sets `set_ids` 1..n in that order. `current_max` is the log's highest set_number.
+
+    (exercise_log, set_number) is a non-deferrable unique constraint, which PostgreSQL checks
+    row by row, so the rows are first shifted above current_max and then rewritten with a
+    single CASE update.
+    """
+    if not set_ids:
+        return
+    ExerciseSet.objects.filter(exercise_log=exercise_log).update(
+        set_number=F('set_number') + current_max, updated_at=timezone.now(),
+    )
+    ExerciseSet.objects.filter(exercise_log=exercise_log, pk__in=set_ids).update(set_number=Case(
+        *[When(pk=set_id, then=Value(number)) for number, set_id in enumerate(set_ids, start=1)]
+    ))
+    schedule_bump(user_key(exercise_log.user_id))
@@ -0,0 +1,163 @@
+"""Signal handlers keeping derived data (DailyPointsRollup, DataVersion counters, sync tombstones) in step with the source models."""
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Exercise, Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget, WeeklyAnalysis, Tombstone
+from .rollups import schedule_refresh
+from .catalog import CATALOG_KEY
+from .sync import COLLECTION_BY_MODEL
+from .versions import GLOBAL_KEY, schedule_bump, user_key
+
+
+def _remember_previous(sender, instance, fields):
+    """Stash the stored values of `fields` so post_save can also refresh the week the row moved away from."""
+    instance._previous_values = None
+    if instance.pk is not None:
+        instance._previous_values = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(pre_save, sender=ExerciseLog)
+@receiver(pre_save, sender=RoutinePlan)
+def remember_user_and_date(sender, instance, **kwargs):
+    _remember_previous(sender, instance, ['user_id', 'date'])
+
+
+@receiver(post_save, sender=ExerciseLog)
+@receiver(post_save, sender=RoutinePlan)
+def refresh_rollup_on_save(sender, instance, **kwargs):
+    pairs = [(instance.user_id, instance.date)]
+    previous = getattr(instance, '_previous_values', None)
+    if previous:
+        pairs.append((previous['user_id'], previous['date']))
+    schedule_refresh(pairs)
+
+
+@receiver(post_delete, sender=ExerciseLog)
+@receiver(post_delete, sender=RoutinePlan)
+def refresh_rollup_on_delete(sender, instance, **kwargs):
+    schedule_refresh([(instance.user_id, instance.date)])
+
+
+@receiver(m2m_changed, sender=Routine.exercises.through)
+def refresh_rollup_on_routine_exercises_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear', 'post_clear'):
+        return
+    if reverse:
+        # instance is an Exercise; pk_set holds routine ids (None on clear)
+        if action == 'pre_clear':
+            instance._cleared_routine_ids = list(instance.routines.values_list('pk', flat=True))
+            return
+        routine_ids = pk_set if action != 'post_clear' else getattr(instance, '_cleared_routine_ids', [])
+    else:
+        if action == 'pre_clear':
+            return
+        routine_ids = [instance.pk]
+    schedule_refresh(
+        RoutinePlan.objects.filter(routine_id__in=routine_ids).values_list('user_id', 'date')
+    )
+
+
+@receiver(pre_save, sender=Exercise)
+def remember_training_points(sender, instance, **kwargs):
+    _remember_previous(sender, instance, ['training_points'])
+
+
+@receiver(post_save, sender=Exercise)
+def refresh_rollup_on_training_points_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_values', None)
+    if created or not previous or previous['training_points'] == instance.training_points:
+        return
+    schedule_refresh(_pairs_using_exercise(instance.pk))
+
+
+@receiver(pre_delete, sender=Exercise)
+def remember_planned_days(sender, instance, **kwargs):
+    # The routine membership rows disappear without an m2m_changed signal, so collect the
+    # affected plan days up front. Completed logs are removed by cascade and handled above.
+    instance._planned_days = list(
+        RoutinePlan.objects.filter(routine__exercises=instance).values_list('user_id', 'date')
+    )
+
+
+@receiver(post_delete, sender=Exercise)
+def refresh_rollup_on_exercise_delete(sender, instance, **kwargs):
+    schedule_refresh(getattr(instance, '_planned_days', []))
+
+
+def _pairs_using_exercise(exercise_id):
+    logged = ExerciseLog.objects.filter(
+        exercise_id=exercise_id, completed=True
+    ).values_list('user_id', 'date')
+    planned = RoutinePlan.objects.filter(
+        routine__exercises=exercise_id
+    ).values_list('user_id', 'date')
+    return list(logged) + list(planned)
+
+
+# Data version counters. These receivers are connected after the rollup ones above, so on
+# commit the rollup is refreshed before the new version becomes visible.
+
+@receiver(post_save, sender=ExerciseLog)
+@receiver(post_delete, sender=ExerciseLog)
+@receiver(post_save, sender=RoutinePlan)
+@receiver(post_delete, sender=RoutinePlan)
+@receiver(post_save, sender=TopDownWeeklyTarget)
+@receiver(post_delete, sender=TopDownWeeklyTarget)
+@receiver(post_save, sender=WeeklyAnalysis)
+@receiver(post_delete, sender=WeeklyAnalysis)
+def bump_user_version(sender, instance, **kwargs):
+    keys = {user_key(instance.user_id)}
+    previous = getattr(instance, '_previous_values', None)
+    if previous:
+        keys.add(user_key(previous['user_id']))
+    schedule_bump(*keys)
+
+
+@receiver(post_save, sender=ExerciseSet)
+@receiver(post_delete, sender=ExerciseSet)
+def bump_user_version_for_set(sender, instance, **kwargs):
+    user_id = _set_owner_id(instance)
+    if user_id is not None:
+        schedule_bump(user_key(user_id))
+
+
+def _set_owner_id(instance):
+    """User id of an ExerciseSet's log, looked up once per instance."""
+    if not hasattr(instance, '_owner_id'):
+        instance._owner_id = ExerciseLog.objects.filter(
+            pk=instance.exercise_log_id
+        ).values_list('user_id', flat=True).first()
+    return instance._owner_id
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+@receiver(post_save, sender=Routine)
+@receiver(post_delete, sender=Routine)
+@receiver(m2m_changed, sender=Routine.exercises.through)
+def bump_global_version(sender, action=None, **kwargs):
+    if action is None or action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_bump(GLOBAL_KEY)
+
+
+@receiver(post_save, sender=Exercise)
+@receiver(post_delete, sender=Exercise)
+def bump_catalog_version(sender, **kwargs):
+    schedule_bump(CATALOG_KEY)
+
+
+# Delta sync tombstones. Written in the deleting transaction, so they exist exactly when the
+# delete commits.
+
+@receiver(post_delete, sender=ExerciseLog)
+@receiver(post_delete, sender=RoutinePlan)
+@receiver(post_delete, sender=TopDownWeeklyTarget)
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(user_id=instance.user_id, collection=COLLECTION_BY_MODEL[sender], object_id=instance.pk)
+
+
+@receiver(post_delete, sender=ExerciseSet)
+def record_set_tombstone(sender, instance, **kwargs):
+    user_id = _set_owner_id(instance)
+    if user_id is not None:
+        Tombstone.objects.create(user_id=user_id, collection=COLLECTION_BY_MODEL[sender], object_id=instance.pk)
@@ -0,0 +1,114 @@
+"""Query helpers shared by the WeeklyStatsViewSet actions."""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+
+from .models import TopDownWeeklyTarget, DailyPointsRollup
+
+_TOTAL_KEYS = ('planned', 'completed', 'completed_planned', 'completed_unplanned')
+# Longest span, in ISO weeks, that historical_stats and kpi_summary summarize in one request
+MAX_WEEKS = 520
+
+
+def iso_year_week(day):
+    iso = day.isocalendar()
+    return iso[0], iso[1]
+
+
+def weekly_points(user_ids, start, end):
+    """
+    Sum the rollup per user and ISO week in a single grouped query.
+    Returns {(user_id, week_start): {'planned', 'completed', 'completed_planned', 'completed_unplanned'}}
+    for the weeks between `start` and `end` that have any rollup rows.
+    """
+    rows = (
+        DailyPointsRollup.objects
+        .filter(user_id__in=user_ids, date__range=[start, end])
+        .annotate(week_start=TruncWeek('date'))
+        .values('user_id', 'week_start')
+        .annotate(
+            planned=Sum('planned_points'),
+            completed=Sum('completed_points'),
+            completed_planned=Sum('completed_planned_points'),
+            completed_unplanned=Sum('completed_unplanned_points'),
+        )
+        .order_by()
+    )
+    return {(row.pop('user_id'), row.pop('week_start')): row for row in rows}
+
+
+def weekly_targets(user_ids, week_starts):
+    """Fetch the targets of the ISO weeks starting on `week_starts` in one query: {(user_id, year, week): points}."""
+    keys = {iso_year_week(week_start) for week_start in week_starts}
+    if not keys:
+        return {}
+    # One range predicate over the covered years (an OR per week outgrows SQLite's expression
+    # depth limit); the few weeks of those years outside `week_starts` are dropped here
+    years = [year for year, _ in keys]
+    return {
+        (user_id, year, week): points
+        for user_id, year, week, points in TopDownWeeklyTarget.objects.filter(
+            user_id__in=user_ids, year__range=[min(years), max(years)]
+        ).values_list('user_id', 'year', 'week', 'target_points')
+        if (year, week) in keys
+    }
+
+
+def week_snapshots(user, last_week_start, history_weeks=0, include_days=False):
+    """
+    Build summaries for the ISO week starting `last_week_start` and the `history_weeks` weeks
+    before it, oldest first, in two queries whatever the number of weeks.
+
+    Each snapshot holds the week's target and its planned/completed point totals. With
+    `include_days` it also carries per-day totals under 'days' ({date: (planned, completed)}),
+    summed from the same rows instead of a separate grouped query.
+    """
+    return week_snapshots_for_users([user.pk], last_week_start, history_weeks, include_days)[user.pk]
+
+
+def week_snapshots_for_users(user_ids, last_week_start, history_weeks=0, include_days=False):
+    """week_snapshots for many users at once, still in two queries: {user_id: [snapshot, ...]}."""
+    if history_weeks < 0:
+        # No weeks at all (historical_stats?weeks_back=0)
+        return {user_id: [] for user_id in user_ids}
+    week_starts = [last_week_start - timedelta(weeks=i) for i in range(history_weeks, -1, -1)]
+    range_end = last_week_start + timedelta(days=6)
+    targets = weekly_targets(user_ids, week_starts)
+
+    if include_days:
+        totals = defaultdict(lambda: dict.fromkeys(_TOTAL_KEYS, 0))
+        days = defaultdict(dict)
+        rows = DailyPointsRollup.objects.filter(
+            user_id__in=user_ids, date__range=[week_starts[0], range_end]
+        ).values_list(
+            'user_id', 'date', 'planned_points', 'completed_points',
+            'completed_planned_points', 'completed_unplanned_points',
+        )
+        for user_id, day, *values in rows:
+            key = (user_id, day - timedelta(days=day.weekday()))
+            week_totals = totals[key]
+            for name, value in zip(_TOTAL_KEYS, values):
+                week_totals[name] += value
+            days[key][day] = (values[0], values[1])
+    else:
+        totals = weekly_points(user_ids, week_starts[0], range_end)
+
+    result = {}
+    for user_id in user_ids:
+        snapshots = result[user_id] = []
+        for week_start in week_starts:
+            year, week = iso_year_week(week_start)
+            snapshot = {
+                'week_start': week_start,
+                'year': year,
+                'week': week,
+                'label': f"W{week:02d} {year}",
+                'target': targets.get((user_id, year, week), 0),
+                **totals.get((user_id, week_start), dict.fromkeys(_TOTAL_KEYS, 0)),
+            }
+            if include_days:
+                snapshot['days'] = days.get((user_id, week_start), {})
+            snapshots.append(snapshot)
+    return result
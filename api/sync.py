@@ -0,0 +1,105 @@
+"""
+Delta sync: everything a user's exercise logs, sets, routine plans and weekly targets gained,
+changed or lost since a token, based on their indexed updated_at columns and Tombstone rows.
+
+Tokens are opaque to clients; they encode the server time the response was built. Each
+request re-reads SYNC_OVERLAP_SECONDS before the token, so rows written by transactions that
+committed just after an earlier response was built are not missed. Clients may therefore see
+a row twice and should apply changes by id.
+
+Rows also embed catalog data (exercise and routine names, a routine's exercises) whose
+changes do not touch their updated_at. Tokens therefore carry the global data version too,
+and a token issued before a catalog change gets a full snapshot with 'reset': true.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget, Tombstone
+from .readers import exercise_log_rows, exercise_set_rows, routine_plan_rows, weekly_target_rows
+from .versions import GLOBAL_KEY, current_versions
+
+COLLECTIONS = ('exercise_logs', 'exercise_sets', 'routine_plans', 'weekly_targets')
+# Tombstone.collection for each synced model
+COLLECTION_BY_MODEL = {
+    ExerciseLog: 'exercise_logs',
+    ExerciseSet: 'exercise_sets',
+    RoutinePlan: 'routine_plans',
+    TopDownWeeklyTarget: 'weekly_targets',
+}
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(moment, catalog_version):
+    return f'{round(moment.timestamp() * 1_000_000)}.{catalog_version}'
+
+
+def decode_token(token):
+    """(moment, catalog_version) of a token; the version is None in tokens that predate it."""
+    micros, _, version = token.partition('.')
+    try:
+        return (
+            datetime.fromtimestamp(int(micros) / 1_000_000, tz=dt_timezone.utc),
+            int(version) if version else None,
+        )
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise InvalidToken(token)
+
+
+def _querysets(user):
+    return {
+        'exercise_logs': (
+            ExerciseLog.objects.filter(user=user).select_related('exercise').order_by('date', 'exercise__name'),
+            exercise_log_rows,
+        ),
+        'exercise_sets': (
+            ExerciseSet.objects.filter(exercise_log__user=user).order_by('exercise_log', 'set_number'),
+            exercise_set_rows,
+        ),
+        'routine_plans': (
+            RoutinePlan.objects.filter(user=user).select_related('routine').order_by('date'),
+            routine_plan_rows,
+        ),
+        'weekly_targets': (
+            TopDownWeeklyTarget.objects.filter(user=user).order_by('year', 'week'),
+            weekly_target_rows,
+        ),
+    }
+
+
+def sync_payload(user, token=None):
+    """
+    {'token', 'reset', <collection>: [rows], 'deleted': {<collection>: [ids]}} for `user`.
+
+    Without a token, with one older than the tombstone retention or with one issued before the
+    last catalog change, the payload is a full snapshot with 'reset': true and the client
+    should replace its local copy.
+    """
+    now = timezone.now()
+    # Read before the rows: a catalog change committing meanwhile resets the next request
+    catalog_version = current_versions(GLOBAL_KEY)[0]
+    since, token_version = decode_token(token) if token else (None, None)
+    reset = (
+        since is None
+        or since < now - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        or token_version != catalog_version
+    )
+
+    payload = {'token': encode_token(now, catalog_version), 'reset': reset}
+    deleted = {name: [] for name in COLLECTIONS}
+    after = None if reset else since - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+    for name, (queryset, build_rows) in _querysets(user).items():
+        if after is not None:
+            queryset = queryset.filter(updated_at__gt=after)
+        payload[name] = build_rows(queryset)
+    if after is not None:
+        for collection, object_id in Tombstone.objects.filter(
+            user=user, deleted_at__gt=after
+        ).values_list('collection', 'object_id'):
+            deleted[collection].append(object_id)
+    payload['deleted'] = deleted
+    return payload
@@ -1,3 +1,1918 @@
-from django.test import TestCase
+"""
+Query budget tests: every API endpoint has to stay within a fixed number of queries, and that
+number must not change when the data behind it grows tenfold (growth means an N+1 crept in).
 
-# Create your tests here.
+    python manage.py test --settings=mysite.test_settings
+"""
+import base64
+import contextlib
+import gzip
+import importlib
+import io
+import itertools
+import json
+import random
+import tempfile
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import catalog, llm, metrics, middleware, profiling
+from .admin import AnalysisCallLogAdmin
+from .analysis import build_week_data
+from .benchdata import seed_catalog, seed_history
+from .management.commands import generate_weekly_analyses
+from .readers import exercise_log_rows, exercise_set_rows, routine_plan_rows, weekly_target_rows
+from .renderers import FastJSONParser, FastJSONRenderer
+from .rollups import compute_daily_points, rebuild_user
+from .stats import MAX_WEEKS, week_snapshots
+from .sync import encode_token
+from .versions import GLOBAL_KEY, bump, current_versions, user_key
+from .serializers import ExerciseLogSerializer, ExerciseSetSerializer, RoutinePlanSerializer, TopDownWeeklyTargetSerializer
+from .models import Exercise, Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget, WeeklyAnalysis, AnalysisJob, DailyPointsRollup, AnalysisCallLog
+
+# Exercise logs and routine plans of the small dataset; grow() makes everything 10x larger
+SMALL = 40
+SMALL_EXERCISES = 10
+SMALL_ROUTINES = 4
+SMALL_JOBS = 2
+
+
+class QueryBudgetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        cls.user = get_user_model().objects.create_user('budget')
+        exercises, routines = seed_catalog("Budget", exercises=SMALL_EXERCISES, routines=SMALL_ROUTINES)
+        seed_history(cls.user, SMALL, exercises, routines, start=cls.today - timedelta(days=SMALL - 1))
+        year, week = cls.today.isocalendar()[:2]
+        WeeklyAnalysis.objects.create(user=cls.user, year=year, week=week, content={'summary': 'ok'})
+        AnalysisJob.objects.bulk_create([
+            AnalysisJob(user=cls.user, year=year, week=week, status=AnalysisJob.STATUS_DONE) for _ in range(SMALL_JOBS)
+        ])
+        # The first write of a user creates their DataVersion row; later ones only update it
+        bump(user_key(cls.user.pk))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.days = itertools.count(1)  # fresh future dates for write requests
+
+    def grow(self):
+        """Add nine times the small dataset again: more catalog, older history, more jobs and analyses."""
+        exercises, routines = seed_catalog("Budget grown", exercises=9 * SMALL_EXERCISES, routines=9 * SMALL_ROUTINES)
+        seed_history(self.user, 9 * SMALL, exercises, routines, start=self.today - timedelta(days=10 * SMALL))
+        AnalysisJob.objects.bulk_create([
+            AnalysisJob(user=self.user, year=2000, week=1, status=AnalysisJob.STATUS_DONE) for _ in range(9 * SMALL_JOBS)
+        ])
+        WeeklyAnalysis.objects.bulk_create([
+            WeeklyAnalysis(user=self.user, year=2000, week=week, content={'summary': 'old'}) for week in range(1, 10)
+        ])
+
+    def count_queries(self, method, path, data=None):
+        """Queries of one request, including the on-commit rollup and version work it triggers."""
+        # Callables are resolved first, so looking up ids for the request is not counted
+        path = path() if callable(path) else path
+        data = data() if callable(data) else data
+        catalog.clear()
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertLess(response.status_code, 400, response.content[:500])
+        return len(queries)
+
+    def assertQueryBudget(self, budget, method, path, data=None):
+        small = self.count_queries(method, path, data)
+        self.grow()
+        large = self.count_queries(method, path, data)
+        self.assertLessEqual(small, budget, "over the query budget")
+        self.assertEqual(large, small, "query count grows with the data (N+1)")
+
+    def first_id(self, model, **filters):
+        return model.objects.filter(**filters).order_by('pk').values_list('pk', flat=True).first()
+
+    def future_day(self):
+        return (self.today + timedelta(days=1000 + next(self.days))).isoformat()
+
+    # Exercises and routines
+
+    def test_exercise_list(self):
+        self.assertQueryBudget(2, 'get', '/api/exercises/')
+
+    def test_exercise_detail(self):
+        self.assertQueryBudget(1, 'get', lambda: f'/api/exercises/{self.first_id(Exercise)}/')
+
+    def test_routine_list(self):
+        self.assertQueryBudget(2, 'get', '/api/routines/')
+
+    def test_routine_list_normalized(self):
+        self.assertQueryBudget(4, 'get', '/api/routines/?format=normalized')
+
+    def test_routine_detail(self):
+        self.assertQueryBudget(2, 'get', lambda: f'/api/routines/{self.first_id(Routine)}/')
+
+    # Routine plans
+
+    def test_routine_plan_list(self):
+        self.assertQueryBudget(3, 'get', '/api/routine-plans/')
+
+    def test_routine_plan_list_normalized(self):
+        self.assertQueryBudget(4, 'get', '/api/routine-plans/?format=normalized')
+
+    def test_routine_plan_page(self):
+        self.assertQueryBudget(2, 'get', '/api/routine-plans/?page_size=10')
+
+    def test_routine_plan_detail(self):
+        self.assertQueryBudget(2, 'get', lambda: f'/api/routine-plans/{self.first_id(RoutinePlan, user=self.user)}/')
+
+    def test_routine_plan_create(self):
+        self.assertQueryBudget(10, 'post', '/api/routine-plans/', lambda: {
+            'routine': self.first_id(Routine), 'date': self.future_day(),
+        })
+
+    def test_routine_plan_schedule(self):
+        self.assertQueryBudget(12, 'post', '/api/routine-plans/schedule/', lambda: {
+            'routine': self.first_id(Routine),
+            'start_date': self.future_day(), 'weeks': 4, 'on_conflict': 'overwrite',
+        })
+
+    # Exercise logs
+
+    def test_exercise_log_list(self):
+        self.assertQueryBudget(2, 'get', '/api/exercise-logs/')
+
+    def test_exercise_log_page(self):
+        self.assertQueryBudget(2, 'get', '/api/exercise-logs/?page_size=10')
+
+    def test_exercise_log_detail(self):
+        self.assertQueryBudget(2, 'get', lambda: f'/api/exercise-logs/{self.first_id(ExerciseLog, user=self.user)}/')
+
+    def test_exercise_log_create(self):
+        self.assertQueryBudget(10, 'post', '/api/exercise-logs/', lambda: {
+            'exercise': self.first_id(Exercise), 'date': self.future_day(),
+            'completed': True,
+        })
+
+    def test_exercise_log_update(self):
+        self.assertQueryBudget(13, 'patch', lambda: f'/api/exercise-logs/{self.first_id(ExerciseLog, user=self.user)}/',
+                               {'completed': True})
+
+    def test_exercise_log_bulk_upsert(self):
+        self.assertQueryBudget(13, 'post', '/api/exercise-logs/bulk_upsert/', lambda: {
+            'date': self.future_day(),
+            'items': [{'exercise': pk, 'completed': True}
+                      for pk in Exercise.objects.values_list('pk', flat=True)[:5]],
+        })
+
+    # Exercise sets
+
+    def test_exercise_set_list(self):
+        self.assertQueryBudget(1, 'get', '/api/exercise-sets/')
+
+    def test_exercise_set_detail(self):
+        self.assertQueryBudget(1, 'get', lambda: f'/api/exercise-sets/{self.first_id(ExerciseSet)}/')
+
+    def test_exercise_set_create(self):
+        self.assertQueryBudget(8, 'post', '/api/exercise-sets/', lambda: {
+            'exercise_log': self.first_id(ExerciseLog, user=self.user), 'reps': 5,
+        })
+
+    def test_exercise_set_bulk(self):
+        self.assertQueryBudget(8, 'post', '/api/exercise-sets/bulk/', lambda: {
+            'exercise_log': self.first_id(ExerciseLog, user=self.user), 'sets': [{'reps': 5}] * 3,
+        })
+
+    def test_exercise_set_reorder(self):
+        def payload():
+            log_id = self.first_id(ExerciseLog, user=self.user, sets__isnull=False)
+            order = ExerciseSet.objects.filter(exercise_log=log_id).order_by('-set_number').values_list('pk', flat=True)
+            return {'exercise_log': log_id, 'order': list(order)}
+        self.assertQueryBudget(9, 'post', '/api/exercise-sets/reorder/', payload)
+
+    def test_exercise_set_delete(self):
+        def path():
+            # The first of several sets, so the rest get renumbered
+            set_id = self.first_id(ExerciseSet, set_number=1, exercise_log__sets__set_number=2)
+            return f'/api/exercise-sets/{set_id}/'
+        self.assertQueryBudget(12, 'delete', path)
+
+    # Weekly targets
+
+    def test_weekly_target_list(self):
+        self.assertQueryBudget(1, 'get', '/api/weekly-targets/')
+
+    def test_weekly_target_detail(self):
+        self.assertQueryBudget(1, 'get', lambda: f'/api/weekly-targets/{self.first_id(TopDownWeeklyTarget)}/')
+
+    def test_weekly_target_create(self):
+        self.assertQueryBudget(7, 'post', '/api/weekly-targets/', lambda: {
+            'year': 2100, 'week': next(self.days) % 50 + 1, 'target_points': 40,
+        })
+
+    # Weekly stats
+
+    def test_historical_stats(self):
+        self.assertQueryBudget(3, 'get', '/api/weekly-stats/historical_stats/?weeks_back=12')
+
+    def test_kpi_summary(self):
+        start = self.today - timedelta(days=10 * SMALL)
+        self.assertQueryBudget(3, 'get', f'/api/weekly-stats/kpi_summary/?start_date={start}&end_date={self.today}')
+
+    def test_analysis(self):
+        self.assertQueryBudget(6, 'get', '/api/weekly-stats/analysis/')
+
+    # Analysis jobs, sync and batch
+
+    def test_analysis_job_list(self):
+        self.assertQueryBudget(1, 'get', '/api/analysis-jobs/')
+
+    def test_analysis_job_detail(self):
+        self.assertQueryBudget(1, 'get', lambda: f'/api/analysis-jobs/{self.first_id(AnalysisJob)}/')
+
+    def test_sync_snapshot(self):
+        self.assertQueryBudget(9, 'get', '/api/sync/')
+
+    def test_sync_since_token(self):
+        # Older than all the data, so the delta holds every row on both sizes
+        since = encode_token(timezone.now() - timedelta(days=1), current_versions(GLOBAL_KEY)[0])
+        self.assertQueryBudget(10, 'get', f'/api/sync/?since={since}')
+
+    def test_batch(self):
+        self.assertQueryBudget(33, 'post', '/api/batch/', lambda: {'operations': [
+            {'method': 'POST', 'resource': 'exercise-logs', 'data': {
+                'exercise': self.first_id(Exercise), 'date': self.future_day(),
+                'completed': True,
+            }},
+            {'method': 'PATCH', 'resource': 'exercise-logs', 'id': self.first_id(ExerciseLog, user=self.user),
+             'data': {'completed': False}},
+            {'method': 'POST', 'resource': 'exercise-sets', 'data': {
+                'exercise_log': self.first_id(ExerciseLog, user=self.user), 'reps': 8,
+            }},
+        ]})
+
+
+def historical_stats_baseline(user, weeks_back, offset=0):
+    """The original historical_stats loop over plans and logs in Python, kept as the oracle."""
+    today = date.today()
+    current_week_start = today - timedelta(days=today.weekday()) + timedelta(weeks=offset)
+    earliest_week_start = current_week_start - timedelta(weeks=weeks_back - 1)
+    range_end = current_week_start + timedelta(days=6)
+
+    all_targets = {(t.year, t.week): t.target_points for t in TopDownWeeklyTarget.objects.filter(user=user)}
+    all_plans = list(
+        RoutinePlan.objects.filter(user=user, date__range=[earliest_week_start, range_end])
+        .prefetch_related('routine__exercises')
+    )
+    all_logs = list(
+        ExerciseLog.objects.filter(user=user, date__range=[earliest_week_start, range_end], completed=True)
+        .select_related('exercise')
+    )
+
+    result = []
+    for i in range(weeks_back - 1, -1, -1):
+        week_start = current_week_start - timedelta(weeks=i)
+        week_end = week_start + timedelta(days=6)
+        year, week_num = week_start.isocalendar()[:2]
+        weekly_target = all_targets.get((year, week_num), 0)
+
+        planned_occ = Counter()
+        planned_points = 0
+        for plan in [p for p in all_plans if week_start <= p.date <= week_end]:
+            for ex in plan.routine.exercises.all():
+                planned_occ[ex.id] += 1
+                planned_points += ex.training_points
+
+        completed_occ = Counter()
+        exercise_pts = {}
+        for log in [log for log in all_logs if week_start <= log.date <= week_end]:
+            completed_occ[log.exercise_id] += 1
+            exercise_pts[log.exercise_id] = log.exercise.training_points
+
+        completed_planned = 0
+        completed_unplanned = 0
+        for ex_id, comp_count in completed_occ.items():
+            pts = exercise_pts[ex_id]
+            plan_count = planned_occ.get(ex_id, 0)
+            completed_planned += min(plan_count, comp_count) * pts
+            completed_unplanned += max(0, comp_count - plan_count) * pts
+
+        completed_points = completed_planned + completed_unplanned
+        result.append({
+            'week': f"W{week_num:02d} {year}",
+            'planned': planned_points,
+            'completed': completed_points,
+            'completedPlanned': completed_planned,
+            'completedUnplanned': completed_unplanned,
+            'weeklyTarget': weekly_target,
+            'achievementPercentage': round(completed_points / weekly_target * 100, 1) if weekly_target > 0 else 0,
+        })
+    return result
+
+
+class HistoricalStatsRegressionTests(APITestCase):
+    """historical_stats from the rollup must equal the original per-week Python loop."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('historical')
+        exercises, routines = seed_catalog("Historical", exercises=8, routines=4)
+        rng = random.Random(2)
+        today = date.today()
+        start = today - timedelta(days=420)  # more than 52 weeks, so at least one year boundary
+        plans, logs, targets = [], [], set()
+        for offset in range(421):
+            day = start + timedelta(days=offset)
+            if rng.random() < 0.5:
+                plans.append(RoutinePlan(user=cls.user, routine=rng.choice(routines), date=day))
+            # Completed logs both on and off plan, and some that were left unchecked
+            for exercise in rng.sample(exercises, rng.randint(0, 4)):
+                logs.append(ExerciseLog(user=cls.user, exercise=exercise, date=day, completed=rng.random() < 0.8))
+            if rng.random() < 0.1:
+                targets.add(day.isocalendar()[:2])  # most weeks stay without a target
+        RoutinePlan.objects.bulk_create(plans)
+        ExerciseLog.objects.bulk_create(logs)
+        TopDownWeeklyTarget.objects.bulk_create([
+            TopDownWeeklyTarget(user=cls.user, year=year, week=week, target_points=10 + week)
+            for year, week in targets
+        ])
+        rebuild_user(cls.user.pk)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_matches_baseline(self):
+        for query, weeks_back, offset in [('weeks_back=52', 52, 0), ('weeks_back=52&offset=-8', 52, -8)]:
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/weekly-stats/historical_stats/?{query}')
+                self.assertEqual(response.status_code, 200)
+                expected = historical_stats_baseline(self.user, weeks_back, offset)
+                self.assertEqual(response.json(), expected)
+                # The data covers what the comparison is about
+                self.assertGreater(len({row['week'].split()[1] for row in expected}), 1)
+                self.assertTrue(any(row['weeklyTarget'] == 0 for row in expected))
+                self.assertTrue(any(row['weeklyTarget'] > 0 for row in expected))
+                self.assertTrue(any(row['completedPlanned'] and row['completedUnplanned'] for row in expected))
+
+    def test_no_weeks(self):
+        response = self.client.get('/api/weekly-stats/historical_stats/?weeks_back=0')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+        self.assertEqual(response.json(), historical_stats_baseline(self.user, 0))
+        self.assertEqual(week_snapshots(self.user, date.today(), history_weeks=-1), [])
+
+    def test_longest_history(self):
+        # One target lookup whatever the number of weeks (an OR per week broke SQLite at ~1000)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(week_snapshots(self.user, date.today(), history_weeks=1199)), 1200)
+        response = self.client.get(f'/api/weekly-stats/historical_stats/?weeks_back={MAX_WEEKS}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), historical_stats_baseline(self.user, MAX_WEEKS))
+
+    def test_invalid_weeks_back(self):
+        for query in ['weeks_back=-3', 'weeks_back=abc', 'offset=1.5', f'weeks_back={MAX_WEEKS + 1}']:
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/weekly-stats/historical_stats/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+class KpiSummaryTests(APITestCase):
+    """kpi_summary over ranges that do not line up with ISO weeks, and its range limit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('kpi')
+        exercise = Exercise.objects.create(
+            name="KPI exercise", activity='Strength', type='Barbell', muscle_group='Legs', training_points=8,
+        )
+        routine = Routine.objects.create(name="KPI routine")
+        routine.exercises.set([exercise])
+        # 8 planned points every day of W41-W43 2026 (Mon Oct 5 - Sun Oct 25), completed on Thursdays
+        start = date(2026, 10, 5)
+        for offset in range(21):
+            day = start + timedelta(days=offset)
+            RoutinePlan.objects.create(user=cls.user, routine=routine, date=day)
+            if day.weekday() == 3:
+                ExerciseLog.objects.create(user=cls.user, exercise=exercise, date=day, completed=True)
+        TopDownWeeklyTarget.objects.create(user=cls.user, year=2026, week=41, target_points=100)
+        TopDownWeeklyTarget.objects.create(user=cls.user, year=2026, week=42, target_points=100)
+        TopDownWeeklyTarget.objects.create(user=cls.user, year=2026, week=43, target_points=70)
+        rebuild_user(cls.user.pk)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def kpi(self, start, end):
+        return self.client.get('/api/weekly-stats/kpi_summary/', {'start_date': start, 'end_date': end})
+
+    def test_week_not_aligned_to_monday(self):
+        # Thu Oct 8 - Wed Oct 14: 4 days of W41 and 3 of W42, 56 planned points against one week's target
+        data = self.kpi(date(2026, 10, 8), date(2026, 10, 14)).json()
+        self.assertEqual((data['weekly_target'], data['target_points']), (100, 100.0))
+        self.assertEqual((data['planned_points'], data['completed_points']), (56, 8))
+        self.assertEqual((data['planning_achievement'], data['training_achievement']), (56.0, 14.3))
+
+    def test_part_of_one_week(self):
+        # Mon Oct 12 - Wed Oct 14 is measured against W42's whole target, as before ranges could span weeks
+        data = self.kpi(date(2026, 10, 12), date(2026, 10, 14)).json()
+        self.assertEqual((data['target_points'], data['planned_points'], data['planning_achievement']), (100.0, 24, 24.0))
+
+    def test_weekly_breakdown(self):
+        # Thu Oct 8 - Tue Oct 20: 4 days of W41, all of W42, 2 days of W43
+        data = self.kpi(date(2026, 10, 8), date(2026, 10, 20)).json()
+        self.assertEqual(data['weekly_breakdown'], [
+            {'week': 'W41 2026', 'start_date': '2026-10-08', 'end_date': '2026-10-11', 'target_points': 100,
+             'planned_points': 32, 'completed_points': 8, 'planning_achievement': 32.0, 'training_achievement': 25.0},
+            {'week': 'W42 2026', 'start_date': '2026-10-12', 'end_date': '2026-10-18', 'target_points': 100,
+             'planned_points': 56, 'completed_points': 8, 'planning_achievement': 56.0, 'training_achievement': 14.3},
+            {'week': 'W43 2026', 'start_date': '2026-10-19', 'end_date': '2026-10-20', 'target_points': 70,
+             'planned_points': 16, 'completed_points': 0, 'planning_achievement': 22.9, 'training_achievement': 0},
+        ])
+        # Targets prorated: 100 * 4/7 + 100 + 70 * 2/7
+        self.assertEqual(data['target_points'], 177.1)
+        self.assertEqual(data['planned_points'], 104)
+        self.assertEqual(data['planning_achievement'], round(104 / (100 * 4 / 7 + 100 + 70 * 2 / 7) * 100, 1))
+        self.assertEqual(len(data['daily_metrics']), 13)
+
+    def test_range_limit(self):
+        start = date(2000, 1, 3)  # a Monday
+        self.assertEqual(self.kpi(start, start + timedelta(weeks=MAX_WEEKS, days=-1)).status_code, 200)
+        for end in [start + timedelta(weeks=MAX_WEEKS), date(2026, 1, 1)]:
+            with self.subTest(end=end):
+                response = self.kpi(start, end)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+def stored_rollup(user_id):
+    """The user's DailyPointsRollup rows in compute_daily_points' shape."""
+    return {
+        row.pop('date'): row
+        for row in DailyPointsRollup.objects.filter(user_id=user_id).values(
+            'date', 'planned_points', 'completed_points', 'completed_planned_points', 'completed_unplanned_points',
+        )
+    }
+
+
+class RollupRebuildTests(APITestCase):
+    """The backfill migration and rebuild_points_rollup fill the rollup from the raw rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        exercises, routines = seed_catalog("Rebuild", exercises=6, routines=3)
+        cls.users = [get_user_model().objects.create_user(f'rebuild-{i}') for i in range(2)]
+        # bulk_create sends no signals: the rollup starts empty, as for data predating it
+        for i, user in enumerate(cls.users):
+            RoutinePlan.objects.bulk_create([
+                RoutinePlan(user=user, routine=routines[(i + n) % 3], date=date(2021, 3, 1) + timedelta(days=n))
+                for n in range(20)
+            ])
+            ExerciseLog.objects.bulk_create([
+                ExerciseLog(user=user, exercise=exercises[(i + n) % 6], date=date(2021, 3, 1) + timedelta(days=n),
+                            completed=n % 3 != 0)
+                for n in range(20)
+            ])
+        cls.idle = get_user_model().objects.create_user('rebuild-idle')
+        DailyPointsRollup.objects.create(user=cls.idle, date=date(2021, 3, 1), planned_points=5)
+
+    def test_backfill_migration(self):
+        migration = importlib.import_module('api.migrations.0018_backfill_points_rollup')
+        migration.backfill_points_rollup(None, None)
+        for user in self.users:
+            expected = compute_daily_points(user.pk)
+            self.assertTrue(expected)
+            self.assertEqual(stored_rollup(user.pk), expected)
+        self.assertEqual(stored_rollup(self.idle.pk), {})
+
+    def test_interrupted_rebuild_keeps_unreached_users(self):
+        first, second = self.users
+        rebuild_user(second.pk)
+        before = stored_rollup(second.pk)
+
+        def compute(user_id, *args):
+            if user_id == second.pk:
+                raise RuntimeError('interrupted')
+            return compute_daily_points(user_id, *args)
+
+        with mock.patch('api.rollups.compute_daily_points', compute), self.assertRaises(RuntimeError):
+            call_command('rebuild_points_rollup', stdout=io.StringIO())
+        self.assertEqual(stored_rollup(first.pk), compute_daily_points(first.pk))
+        self.assertEqual(stored_rollup(second.pk), before)
+
+
+class RollupMaintenanceTests(APITestCase):
+    """After every kind of write, the signal-maintained rollup equals a from-scratch compute."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exercises, cls.routines = seed_catalog("Maintained", exercises=6, routines=3)
+        cls.users = [get_user_model().objects.create_user(f'maintained-{i}') for i in range(2)]
+        rng = random.Random(4)
+        start = date(2021, 6, 7)  # a Monday; three weeks of data
+        for user in cls.users:
+            for n in range(21):
+                day = start + timedelta(days=n)
+                if rng.random() < 0.7:
+                    RoutinePlan.objects.create(user=user, routine=rng.choice(cls.routines[1:]), date=day)
+                # More completions than plans of some exercises, so both matched columns get points
+                for exercise in rng.sample(cls.exercises, 3):
+                    ExerciseLog.objects.create(user=user, exercise=exercise, date=day, completed=rng.random() < 0.8)
+        for user in cls.users:
+            rebuild_user(user.pk)
+
+    def assertRollupMatches(self):
+        for user in self.users:
+            expected = compute_daily_points(user.pk)
+            self.assertTrue(any(row['completed_planned_points'] for row in expected.values()))
+            self.assertTrue(any(row['completed_unplanned_points'] for row in expected.values()))
+            self.assertEqual(stored_rollup(user.pk), expected)
+
+    def change(self, write):
+        with self.captureOnCommitCallbacks(execute=True):
+            write()
+        self.assertRollupMatches()
+
+    def test_training_points_change(self):
+        exercise = Exercise.objects.get(pk=self.exercises[1].pk)
+        exercise.training_points += 7
+        self.change(exercise.save)
+
+    def test_routine_exercises_add_remove_clear(self):
+        routine = Routine.objects.get(pk=self.routines[1].pk)
+        exercise = Exercise.objects.get(pk=self.exercises[0].pk)
+        self.change(lambda: routine.exercises.add(exercise))
+        self.change(lambda: routine.exercises.remove(exercise))
+        self.change(lambda: exercise.routines.add(*self.routines[1:]))
+        self.change(lambda: exercise.routines.remove(self.routines[2]))
+        self.change(exercise.routines.clear)
+        self.change(routine.exercises.clear)
+
+    def test_log_moved_to_another_week(self):
+        log = ExerciseLog.objects.filter(user=self.users[0], completed=True).order_by('date').first()
+        # Into a week that has plans for the exercise, then out of the data entirely
+        log.date = next(
+            day for day in RoutinePlan.objects.filter(
+                user=self.users[0], date__gte=date(2021, 6, 21), routine__exercises=log.exercise,
+            ).values_list('date', flat=True)
+            if not ExerciseLog.objects.filter(user=self.users[0], exercise=log.exercise, date=day).exists()
+        )
+        self.change(log.save)
+        log.date = date(2021, 7, 5)
+        self.change(log.save)
+
+    def test_log_completed_toggled(self):
+        log = ExerciseLog.objects.filter(user=self.users[0]).order_by('date').first()
+        log.completed = not log.completed
+        self.change(log.save)
+
+    def test_log_delete(self):
+        self.change(ExerciseLog.objects.filter(user=self.users[1], completed=True).order_by('date').first().delete)
+
+    def test_plan_moved_and_changed(self):
+        plan = RoutinePlan.objects.filter(user=self.users[0]).order_by('date').first()
+        plan.date = date(2021, 7, 1)
+        self.change(plan.save)
+        plan.routine = self.routines[0]  # the empty routine
+        self.change(plan.save)
+
+    def test_plan_delete(self):
+        self.change(RoutinePlan.objects.filter(user=self.users[1]).order_by('-date').first().delete)
+
+    def test_exercise_delete(self):
+        self.change(Exercise.objects.get(pk=self.exercises[2].pk).delete)
+
+
+
+class ConditionalStatsTests(APITestCase):
+    """An unchanged weekly-stats reload costs one DataVersion query; any write changes the ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('conditional')
+        cls.exercises, cls.routines = seed_catalog("Conditional", exercises=4, routines=2)
+        seed_history(cls.user, 20, cls.exercises, cls.routines, start=date.today() - timedelta(days=19))
+        bump(user_key(cls.user.pk))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        today = date.today()
+        self.paths = [
+            '/api/weekly-stats/historical_stats/?weeks_back=12',
+            f'/api/weekly-stats/kpi_summary/?start_date={today - timedelta(days=28)}&end_date={today}',
+            '/api/weekly-stats/analysis/',
+        ]
+
+    def etags(self):
+        etags = {}
+        for path in self.paths:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            etags[path] = response['ETag']
+        return etags
+
+    def test_unchanged_reload_is_one_query(self):
+        for path, etag in self.etags().items():
+            with self.subTest(path=path), self.assertNumQueries(1):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_writes_change_the_etag(self):
+        far = date(2100, 1, 4)
+        writes = [
+            ('exercise log', '/api/exercise-logs/', {'exercise': self.exercises[0].pk, 'date': far, 'completed': True}),
+            ('routine plan', '/api/routine-plans/', {'routine': self.routines[1].pk, 'date': far}),
+            ('weekly target', '/api/weekly-targets/', {'year': 2100, 'week': 1, 'target_points': 30}),
+        ]
+        for label, url, data in writes:
+            before = self.etags()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.client.post(url, data, format='json').status_code, 201)
+            after = self.etags()
+            for path in self.paths:
+                with self.subTest(write=label, path=path):
+                    self.assertNotEqual(after[path], before[path])
+                    self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=before[path]).status_code, 200)
+
+
+class FastReadContractTests(APITestCase):
+    """The readers.py fast paths must render byte-for-byte what the serializers render."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('contract')
+        exercises, routines = seed_catalog("Contract", exercises=6, routines=3)
+        exercises[0].name = 'Curl "21s" \u2013 \u00e9l\u00e8ve </script>'
+        exercises[0].save()
+        # seed_history gives sets without a weight and logs without sets
+        seed_history(cls.user, 30, exercises, routines, start=date.today() - timedelta(days=29))
+        empty = Routine.objects.create(name="Contract rest day")
+        RoutinePlan.objects.create(user=cls.user, routine=empty, date=date.today() + timedelta(days=1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.renderer = FastJSONRenderer()
+
+    def test_list_endpoints_match_serializers(self):
+        logs = ExerciseLog.objects.filter(user=self.user).select_related('exercise').prefetch_related('sets')
+        plans = RoutinePlan.objects.filter(user=self.user).select_related('routine').prefetch_related('routine__exercises')
+        cases = [
+            ('/api/exercise-logs/', ExerciseLogSerializer(logs.order_by('date', 'exercise__name'), many=True)),
+            ('/api/routine-plans/', RoutinePlanSerializer(plans.order_by('date'), many=True)),
+        ]
+        for path, serializer in cases:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, self.renderer.render(serializer.data))
+
+    def test_sync_rows_match_serializers(self):
+        logs = ExerciseLog.objects.filter(user=self.user).select_related('exercise').prefetch_related('sets').order_by('pk')
+        plans = RoutinePlan.objects.filter(user=self.user).select_related('routine').prefetch_related(
+            'routine__exercises').order_by('pk')
+        sets = ExerciseSet.objects.filter(exercise_log__user=self.user).order_by('pk')
+        targets = TopDownWeeklyTarget.objects.filter(user=self.user).order_by('pk')
+        cases = [
+            (exercise_log_rows, ExerciseLogSerializer, logs),
+            (routine_plan_rows, RoutinePlanSerializer, plans),
+            (exercise_set_rows, ExerciseSetSerializer, sets),
+            (weekly_target_rows, TopDownWeeklyTargetSerializer, targets),
+        ]
+        for build_rows, serializer_class, queryset in cases:
+            with self.subTest(reader=build_rows.__name__):
+                self.assertEqual(
+                    self.renderer.render(build_rows(queryset)),
+                    self.renderer.render(serializer_class(queryset, many=True).data),
+                )
+
+    def test_data_covers_the_edge_cases(self):
+        rows = self.client.get('/api/exercise-logs/').json()
+        weights = [row['weight_kg'] for log in rows for row in log['sets']]
+        self.assertIn(None, weights)
+        self.assertTrue(any(weight is not None for weight in weights))
+        self.assertTrue(any(not log['sets'] for log in rows))
+        plans = self.client.get('/api/routine-plans/').json()
+        self.assertTrue(any(not plan['exercises_details'] for plan in plans))
+
+
+class AnalysisStreamTests(APITestCase):
+    """POST weekly-stats/analysis_stream/ relays the fake client's chunks as Server-Sent Events."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('stream')
+        exercises, routines = seed_catalog("Stream", exercises=4, routines=2)
+        seed_history(cls.user, 14, exercises, routines, start=date.today() - timedelta(days=13))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        llm.reset_client()
+        self.addCleanup(llm.reset_client)
+
+    def events(self, response):
+        """[(event, data), ...] parsed from the text/event-stream body, consuming the stream."""
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.endswith('\n\n'))
+        events = []
+        for block in body[:-2].split('\n\n'):
+            event, data = block.split('\n')
+            self.assertTrue(event.startswith('event: ') and data.startswith('data: '), block)
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+        return events
+
+    def test_streams_deltas_then_done(self):
+        response = self.client.post('/api/weekly-stats/analysis_stream/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        # Nothing is stored until the stream has been read to the end
+        self.assertFalse(WeeklyAnalysis.objects.filter(user=self.user).exists())
+
+        events = self.events(response)
+        names = [name for name, _ in events]
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(set(names[:-1]), {'delta'})
+        self.assertGreater(len(names), 2)
+        # The deltas, in order, spell out the model's reply
+        text = ''.join(data['text'] for _, data in events[:-1])
+        analysis = WeeklyAnalysis.objects.get(user=self.user)
+        self.assertEqual(json.loads(text), analysis.content)
+        done = events[-1][1]
+        self.assertEqual((done['content'], done['cached']), (analysis.content, False))
+        self.assertEqual(done['generated_at'], analysis.generated_at.isoformat())
+
+    def test_fresh_analysis_is_a_single_done_event(self):
+        self.events(self.client.post('/api/weekly-stats/analysis_stream/'))
+        events = self.events(self.client.post('/api/weekly-stats/analysis_stream/'))
+        self.assertEqual([name for name, _ in events], ['done'])
+        self.assertEqual((events[0][1]['cached'], events[0][1]['stale']), (True, False))
+
+
+class KeysetPaginationTests(APITestCase):
+    """?cursor= walks a whole list, and a cursor this API did not issue is a 404, never a 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('keyset')
+        exercises, routines = seed_catalog("Keyset", exercises=5, routines=2)
+        seed_history(cls.user, 25, exercises, routines, start=date(2020, 12, 20))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+    def test_pages_cover_the_list(self):
+        for path in ['/api/exercise-logs/', '/api/routine-plans/', '/api/exercise-sets/']:
+            with self.subTest(path=path):
+                rows, url = [], f'{path}?page_size=4'
+                while url:
+                    page = self.client.get(url).json()
+                    rows.extend(page['results'])
+                    url = page['next']
+                # The plain sets list is ordered by set_number only, so compare by id
+                expected = sorted(self.client.get(path).json(), key=lambda row: row['id'])
+                self.assertEqual(sorted(rows, key=lambda row: row['id']), expected)
+
+    def test_invalid_cursors(self):
+        cases = [
+            ('/api/exercise-logs/', self.cursor(['notadate', 'a', 1])),
+            ('/api/exercise-logs/', self.cursor(['2021-01-01', 'a', 'b'])),
+            ('/api/exercise-logs/', self.cursor(['2021-01-01', 'a'])),
+            ('/api/exercise-logs/', self.cursor(['2021-01-01', None, 1])),
+            ('/api/routine-plans/', self.cursor([1, 2])),
+            ('/api/routine-plans/', self.cursor(['2021-02-30', 2])),
+            ('/api/routine-plans/', self.cursor({'date': '2021-01-01'})),
+            ('/api/exercise-sets/', self.cursor([[1], 2])),
+            ('/api/exercise-sets/', 'not base64!'),
+            ('/api/exercise-sets/', base64.urlsafe_b64encode(b'\xff[').decode()),
+        ]
+        for path, cursor in cases:
+            with self.subTest(path=path, cursor=cursor):
+                response = self.client.get(path, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'detail': 'Invalid cursor'})
+
+
+class SyncCatalogChangeTests(APITestCase):
+    """Rows embed exercise and routine data, so a catalog change must reach ?since= clients."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('sync')
+        cls.exercises, cls.routines = seed_catalog("Sync", exercises=4, routines=2)
+        seed_history(cls.user, 8, cls.exercises, cls.routines, start=date.today() - timedelta(days=7))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def sync(self, token=None):
+        response = self.client.get('/api/sync/', {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_user_writes_are_deltas(self):
+        token = self.sync()['token']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/exercise-logs/', {
+                'exercise': self.exercises[0].pk, 'date': '2100-01-04', 'completed': True,
+            }, format='json')
+        payload = self.sync(token)
+        self.assertFalse(payload['reset'])
+        self.assertIn('2100-01-04', [row['date'] for row in payload['exercise_logs']])
+
+    def rename_exercise(self):
+        response = self.client.patch(
+            f'/api/exercises/{self.exercises[0].pk}/', {'name': 'Sync renamed exercise'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def rename_routine(self):
+        routine = Routine.objects.get(pk=self.routines[0].pk)
+        routine.name = 'Sync renamed routine'
+        routine.save()
+
+    def change_routine_exercises(self):
+        routine = Routine.objects.get(pk=self.routines[1].pk)
+        routine.exercises.remove(routine.exercises.first())
+
+    def test_catalog_changes_reset(self):
+        first_token = self.sync()['token']
+        for change in [self.rename_exercise, self.rename_routine, self.change_routine_exercises]:
+            with self.subTest(change=change.__name__):
+                token = self.sync()['token']
+                self.assertFalse(self.sync(token)['reset'])
+                with self.captureOnCommitCallbacks(execute=True):
+                    change()
+                payload = self.sync(token)
+                self.assertTrue(payload['reset'])
+                self.assertFalse(self.sync(payload['token'])['reset'])
+
+        payload = self.sync(first_token)
+        self.assertTrue(payload['reset'])
+        self.assertIn('Sync renamed exercise', {row['exercise_name'] for row in payload['exercise_logs']})
+        self.assertIn('Sync renamed routine', {row['routine_name'] for row in payload['routine_plans']})
+
+    def test_tokens(self):
+        token = self.sync()['token']
+        micros = token.split('.')[0]
+        # Tokens issued before they carried the catalog version get a snapshot
+        self.assertTrue(self.sync(micros)['reset'])
+        for bad in ['abc', f'{micros}.x', 'x.1']:
+            with self.subTest(token=bad):
+                self.assertEqual(self.client.get('/api/sync/', {'since': bad}).status_code, 400)
+
+
+class BatchTests(APITestCase):
+    """batch/ applies every operation or none of them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('batch')
+        cls.other = get_user_model().objects.create_user('batch-other')
+        cls.exercise = Exercise.objects.create(
+            name="Batch exercise", activity='Strength', type='Barbell', muscle_group='Legs', training_points=3,
+        )
+        cls.routine = Routine.objects.create(name="Batch routine")
+        cls.log = ExerciseLog.objects.create(user=cls.user, exercise=cls.exercise, date=date(2021, 1, 4))
+        cls.others_log = ExerciseLog.objects.create(user=cls.other, exercise=cls.exercise, date=date(2021, 1, 4))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def creates(self):
+        """Three creates and an update that a failing later operation has to undo."""
+        return [
+            {'method': 'POST', 'resource': 'exercise-logs',
+             'data': {'exercise': self.exercise.pk, 'date': '2021-01-05', 'completed': True}},
+            {'method': 'POST', 'resource': 'routine-plans', 'data': {'routine': self.routine.pk, 'date': '2021-01-05'}},
+            {'method': 'POST', 'resource': 'exercise-sets', 'data': {'exercise_log': self.log.pk, 'reps': 5}},
+            {'method': 'PATCH', 'resource': 'exercise-logs', 'id': self.log.pk, 'data': {'completed': True}},
+        ]
+
+    def state(self):
+        return (
+            list(ExerciseLog.objects.filter(user=self.user).values_list('pk', 'date', 'completed').order_by('pk')),
+            list(RoutinePlan.objects.filter(user=self.user).values_list('pk', flat=True)),
+            list(ExerciseSet.objects.filter(exercise_log__user=self.user).values_list('pk', flat=True)),
+        )
+
+    def test_applies_all(self):
+        response = self.client.post('/api/batch/', {'operations': self.creates()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()['results']], [201, 201, 201, 200])
+        logs, plans, sets = self.state()
+        self.assertEqual((len(logs), len(plans), len(sets)), (2, 1, 1))
+
+    def test_failing_operation_rolls_back_earlier_ones(self):
+        failures = [
+            ('404 missing', {'method': 'PATCH', 'resource': 'exercise-logs', 'id': 999999, 'data': {'completed': True}},
+             404, {'detail': 'Not found.'}),
+            ("404 another user's row", {'method': 'DELETE', 'resource': 'exercise-logs', 'id': self.others_log.pk},
+             404, {'detail': 'Not found.'}),
+            ('405', {'method': 'PUT', 'resource': 'exercise-sets', 'id': 1, 'data': {'reps': 3}},
+             405, {'detail': 'Method "PUT" not allowed.'}),
+            ('409', {'method': 'POST', 'resource': 'routine-plans', 'data': {'routine': self.routine.pk, 'date': '2021-01-05'}},
+             409, {'detail': 'Conflicts with an existing row.'}),
+            ('400', {'method': 'POST', 'resource': 'weekly-targets', 'data': {'year': 2021}},
+             400, {'week': ['This field is required.']}),
+        ]
+        before = self.state()
+        for label, operation, status_code, errors in failures:
+            with self.subTest(failure=label):
+                with self.captureOnCommitCallbacks() as callbacks:
+                    response = self.client.post('/api/batch/', {'operations': [*self.creates(), operation]}, format='json')
+                self.assertEqual(response.status_code, status_code)
+                self.assertEqual(response.json(), {'index': 4, 'errors': errors})
+                self.assertEqual(self.state(), before)
+                self.assertFalse(TopDownWeeklyTarget.objects.filter(user=self.user).exists())
+                # Nothing committed, so no rollup refresh or version bump is left pending
+                self.assertEqual(callbacks, [])
+        self.assertTrue(ExerciseLog.objects.filter(pk=self.others_log.pk).exists())
+
+
+class ScheduleTests(APITestCase):
+    """routine-plans/schedule: the three conflict policies and the input validation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('schedule')
+        exercises, cls.routines = seed_catalog("Schedule", exercises=4, routines=3)
+        cls.first, cls.second, cls.third = cls.routines
+        # Already planned: a Tuesday and a Wednesday inside the scheduled fortnight
+        cls.planned = {
+            date(2021, 3, 2): RoutinePlan.objects.create(user=cls.user, routine=cls.first, date=date(2021, 3, 2)),
+            date(2021, 3, 10): RoutinePlan.objects.create(user=cls.user, routine=cls.first, date=date(2021, 3, 10)),
+        }
+        rebuild_user(cls.user.pk)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def payload(self, **data):
+        # routine=None leaves the routine out, for the weekdays form
+        payload = {'routine': self.second.pk, 'start_date': '2021-03-01', 'weeks': 2, **data}
+        return {key: value for key, value in payload.items() if value is not None}
+
+    def schedule(self, **data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/routine-plans/schedule/', self.payload(**data), format='json')
+
+    def plans(self):
+        return dict(RoutinePlan.objects.filter(user=self.user).values_list('date', 'routine_id'))
+
+    def assertSummary(self, response, created, overwritten, skipped):
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {
+            'start_date': '2021-03-01', 'end_date': '2021-03-14',
+            'created': created, 'overwritten': overwritten, 'skipped': skipped,
+        })
+        # bulk_create sends no signals; the view refreshes the rollup itself
+        self.assertEqual(stored_rollup(self.user.pk), compute_daily_points(self.user.pk))
+
+    def test_skip(self):
+        self.assertSummary(self.schedule(on_conflict='skip'), created=12, overwritten=0, skipped=2)
+        plans = self.plans()
+        self.assertEqual(len(plans), 14)
+        self.assertEqual({day: plans[day] for day in self.planned}, dict.fromkeys(self.planned, self.first.pk))
+        self.assertEqual(set(plans.values()), {self.first.pk, self.second.pk})
+
+    def test_skip_is_the_default(self):
+        self.assertSummary(self.schedule(), created=12, overwritten=0, skipped=2)
+
+    def test_overwrite(self):
+        self.assertSummary(self.schedule(on_conflict='overwrite'), created=12, overwritten=2, skipped=0)
+        plans = self.plans()
+        self.assertEqual(len(plans), 14)
+        self.assertEqual(set(plans.values()), {self.second.pk})
+        # Overwritten days keep their row (and id), with a fresh updated_at for delta sync
+        for day, plan in self.planned.items():
+            stored = RoutinePlan.objects.get(user=self.user, date=day)
+            self.assertEqual(stored.pk, plan.pk)
+            self.assertGreater(stored.updated_at, plan.updated_at)
+
+    def test_fail(self):
+        before = self.plans()
+        response = self.schedule(on_conflict='fail')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {'error': '2 day(s) already planned', 'dates': ['2021-03-02', '2021-03-10']})
+        self.assertEqual(self.plans(), before)
+
+    def test_fail_without_conflicts(self):
+        response = self.schedule(on_conflict='fail', start_date='2021-04-05')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['created'], response.json()['skipped']), (14, 0))
+
+    def test_weekdays(self):
+        response = self.schedule(
+            routine=None, weekdays={'monday': self.third.pk, 'thursday': self.second.pk}, weeks=3, on_conflict='fail',
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['created'], response.json()['end_date']), (6, '2021-03-21'))
+        new = {day: routine for day, routine in self.plans().items() if day not in self.planned}
+        self.assertEqual(sorted(new), [
+            date(2021, 3, 1), date(2021, 3, 4), date(2021, 3, 8), date(2021, 3, 11), date(2021, 3, 15), date(2021, 3, 18),
+        ])
+        self.assertEqual({day.weekday(): routine for day, routine in new.items()}, {0: self.third.pk, 3: self.second.pk})
+
+    def test_invalid_input(self):
+        cases = [
+            ('unknown weekday', {'routine': None, 'weekdays': {'funday': self.first.pk}}),
+            ('both routine and weekdays', {'weekdays': {'monday': self.first.pk}}),
+            ('neither', {'routine': None}),
+            ('unknown routine', {'routine': 999999}),
+            ('unknown weekday routine', {'routine': None, 'weekdays': {'monday': 999999}}),
+            ('no weeks', {'weeks': 0}),
+            ('too many weeks', {'weeks': 53}),
+            ('unknown policy', {'on_conflict': 'merge'}),
+        ]
+        before = self.plans()
+        for label, data in cases:
+            with self.subTest(case=label):
+                response = self.client.post('/api/routine-plans/schedule/', self.payload(**data), format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.plans(), before)
+
+
+class ExerciseSetBulkTests(APITestCase):
+    """exercise-sets/bulk and exercise-sets/reorder: numbering, ownership and the order check."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('sets')
+        cls.other = get_user_model().objects.create_user('sets-other')
+        exercise = Exercise.objects.create(name="Sets exercise", activity='Strength', type='Barbell', muscle_group='Legs')
+        cls.log = ExerciseLog.objects.create(user=cls.user, exercise=exercise, date=date(2021, 3, 1))
+        cls.other_log = ExerciseLog.objects.create(user=cls.other, exercise=exercise, date=date(2021, 3, 1))
+        cls.sets = [ExerciseSet.objects.create(exercise_log=cls.log, set_number=n, reps=10 + n) for n in (1, 2, 3)]
+        ExerciseSet.objects.create(exercise_log=cls.other_log, set_number=1, reps=5)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def numbering(self, exercise_log):
+        return list(ExerciseSet.objects.filter(exercise_log=exercise_log).order_by('set_number').values_list('set_number', 'reps'))
+
+    def test_bulk_continues_after_existing_sets(self):
+        response = self.client.post('/api/exercise-sets/bulk/', {'exercise_log': self.log.pk, 'sets': [
+            {'reps': 8, 'weight_kg': '20.50', 'completed': True}, {'reps': 6},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([(row['set_number'], row['reps'], row['weight_kg'], row['completed']) for row in response.json()], [
+            (4, 8, '20.50', True), (5, 6, None, False),
+        ])
+        self.assertEqual(self.numbering(self.log), [(1, 11), (2, 12), (3, 13), (4, 8), (5, 6)])
+
+    def test_bulk_on_an_empty_log_starts_at_one(self):
+        ExerciseSet.objects.filter(exercise_log=self.log).delete()
+        response = self.client.post('/api/exercise-sets/bulk/', {'exercise_log': self.log.pk, 'sets': [{'reps': 8}]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.numbering(self.log), [(1, 8)])
+
+    def test_bulk_on_another_users_log(self):
+        response = self.client.post('/api/exercise-sets/bulk/', {'exercise_log': self.other_log.pk, 'sets': [{'reps': 8}]}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.numbering(self.other_log), [(1, 5)])
+
+    def test_bulk_invalid_input(self):
+        cases = [
+            ('unknown log', {'exercise_log': 999999, 'sets': [{'reps': 8}]}),
+            ('no sets', {'exercise_log': self.log.pk, 'sets': []}),
+            ('invalid set', {'exercise_log': self.log.pk, 'sets': [{'reps': 8}, {'reps': -1}]}),
+        ]
+        for label, payload in cases:
+            with self.subTest(case=label):
+                self.assertEqual(self.client.post('/api/exercise-sets/bulk/', payload, format='json').status_code, 400)
+        self.assertEqual(self.numbering(self.log), [(1, 11), (2, 12), (3, 13)])
+
+    def test_reorder(self):
+        first, second, third = (row.pk for row in self.sets)
+        response = self.client.post('/api/exercise-sets/reorder/', {'exercise_log': self.log.pk, 'order': [third, first, second]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['id'], row['set_number']) for row in response.json()], [(third, 1), (first, 2), (second, 3)])
+        self.assertEqual(self.numbering(self.log), [(1, 13), (2, 11), (3, 12)])
+
+    def test_reorder_must_list_every_set_once(self):
+        first, second, third = (row.pk for row in self.sets)
+        other_set = ExerciseSet.objects.get(exercise_log=self.other_log).pk
+        cases = [
+            ('missing a set', [third, first]),
+            ('duplicate set', [third, first, first]),
+            ('duplicate instead of a set', [third, first, first, second]),
+            ('set of another log', [third, first, second, other_set]),
+            ('empty', []),
+        ]
+        for label, order in cases:
+            with self.subTest(case=label):
+                response = self.client.post('/api/exercise-sets/reorder/', {'exercise_log': self.log.pk, 'order': order}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.numbering(self.log), [(1, 11), (2, 12), (3, 13)])
+
+    def test_reorder_another_users_log(self):
+        other_set = ExerciseSet.objects.get(exercise_log=self.other_log).pk
+        response = self.client.post('/api/exercise-sets/reorder/', {'exercise_log': self.other_log.pk, 'order': [other_set]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class CompressionTests(APITestCase):
+    """CompressionMiddleware and negotiate_encoding, plus the orjson renderer/parser pair."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('compression')
+        exercises, routines = seed_catalog("Compression", exercises=30, routines=2)
+        seed_history(cls.user, 7, exercises, routines, start=date.today() - timedelta(days=6))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        catalog.clear()
+        self.addCleanup(catalog.clear)
+        llm.reset_client()
+        self.addCleanup(llm.reset_client)
+
+    def vary(self, response):
+        return [value.strip() for value in response.get('Vary', '').split(',')]
+
+    def test_negotiate_encoding(self):
+        cases = [
+            ('', None),
+            ('gzip', 'gzip'),
+            ('deflate, GZip ;q=0.5', 'gzip'),
+            ('gzip;q=0', None),
+            ('gzip;q=0.0, deflate', None),
+            ('gzip;q=oops', None),
+            ('*', 'gzip'),
+            ('*;q=0', None),
+            ('gzip;q=0, *', None),  # an explicit refusal wins over the wildcard
+            ('identity', None),
+            ('br', None),  # brotli is not offered while the package is missing
+        ]
+        with mock.patch.object(middleware, 'brotli', None):
+            for header, expected in cases:
+                with self.subTest(header=header):
+                    self.assertEqual(middleware.negotiate_encoding(header), expected)
+
+    def test_negotiate_encoding_prefers_brotli(self):
+        cases = [
+            ('gzip, br', 'br'),
+            ('br;q=0.1, gzip', 'br'),
+            ('br;q=0, gzip', 'gzip'),
+            ('*', 'br'),
+            ('br;q=0, *;q=0', None),
+        ]
+        with mock.patch.object(middleware, 'brotli', object()):
+            for header, expected in cases:
+                with self.subTest(header=header):
+                    self.assertEqual(middleware.negotiate_encoding(header), expected)
+
+    def test_gzip(self):
+        plain = self.client.get('/api/exercises/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertGreaterEqual(len(plain.content), 1024)
+
+        response = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_vary(self):
+        # Both variants say that they depend on Accept-Encoding, so caches keep them apart
+        for accept_encoding in ['gzip', 'identity', '']:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertIn('Accept-Encoding', self.vary(response))
+
+    def test_refused_encoding(self):
+        for accept_encoding in ['gzip;q=0', '*;q=0', 'identity']:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertNotIn('Content-Encoding', response)
+                self.assertEqual(response.content, self.client.get('/api/exercises/').content)
+
+    def test_size_threshold(self):
+        size = len(self.client.get('/api/exercises/').content)
+        with override_settings(COMPRESSION_MIN_BYTES=size + 1):
+            response = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertNotIn('Content-Encoding', response)
+            self.assertNotIn('Accept-Encoding', self.vary(response))
+            self.assertEqual(len(response.content), size)
+        with override_settings(COMPRESSION_MIN_BYTES=size):
+            response = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_strong_etag_becomes_weak(self):
+        etag = catalog.etag(catalog.current_version())
+        self.assertEqual(self.client.get('/api/exercises/')['ETag'], etag)
+        response = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/' + etag)
+        # The weak tag a client stores from the gzip response still revalidates
+        response = self.client.get('/api/exercises/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH='W/' + etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_stream_is_not_compressed(self):
+        response = self.client.post('/api/weekly-stats/analysis_stream/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertNotIn('Content-Encoding', response)
+        body = b''.join(response.streaming_content)
+        self.assertTrue(body.startswith(b'event: '))
+
+    def test_renderer_matches_drf_and_parser_round_trips(self):
+        data = {
+            'name': 'Curl "21s" \u2013 \u00e9l\u00e8ve </script> \u2028\u2029',
+            'weight_kg': Decimal('20.50'),
+            'when': datetime(2021, 3, 1, 7, 30, tzinfo=timezone.get_fixed_timezone(60)),
+            'day': date(2021, 3, 1),
+            'nested': [{'reps': 8, 'completed': True, 'note': None}, [], {}],
+            1: 'non-string key',
+        }
+        body = FastJSONRenderer().render(data)
+        self.assertEqual(body, JSONRenderer().render(data))
+        parsed = FastJSONParser().parse(io.BytesIO(body))
+        self.assertEqual(parsed, json.loads(JSONRenderer().render(data)))
+        self.assertEqual(parsed['name'], data['name'])
+        self.assertEqual(FastJSONRenderer().render(parsed), body)
+
+    def test_parser_rejects_invalid_json(self):
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"reps": '))
+        response = self.client.post('/api/exercise-sets/bulk/', b'{"sets": [', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ExerciseCatalogCacheTests(APITestCase):
+    """The per-worker rendered catalog behind GET exercises/ and its ETag revalidation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('catalog')
+        cls.exercises, _ = seed_catalog("Catalog", exercises=5, routines=1)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        catalog.clear()
+        self.addCleanup(catalog.clear)
+
+    def names(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.json()]
+
+    def change(self, method, path, data=None):
+        # The catalog version is bumped on commit, like every other version
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertLess(response.status_code, 300)
+        return response
+
+    def test_cached_render_is_served_until_the_catalog_changes(self):
+        first = self.client.get('/api/exercises/')
+        # A hit costs the version lookup only
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/exercises/').content, first.content)
+        # A write that bypasses the signals goes unseen: the bytes follow the version, not the rows
+        Exercise.objects.filter(pk=self.exercises[0].pk).update(name="Catalog renamed quietly")
+        self.assertEqual(self.client.get('/api/exercises/').content, first.content)
+
+    def test_save_invalidates(self):
+        before = self.client.get('/api/exercises/')
+        self.change('patch', f'/api/exercises/{self.exercises[0].pk}/', {'name': "Catalog zz renamed"})
+        response = self.client.get('/api/exercises/')
+        self.assertIn("Catalog zz renamed", self.names(response))
+        self.assertNotIn(self.exercises[0].name, self.names(response))
+        self.assertNotEqual(response['ETag'], before['ETag'])
+
+    def test_create_and_delete_invalidate(self):
+        self.client.get('/api/exercises/')
+        created = self.change('post', '/api/exercises/', {
+            'name': "Catalog added", 'activity': 'Strength', 'type': 'Barbell', 'muscle_group': 'Legs',
+        }).json()
+        self.assertIn("Catalog added", self.names(self.client.get('/api/exercises/')))
+        self.change('delete', f"/api/exercises/{created['id']}/")
+        self.assertNotIn("Catalog added", self.names(self.client.get('/api/exercises/')))
+
+    def test_another_workers_bump_invalidates(self):
+        self.client.get('/api/exercises/')
+        Exercise.objects.filter(pk=self.exercises[0].pk).update(name="Catalog renamed elsewhere")
+        bump(catalog.CATALOG_KEY)  # what the other worker's commit leaves in DataVersion
+        self.assertIn("Catalog renamed elsewhere", self.names(self.client.get('/api/exercises/')))
+
+    def test_if_none_match(self):
+        etag = self.client.get('/api/exercises/')['ETag']
+        self.assertEqual(etag, catalog.etag(catalog.current_version()))
+        for header in [etag, 'W/' + etag, f'"stale", {etag}', '*']:
+            with self.subTest(if_none_match=header):
+                with self.assertNumQueries(1):
+                    response = self.client.get('/api/exercises/', HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+    def test_stale_if_none_match(self):
+        etag = self.client.get('/api/exercises/')['ETag']
+        self.change('delete', f'/api/exercises/{self.exercises[-1].pk}/')
+        response = self.client.get('/api/exercises/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(self.names(response)), len(self.exercises) - 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class NormalizedFormatTests(APITestCase):
+    """?format=normalized: ids in the rows, every routine and exercise sideloaded exactly once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('normalized')
+        other = get_user_model().objects.create_user('normalized-other')
+        cls.exercises, routines = seed_catalog("Normalized", exercises=8, routines=4)
+        cls.empty, cls.first, cls.second, cls.unplanned = routines
+        # One exercise shared by both planned routines, so deduplication has something to do
+        cls.second.exercises.add(cls.first.exercises.first())
+        for offset, routine in enumerate([cls.first, cls.second, cls.first, cls.empty, cls.first]):
+            RoutinePlan.objects.create(user=cls.user, routine=routine, date=date(2021, 3, 1) + timedelta(days=offset))
+        RoutinePlan.objects.create(user=other, routine=cls.unplanned, date=date(2021, 3, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.json()
+
+    def assertSideloads(self, payload, routine_ids):
+        routines, exercises = payload['routines'], payload['exercises']
+        routines = routines if isinstance(routines, dict) else {str(routine['id']): routine for routine in routines}
+        self.assertEqual(set(routines), {str(pk) for pk in routine_ids})
+        for key, routine in routines.items():
+            self.assertEqual(set(routine), {'id', 'name', 'exercises'})
+            self.assertEqual(key, str(routine['id']))
+            self.assertEqual(len(routine['exercises']), len(set(routine['exercises'])))
+        member_ids = {pk for routine in routines.values() for pk in routine['exercises']}
+        self.assertEqual(set(exercises), {str(pk) for pk in member_ids})
+        for key, exercise in exercises.items():
+            self.assertEqual(key, str(exercise['id']))
+            self.assertEqual(set(exercise), {'id', 'name', 'activity', 'type', 'muscle_group', 'sub_group', 'training_points'})
+
+    def test_routine_plans(self):
+        payload = self.get('/api/routine-plans/?format=normalized')
+        self.assertEqual(set(payload), {'routine_plans', 'routines', 'exercises'})
+        for row in payload['routine_plans']:
+            self.assertEqual(set(row), {'id', 'user', 'routine', 'date'})
+        # The other user's plan and its routine stay out; the shared exercise is listed once
+        self.assertSideloads(payload, {self.empty.pk, self.first.pk, self.second.pk})
+
+        # Expanded again, the sideloads give back exactly the nested representation
+        nested = self.get('/api/routine-plans/')
+        expanded = [{
+            **row,
+            'routine_name': payload['routines'][str(row['routine'])]['name'],
+            'exercises_details': [
+                payload['exercises'][str(pk)] for pk in payload['routines'][str(row['routine'])]['exercises']
+            ],
+        } for row in payload['routine_plans']]
+        self.assertEqual(expanded, nested)
+
+    def test_routine_plans_date_range(self):
+        payload = self.get('/api/routine-plans/?format=normalized&start_date=2021-03-04&end_date=2021-03-05')
+        self.assertEqual([row['date'] for row in payload['routine_plans']], ['2021-03-04', '2021-03-05'])
+        self.assertSideloads(payload, {self.empty.pk, self.first.pk})
+
+    def test_routines(self):
+        payload = self.get('/api/routines/?format=normalized')
+        self.assertEqual(set(payload), {'routines', 'exercises'})
+        self.assertIsInstance(payload['routines'], list)
+        self.assertSideloads(payload, {self.empty.pk, self.first.pk, self.second.pk, self.unplanned.pk})
+
+        nested = self.get('/api/routines/')
+        expanded = [
+            {**routine, 'exercises_details': [payload['exercises'][str(pk)] for pk in routine['exercises']]}
+            for routine in payload['routines']
+        ]
+        self.assertEqual(expanded, nested)
+
+    def test_empty(self):
+        RoutinePlan.objects.filter(user=self.user).delete()
+        self.assertEqual(self.get('/api/routine-plans/?format=normalized'), {'routine_plans': [], 'routines': {}, 'exercises': {}})
+
+
+class ExerciseLogBulkUpsertTests(APITestCase):
+    """exercise-logs/bulk_upsert: the rows it answers with, per-item errors and re-submission."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('bulk-upsert')
+        cls.other = get_user_model().objects.create_user('bulk-upsert-other')
+        cls.exercises, _ = seed_catalog("Upsert", exercises=4, routines=1)
+        first = cls.exercises[0]
+        # Already logged: one of the submitted exercises (with a set), and one that is not submitted
+        cls.existing = ExerciseLog.objects.create(user=cls.user, exercise=first, date=date(2021, 3, 1))
+        ExerciseSet.objects.create(exercise_log=cls.existing, set_number=1, reps=10)
+        ExerciseLog.objects.create(user=cls.user, exercise=cls.exercises[3], date=date(2021, 3, 1), completed=True)
+        ExerciseLog.objects.create(user=cls.other, exercise=first, date=date(2021, 3, 1))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def upsert(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/exercise-logs/bulk_upsert/', payload, format='json')
+
+    def payload(self):
+        return {'date': '2021-03-01', 'items': [
+            {'exercise': self.exercises[0].pk, 'completed': True},
+            {'exercise': self.exercises[1].pk, 'completed': True},
+            {'exercise': self.exercises[2].pk, 'completed': False},
+        ]}
+
+    def logs(self, user):
+        return sorted(ExerciseLog.objects.filter(user=user).values_list('exercise_id', 'date', 'completed'))
+
+    def test_returns_the_upserted_rows(self):
+        response = self.upsert(self.payload())
+        self.assertEqual(response.status_code, 200)
+        rows = response.json()
+        logs = ExerciseLog.objects.filter(
+            user=self.user, date=date(2021, 3, 1), exercise__in=self.exercises[:3],
+        ).select_related('exercise').prefetch_related('sets').order_by('date', 'exercise__name')
+        self.assertEqual(rows, ExerciseLogSerializer(logs, many=True).data)
+        self.assertEqual([(row['exercise'], row['completed']) for row in rows], [
+            (self.exercises[0].pk, True), (self.exercises[1].pk, True), (self.exercises[2].pk, False),
+        ])
+        # The existing log is updated in place and keeps its sets
+        self.assertEqual(rows[0]['id'], self.existing.pk)
+        self.assertEqual(len(rows[0]['sets']), 1)
+        # Logs that were not submitted, and other users' logs, are left alone
+        self.assertIn((self.exercises[3].pk, date(2021, 3, 1), True), self.logs(self.user))
+        self.assertEqual(self.logs(self.other), [(self.exercises[0].pk, date(2021, 3, 1), False)])
+        self.assertEqual(stored_rollup(self.user.pk), compute_daily_points(self.user.pk))
+
+    def test_resubmission_is_idempotent(self):
+        first = self.upsert(self.payload())
+        logs = self.logs(self.user)
+        version = current_versions(user_key(self.user.pk))[0]
+        second = self.upsert(self.payload())
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(self.logs(self.user), logs)
+        self.assertEqual(ExerciseLog.objects.filter(user=self.user).count(), 4)
+        self.assertEqual(stored_rollup(self.user.pk), compute_daily_points(self.user.pk))
+        # Still a write: delta sync clients are told to look again
+        self.assertGreater(current_versions(user_key(self.user.pk))[0], version)
+
+    def test_item_errors(self):
+        known = self.exercises[1].pk
+        cases = [
+            ('missing completed', {'items': [{'exercise': known, 'completed': True}, {'exercise': known + 1}]},
+             {'items': [{}, {'completed': ['This field is required.']}]}),
+            ('invalid completed', {'items': [{'exercise': known, 'completed': 'maybe'}]},
+             {'items': [{'completed': ['Must be a valid boolean.']}]}),
+            ('duplicate exercise', {'items': [{'exercise': known, 'completed': True}, {'exercise': known, 'completed': False}]},
+             {'items': ['Each exercise may appear only once.']}),
+            ('unknown exercise', {'items': [{'exercise': known, 'completed': True}, {'exercise': 999999, 'completed': True}]},
+             {'items': ['Unknown exercise id(s): [999999]']}),
+            ('no items', {'items': []}, {'items': {'non_field_errors': ['This list may not be empty.']}}),
+        ]
+        before = self.logs(self.user)
+        for label, payload, errors in cases:
+            with self.subTest(case=label):
+                response = self.upsert({'date': '2021-03-02', **payload})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), errors)
+        response = self.upsert({**self.payload(), 'date': '2021-02-30'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {'date'})
+        self.assertEqual(self.logs(self.user), before)
+
+
+class AnalysisCallLogTests(APITestCase):
+    """InstrumentedClient writes one AnalysisCallLog row per call, successful or not."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('call-log')
+
+    def setUp(self):
+        llm.reset_client()
+        self.addCleanup(llm.reset_client)
+
+    def call(self, client, **kwargs):
+        return client.messages.create(
+            model=llm.ANALYSIS_MODEL, max_tokens=llm.ANALYSIS_MAX_TOKENS,
+            messages=[{'role': 'user', 'content': 'x' * 400}], **kwargs,
+        )
+
+    def test_create(self):
+        client = llm.InstrumentedClient(llm.FakeAnthropicClient(latency=0.02))
+        with llm.call_context(user=self.user, year=2021, week=9):
+            message = self.call(client)
+        row = AnalysisCallLog.objects.get()
+        self.assertEqual(
+            (row.user, row.year, row.week, row.model, row.streamed, row.success, row.failure_reason),
+            (self.user, 2021, 9, llm.ANALYSIS_MODEL, False, True, ''),
+        )
+        self.assertEqual((row.input_tokens, row.output_tokens), (message.usage.input_tokens, message.usage.output_tokens))
+        self.assertEqual(row.input_tokens, 100)
+        self.assertGreaterEqual(row.latency_ms, 20)
+
+    def test_create_failure(self):
+        client = llm.InstrumentedClient(_FailingClient())
+        with llm.call_context(user=self.user, year=2021, week=9), self.assertRaisesMessage(RuntimeError, 'overloaded'):
+            self.call(client)
+        row = AnalysisCallLog.objects.get()
+        self.assertEqual(
+            (row.user, row.week, row.success, row.failure_reason, row.input_tokens, row.output_tokens),
+            (self.user, 9, False, 'RuntimeError: overloaded', 0, 0),
+        )
+
+    def test_stream(self):
+        client = llm.InstrumentedClient(llm.FakeAnthropicClient(latency=0.02))
+        with llm.call_context(user=self.user, year=2021, week=9):
+            manager = client.messages.stream(
+                model=llm.ANALYSIS_MODEL, max_tokens=llm.ANALYSIS_MAX_TOKENS, messages=[{'role': 'user', 'content': 'x' * 400}],
+            )
+        # Consumed outside the block, as the SSE view does: the context was captured at stream()
+        with manager as stream:
+            text = ''.join(stream.text_stream)
+            self.assertFalse(AnalysisCallLog.objects.exists())
+        row = AnalysisCallLog.objects.get()
+        self.assertEqual((row.user, row.year, row.week, row.streamed, row.success), (self.user, 2021, 9, True, True))
+        self.assertEqual((row.input_tokens, row.output_tokens), (100, len(text) // 4))
+        self.assertGreaterEqual(row.latency_ms, 20)
+
+    def test_stream_failure(self):
+        client = llm.InstrumentedClient(llm.FakeAnthropicClient())
+        manager = client.messages.stream(model=llm.ANALYSIS_MODEL, max_tokens=1, messages=[{'role': 'user', 'content': 'x'}])
+        with self.assertRaisesMessage(ConnectionError, 'reset by peer'), manager as stream:
+            next(iter(stream.text_stream))
+            raise ConnectionError('reset by peer')
+        row = AnalysisCallLog.objects.get()
+        self.assertEqual(
+            (row.user, row.streamed, row.success, row.failure_reason, row.output_tokens),
+            (None, True, False, 'ConnectionError: reset by peer', 0),
+        )
+
+    def test_recording_failure_does_not_fail_the_call(self):
+        client = llm.InstrumentedClient(llm.FakeAnthropicClient())
+        with mock.patch.object(AnalysisCallLog.objects, 'create', side_effect=RuntimeError('disk full')), \
+                self.assertLogs('api.llm', 'ERROR'):
+            message = self.call(client)
+        self.assertEqual(message.stop_reason, 'end_turn')
+        self.assertFalse(AnalysisCallLog.objects.exists())
+
+    def test_analysis_endpoint_is_logged(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post('/api/weekly-stats/analysis_stream/')
+        b''.join(response.streaming_content)
+        row = AnalysisCallLog.objects.get()
+        year, week = date.today().isocalendar()[:2]
+        self.assertEqual((row.user, (row.year, row.week), row.streamed, row.success), (self.user, (year, week), True, True))
+        self.assertGreater(row.output_tokens, 0)
+
+    def test_admin_weekly_summary(self):
+        for latency_ms, success in [(300, True), (100, True), (200, True), (5000, False)]:
+            AnalysisCallLog.objects.create(
+                model=llm.ANALYSIS_MODEL, latency_ms=latency_ms, input_tokens=10, output_tokens=5, success=success,
+            )
+        year, week = timezone.now().isocalendar()[:2]
+        # Failed calls are counted but kept out of the latency percentiles
+        self.assertEqual(AnalysisCallLogAdmin(AnalysisCallLog, admin.site).weekly_summary(), [{
+            'week': f"W{week:02d} {year}", 'p50_ms': 200, 'p95_ms': 300,
+            'calls': 4, 'failures': 1, 'input_tokens': 40, 'output_tokens': 20,
+        }])
+
+
+
+class ServerTimingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('timing')
+        cls.staff = get_user_model().objects.create_user('timing-staff', is_staff=True)
+        exercises, routines = seed_catalog("Timing", exercises=3, routines=2)
+        seed_history(cls.user, 5, exercises, routines)
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_server_timing_header(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/exercise-logs/')
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", ser;dur=[\d.]+$')
+
+    def test_metrics_are_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/exercise-logs/')
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('http_requests_total{view="exerciselog-list",method="GET",status="200"} 1\n', body)
+        self.assertIn('http_request_duration_seconds_count{view="exerciselog-list",method="GET"} 1\n', body)
+        self.assertIn('http_requests_total{view="metrics",method="GET",status="403"} 1\n', body)
+
+
+class ProfilingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user('profiled')
+        cls.staff = get_user_model().objects.create_user('profiling-staff', is_staff=True)
+        exercises, routines = seed_catalog("Profiling", exercises=3, routines=2)
+        seed_history(cls.user, 5, exercises, routines)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = self.settings(PROFILING_DIR=directory.name, PROFILING_MAX_REPORTS=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+
+    def test_profile_param_is_ignored_for_other_users(self):
+        self.authenticate(self.user)
+        response = self.client.get('/api/exercise-logs/?profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Report', response)
+        self.assertEqual(profiling.list_reports(), [])
+
+    def test_staff_profile_report(self):
+        self.authenticate(self.staff)
+        name = self.client.get('/api/weekly-stats/historical_stats/?profile=1')['X-Profile-Report']
+        [report] = profiling.list_reports()
+        self.assertEqual(report['name'], name)
+        self.assertEqual((report['trigger'], report['view'], report['user']), ('staff', 'weeklystats-historical-stats', 'profiling-staff'))
+
+        self.client.force_login(self.staff)
+        self.assertContains(self.client.get('/admin/profiles/'), name)
+        download = self.client.get(f'/admin/profiles/{name}.json')
+        full = json.loads(b''.join(download.streaming_content))
+        self.assertEqual(len(full['sql']), full['queries'])
+        self.assertIn('historical_stats', full['profile'])
+        self.assertEqual(self.client.get(f'/admin/profiles/{name}.prof').status_code, 200)
+        self.assertEqual(self.client.get('/admin/profiles/..%2Fsettings.json').status_code, 404)
+
+    def test_reports_are_a_ring_buffer(self):
+        self.authenticate(self.staff)
+        names = [self.client.get('/api/routines/?profile=1')['X-Profile-Report'] for _ in range(3)]
+        self.assertEqual([report['name'] for report in profiling.list_reports()], names[:0:-1])
+
+    def test_sampled_requests_over_the_threshold(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_SLOW_MS=0):
+            client = APIClient()  # the middleware reads the sample rate when it is loaded
+            client.force_authenticate(self.user)
+            response = client.get('/api/exercise-logs/')
+        self.assertNotIn('X-Profile-Report', response)
+        [report] = profiling.list_reports()
+        self.assertEqual((report['trigger'], report['user']), ('sampled', 'profiled'))
+
+
+class ConcurrentLogUpsertTests(TransactionTestCase):
+    """POST/PATCH exercise-logs/ for one (user, exercise, date) from many threads at once."""
+    threads = 8
+    requests = 10
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('concurrent')
+        self.exercise = Exercise.objects.create(
+            name="Concurrent exercise", activity='Strength', type='Barbell', muscle_group='Legs',
+        )
+
+    def test_concurrent_toggles_keep_one_row(self):
+        payload = {'exercise': self.exercise.pk, 'date': '2000-01-03'}
+        statuses = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(self.threads)
+
+        def hammer():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                start.wait()
+                for _ in range(self.requests):
+                    completed = random.random() < 0.5
+                    response = client.post('/api/exercise-logs/', {**payload, 'completed': completed}, format='json')
+                    if response.status_code == 201 and random.random() < 0.5:
+                        response = client.patch(
+                            f"/api/exercise-logs/{response.json()['id']}/", {'completed': not completed}, format='json',
+                        )
+                    with lock:
+                        statuses.append(response.status_code)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=hammer) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(statuses), self.threads * self.requests)
+        self.assertLessEqual(set(statuses), {200, 201})
+        self.assertEqual(ExerciseLog.objects.filter(user=self.user, exercise=self.exercise).count(), 1)
+
+    def test_update_does_not_recreate_a_deleted_log(self):
+        log = ExerciseLog.objects.create(user=self.user, exercise=self.exercise, date=date(2000, 1, 3))
+        serializer = ExerciseLogSerializer(log, data={'completed': True}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        ExerciseLog.objects.filter(pk=log.pk).delete()  # deleted by another request meanwhile
+        with self.assertNumQueries(1), self.assertRaises(NotFound):
+            serializer.save()
+        self.assertFalse(ExerciseLog.objects.filter(user=self.user).exists())
+
+class ConcurrentSetAppendTests(TransactionTestCase):
+    """exercise-sets/ and exercise-sets/bulk on one log from many threads at once."""
+    threads = 6
+    requests = 5
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('concurrent-sets')
+        exercise = Exercise.objects.create(
+            name="Concurrent sets exercise", activity='Strength', type='Barbell', muscle_group='Legs',
+        )
+        self.log = ExerciseLog.objects.create(user=self.user, exercise=exercise, date=date(2000, 1, 3))
+
+    def immediate_transactions(self):
+        # SQLite ignores FOR UPDATE, and two deferred transactions that both read before writing
+        # fail with "database is locked" instead of waiting. BEGIN IMMEDIATE takes the write lock
+        # up front, so the threads queue the way they do on the row lock under PostgreSQL.
+        if connection.vendor != 'sqlite':
+            return contextlib.nullcontext()
+        return mock.patch.object(
+            type(connections['default']), '_start_transaction_under_autocommit',
+            lambda wrapper: wrapper.cursor().execute('BEGIN IMMEDIATE'),
+        )
+
+    def test_concurrent_appends_keep_numbers_unique_and_gapless(self):
+        statuses = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(self.threads)
+
+        def hammer(thread):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                start.wait()
+                for _ in range(self.requests):
+                    # Alternate single creates and two-set bulk appends; reps tell the threads apart
+                    if random.random() < 0.5:
+                        response = client.post('/api/exercise-sets/', {'exercise_log': self.log.pk, 'reps': thread}, format='json')
+                    else:
+                        response = client.post('/api/exercise-sets/bulk/', {
+                            'exercise_log': self.log.pk, 'sets': [{'reps': thread}, {'reps': thread}],
+                        }, format='json')
+                    with lock:
+                        statuses.append(response.status_code)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=hammer, args=(thread,)) for thread in range(self.threads)]
+        with self.immediate_transactions():
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(statuses), self.threads * self.requests)
+        self.assertEqual(set(statuses), {201})
+        numbers = list(ExerciseSet.objects.filter(exercise_log=self.log).order_by('set_number').values_list('set_number', flat=True))
+        self.assertEqual(numbers, list(range(1, len(numbers) + 1)))
+        self.assertGreaterEqual(len(numbers), self.threads * self.requests)
+
+
+
+class AnalysisQueueTests(TransactionTestCase):
+    """POST weekly-stats/analysis/ queues a job that run_analysis_worker drains with the fake client."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('queue')
+        exercises, routines = seed_catalog("Queue", exercises=4, routines=2)
+        seed_history(self.user, 14, exercises, routines, start=date.today() - timedelta(days=13))
+        llm.reset_client()
+        self.addCleanup(llm.reset_client)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_post_worker_poll(self):
+        response = self.client.post('/api/weekly-stats/analysis/')
+        self.assertEqual(response.status_code, 202)
+        job = response.json()
+        self.assertEqual(job['status'], AnalysisJob.STATUS_PENDING)
+        self.assertTrue(response['Location'].endswith(f"/api/analysis-jobs/{job['id']}/"))
+        # Asking again while the job is queued reuses it
+        self.assertEqual(self.client.post('/api/weekly-stats/analysis/').json()['id'], job['id'])
+
+        call_command('run_analysis_worker', '--once', '--threads', '2', stdout=io.StringIO())
+
+        polled = self.client.get(response['Location'])
+        self.assertEqual(polled.status_code, 200)
+        self.assertEqual((polled.json()['status'], polled.json()['error']), (AnalysisJob.STATUS_DONE, ''))
+        self.assertIsNotNone(polled.json()['finished_at'])
+        analysis = WeeklyAnalysis.objects.get(user=self.user, year=job['year'], week=job['week'])
+        self.assertEqual(analysis.content['summary'], 'Offline analysis generated by the fake client.')
+        stored = self.client.get('/api/weekly-stats/analysis/').json()
+        self.assertEqual((stored['content'], stored['cached'], stored['stale']), (analysis.content, True, False))
+
+    def test_concurrent_posts_queue_one_job(self):
+        threads = 6
+        responses = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def post():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                start.wait()
+                response = client.post('/api/weekly-stats/analysis/')
+                with lock:
+                    responses.append(response)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=post) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual({response.status_code for response in responses}, {202})
+        job = AnalysisJob.objects.get(user=self.user)
+        self.assertEqual({response.json()['id'] for response in responses}, {job.pk})
+
+    def test_one_unfinished_job_per_week(self):
+        AnalysisJob.objects.create(user=self.user, year=2000, week=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            AnalysisJob.objects.create(user=self.user, year=2000, week=1, status=AnalysisJob.STATUS_RUNNING)
+        # Finished jobs do not count
+        AnalysisJob.objects.create(user=self.user, year=2000, week=1, status=AnalysisJob.STATUS_DONE)
+        AnalysisJob.objects.create(user=self.user, year=2000, week=1, status=AnalysisJob.STATUS_FAILED)
+
+
+class _FailingClient:
+    """LLM client stand-in whose every call fails."""
+
+    def __init__(self):
+        self.messages = self
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        raise RuntimeError('overloaded')
+
+
+class GenerateWeeklyAnalysesTests(TransactionTestCase):
+    """Retry handling of `manage.py generate_weekly_analyses` (a TransactionTestCase: _generate closes its connection)."""
+
+    def test_backs_off_only_between_attempts(self):
+        user = get_user_model().objects.create_user('retries')
+        week_data = build_week_data(user, 2021, 1)
+        client = _FailingClient()
+        with mock.patch.object(generate_weekly_analyses.time, 'sleep') as sleep:
+            result = generate_weekly_analyses.Command()._generate(
+                user, 2021, 1, week_data, {'retries': 2}, client, generate_weekly_analyses._RateLimiter(0),
+            )
+        self.assertEqual(result, (None, 'RuntimeError: overloaded'))
+        self.assertEqual(client.calls, 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_rejects_negative_retries(self):
+        with self.assertRaisesMessage(CommandError, '--retries must be 0 or more.'):
+            call_command('generate_weekly_analyses', '--retries', '-1', '--fake', stdout=io.StringIO())
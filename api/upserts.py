@@ -0,0 +1,59 @@
+"""
+Single-statement writes for ExerciseLog: INSERT ... ON CONFLICT DO UPDATE upserts, and a plain
+UPDATE for toggling an existing log.
+
+bulk_create and update() send no model signals, so these helpers schedule the rollup refresh and the
+data version bump that the post_save receivers would otherwise have done.
+"""
+from django.utils import timezone
+
+from .models import ExerciseLog
+from .rollups import schedule_refresh
+from .versions import schedule_bump, user_key
+
+_LOG_UNIQUE_FIELDS = ['user', 'exercise', 'date']
+
+
+def upsert_exercise_logs(user_id, day, completed_by_exercise):
+    """Create or update the logs of `user_id` on `day` from {exercise_id: completed} in one statement."""
+    ExerciseLog.objects.bulk_create(
+        [
+            ExerciseLog(user_id=user_id, exercise_id=exercise_id, date=day, completed=completed)
+            for exercise_id, completed in completed_by_exercise.items()
+        ],
+        update_conflicts=True,
+        unique_fields=_LOG_UNIQUE_FIELDS,
+        update_fields=['completed', 'updated_at'],
+    )
+    schedule_refresh([(user_id, day)])
+    schedule_bump(user_key(user_id))
+
+
+def upsert_exercise_log(user, exercise, day, completed):
+    """
+    Create or update one log in a single INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement,
+    so concurrent toggles of the same checkbox cannot race into an IntegrityError. Returns the log.
+    """
+    log = ExerciseLog(user=user, exercise=exercise, date=day, completed=completed)
+    ExerciseLog.objects.bulk_create(
+        [log], update_conflicts=True, unique_fields=_LOG_UNIQUE_FIELDS, update_fields=['completed', 'updated_at'],
+    )
+    if log.pk is None:
+        # Backends that cannot return rows from a bulk insert (e.g. SQLite before 3.35)
+        log.pk = ExerciseLog.objects.filter(user=user, exercise=exercise, date=day).values_list('pk', flat=True).get()
+    schedule_refresh([(user.pk, day)])
+    schedule_bump(user_key(user.pk))
+    return log
+
+
+def set_log_completed(log, completed):
+    """
+    Set `completed` on an existing log with a single UPDATE. Returns False, writing nothing,
+    when the row was deleted concurrently, instead of re-creating it the way an upsert would.
+    """
+    if not ExerciseLog.objects.filter(pk=log.pk).update(completed=completed, updated_at=timezone.now()):
+        return False
+    log.completed = completed
+    schedule_refresh([(log.user_id, log.date)])
+    schedule_bump(user_key(log.user_id))
+    return True
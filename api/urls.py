@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 # Import ExerciseViewSet instead of ExerciseListCreate
-from .views import ExerciseViewSet, RoutineViewSet, RoutinePlanViewSet, ExerciseLogViewSet, ExerciseSetViewSet, TopDownWeeklyTargetViewSet, WeeklyStatsViewSet
+from .views import ExerciseViewSet, RoutineViewSet, RoutinePlanViewSet, ExerciseLogViewSet, ExerciseSetViewSet, TopDownWeeklyTargetViewSet, WeeklyStatsViewSet, AnalysisJobViewSet, SyncViewSet, BatchViewSet
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
@@ -13,6 +13,9 @@ router.register(r'exercise-logs', ExerciseLogViewSet, basename='exerciselog')
 router.register(r'exercise-sets', ExerciseSetViewSet, basename='exerciseset')
 router.register(r'weekly-targets', TopDownWeeklyTargetViewSet, basename='weeklytarget')
 router.register(r'weekly-stats', WeeklyStatsViewSet, basename='weeklystats')
+router.register(r'analysis-jobs', AnalysisJobViewSet, basename='analysisjob')
+router.register(r'sync', SyncViewSet, basename='sync')
+router.register(r'batch', BatchViewSet, basename='batch')
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
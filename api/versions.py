@@ -0,0 +1,89 @@
+"""Per-user and global data version counters, and the conditional-GET support built on them."""
+import functools
+import hashlib
+from datetime import date
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import DataVersion
+
+GLOBAL_KEY = 'global'
+
+
+def user_key(user_id):
+    return f'user:{user_id}'
+
+
+def bump(key):
+    """Increment the counter stored under `key`, creating it on first use."""
+    if DataVersion.objects.filter(key=key).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(key=key, version=1)
+    except IntegrityError:
+        # Created concurrently; the other writer's version is already newer than any issued ETag
+        DataVersion.objects.filter(key=key).update(version=F('version') + 1)
+
+
+def schedule_bump(*keys):
+    """
+    Bump `keys` once the current transaction commits. Registered after any rollup refresh
+    of the same write, so a client can never see the new version with stale derived data.
+    """
+    transaction.on_commit(lambda: [bump(key) for key in keys])
+
+
+def current_versions(*keys):
+    versions = dict(DataVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    return [versions.get(key, 0) for key in keys]
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Weak If-None-Match comparison (RFC 9110 13.1.2). The compression middleware turns strong
+    ETags into W/"..." ones, and clients send those back.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return _opaque_tag(etag) in {_opaque_tag(tag) for tag in parse_etags(if_none_match)}
+
+
+def _opaque_tag(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def conditional_on_data_version(view_method):
+    """
+    Decorator for per-user read actions: emit an ETag derived from the user's and the global
+    data versions, the query string and today's date (relative ranges like the current week
+    roll over at midnight), and answer a matching If-None-Match with 304 using a single
+    lookup, before the action itself runs.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_method(self, request, *args, **kwargs)
+
+        parts = [view_method.__name__, request.get_full_path(), date.today().isoformat()]
+        parts += current_versions(user_key(request.user.pk), GLOBAL_KEY)
+        etag = quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest()[:32])
+
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+    return wrapper
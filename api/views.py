@@ -1,16 +1,33 @@
-import anthropic
 import json
-import os
-from collections import Counter
-from datetime import date, datetime, timedelta
-
-from django.db.models import F, Max
+from datetime import date, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from rest_framework import generics, viewsets, permissions, status
-from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
+from rest_framework.exceptions import APIException, MethodNotAllowed, ValidationError
 from rest_framework.response import Response
-from .models import Exercise, Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget, WeeklyAnalysis
-from .serializers import ExerciseSerializer, RoutineSerializer, RoutinePlanSerializer, ExerciseLogSerializer, ExerciseSetSerializer, TopDownWeeklyTargetSerializer
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+from . import catalog, llm, metrics
+from .analysis import DEFAULT_HISTORY_WEEKS, MAX_HISTORY_WEEKS, build_week_data, enqueue_analysis, fingerprint, is_fresh, stream_analysis
+from .normalized import normalized_plans, normalized_routines
+from .models import Exercise, Routine, RoutinePlan, ExerciseLog, ExerciseSet, TopDownWeeklyTarget, WeeklyAnalysis, AnalysisJob
+from .pagination import ExerciseLogPagination, ExerciseSetPagination, RoutinePlanPagination
+from .readers import exercise_log_rows, routine_plan_rows
+from .renderers import NormalizedJSONRenderer
+from .scheduling import ScheduleConflict, schedule_plans
+from .sets import append_sets, lock_exercise_log, next_set_number, renumber_sets
+from .stats import MAX_WEEKS, week_snapshots
+from .sync import InvalidToken, sync_payload
+from .upserts import upsert_exercise_logs
+from .versions import conditional_on_data_version, etag_matches
+from .serializers import BatchSerializer, ExerciseSerializer, RoutineSerializer, RoutinePlanSerializer, RoutinePlanScheduleSerializer, ExerciseLogSerializer, ExerciseLogBulkUpsertSerializer, ExerciseSetSerializer, ExerciseSetBulkCreateSerializer, ExerciseSetReorderSerializer, TopDownWeeklyTargetSerializer, AnalysisJobSerializer
 
 # Replaced ExerciseListCreate with ExerciseViewSet
 class ExerciseViewSet(viewsets.ModelViewSet):
@@ -22,6 +39,26 @@ class ExerciseViewSet(viewsets.ModelViewSet):
     serializer_class = ExerciseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly] # Keep same permissions
 
+    def list(self, request, *args, **kwargs):
+        # The catalog rarely changes: serve pre-rendered bytes keyed by the catalog version
+        # (one cheap lookup) and let clients revalidate with the matching ETag.
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+
+        version = catalog.current_version()
+        etag = catalog.etag(version)
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = HttpResponseNotModified()
+        else:
+            renderer = request.accepted_renderer
+            body = catalog.rendered(version, lambda: renderer.render(
+                self.get_serializer(self.get_queryset(), many=True).data
+            ))
+            response = HttpResponse(body, content_type=renderer.media_type)
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.EXERCISE_CATALOG_MAX_AGE)
+        return response
+
 
 class RoutineViewSet(viewsets.ModelViewSet):
     """
@@ -29,12 +66,18 @@ class RoutineViewSet(viewsets.ModelViewSet):
     Provides list, create, retrieve, update, partial_update, destroy actions.
     """
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NormalizedJSONRenderer]
 
     serializer_class = RoutineSerializer
 
     def get_queryset(self):
         return Routine.objects.prefetch_related('exercises')
 
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format == NormalizedJSONRenderer.format:
+            return Response(normalized_routines(self.filter_queryset(self.get_queryset())))
+        return super().list(request, *args, **kwargs)
+
 
 class RoutinePlanViewSet(viewsets.ModelViewSet):
     """
@@ -43,6 +86,8 @@ class RoutinePlanViewSet(viewsets.ModelViewSet):
     """
     serializer_class = RoutinePlanSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = RoutinePlanPagination
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [NormalizedJSONRenderer]
 
     def get_queryset(self):
         """
@@ -63,6 +108,33 @@ class RoutinePlanViewSet(viewsets.ModelViewSet):
 
         return queryset.order_by('date')
 
+    def list(self, request, *args, **kwargs):
+        # ?format=normalized: plans carry only routine ids; routines and exercises are sideloaded once
+        if request.accepted_renderer.format == NormalizedJSONRenderer.format:
+            return Response(normalized_plans(self.filter_queryset(self.get_queryset())))
+        return _fast_list(self, routine_plan_rows)
+
+    @action(detail=False, methods=['post'])
+    def schedule(self, request):
+        """
+        Plan a routine (or a weekday -> routine map) over several weeks in one request:
+        {"routine": id | "weekdays": {"monday": id, ...}, "start_date", "weeks", "on_conflict": "skip"|"overwrite"|"fail"}.
+        Answers 201 with a summary, or 409 with the already planned dates under "fail".
+        """
+        serializer = RoutinePlanScheduleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            summary = schedule_plans(
+                request.user, data['routine_by_weekday'], data['start_date'], data['weeks'], data['on_conflict'],
+            )
+        except ScheduleConflict as conflict:
+            return Response(
+                {'error': str(conflict), 'dates': [day.isoformat() for day in conflict.dates]},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return Response(summary, status=status.HTTP_201_CREATED)
+
     def perform_create(self, serializer):
         # Ensure the plan is created for the logged-in user.
         # The serializer already handles setting the user from context.
@@ -82,6 +154,7 @@ class ExerciseLogViewSet(viewsets.ModelViewSet):
     """
     serializer_class = ExerciseLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ExerciseLogPagination
 
     def get_queryset(self):
         """
@@ -104,6 +177,25 @@ class ExerciseLogViewSet(viewsets.ModelViewSet):
 
         return queryset.order_by('date', 'exercise__name')
 
+    def list(self, request, *args, **kwargs):
+        return _fast_list(self, exercise_log_rows)
+
+    @action(detail=False, methods=['post'])
+    def bulk_upsert(self, request):
+        """
+        Check off a whole day at once: {"date": "YYYY-MM-DD", "items": [{"exercise": id, "completed": bool}]}.
+        Applied as one INSERT ... ON CONFLICT DO UPDATE; returns the day's resulting logs for those exercises.
+        """
+        serializer = ExerciseLogBulkUpsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        day = serializer.validated_data['date']
+        completed = {item['exercise']: item['completed'] for item in serializer.validated_data['items']}
+
+        with transaction.atomic():
+            upsert_exercise_logs(request.user.pk, day, completed)
+        logs = self.get_queryset().filter(date=day, exercise_id__in=completed)
+        return Response(exercise_log_rows(logs))
+
     def perform_create(self, serializer):
         # The serializer's create method handles setting the user and get_or_create logic.
         # We pass the request context to the serializer.
@@ -124,28 +216,59 @@ class ExerciseSetViewSet(viewsets.ModelViewSet):
     """CRUD for individual sets within an ExerciseLog. set_number is backend-assigned."""
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ExerciseSetSerializer
+    pagination_class = ExerciseSetPagination
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
 
     def get_queryset(self):
         return ExerciseSet.objects.filter(exercise_log__user=self.request.user).order_by('set_number')
 
     def perform_create(self, serializer):
-        exercise_log = serializer.validated_data['exercise_log']
-        if exercise_log.user != self.request.user:
-            raise PermissionDenied()
-        max_num = ExerciseSet.objects.filter(exercise_log=exercise_log).aggregate(
-            m=Max('set_number')
-        )['m'] or 0
-        serializer.save(set_number=max_num + 1)
+        # Lock the parent log so two quick taps cannot both take the same next set_number
+        with transaction.atomic():
+            exercise_log = lock_exercise_log(self.request.user, serializer.validated_data['exercise_log'].pk)
+            serializer.save(set_number=next_set_number(exercise_log))
 
     def perform_destroy(self, instance):
-        exercise_log = instance.exercise_log
-        deleted_num = instance.set_number
-        instance.delete()
-        ExerciseSet.objects.filter(
-            exercise_log=exercise_log,
-            set_number__gt=deleted_num
-        ).update(set_number=F('set_number') - 1)
+        with transaction.atomic():
+            exercise_log = lock_exercise_log(self.request.user, instance.exercise_log_id)
+            instance.delete()
+            # Close the gap left by the deleted set
+            kept = list(
+                ExerciseSet.objects.filter(exercise_log=exercise_log).order_by('set_number').values_list('pk', 'set_number')
+            )
+            if kept and kept[-1][1] != len(kept):
+                renumber_sets(exercise_log, [pk for pk, _ in kept], kept[-1][1])
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Append several sets to one log: {"exercise_log": id, "sets": [{"reps", "weight_kg", "completed"}, ...]}.
+        Set numbers continue after the log's last set; answers 201 with the created sets.
+        """
+        serializer = ExerciseSetBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            exercise_log = lock_exercise_log(request.user, serializer.validated_data['exercise_log'].pk)
+            created = append_sets(exercise_log, serializer.validated_data['sets'])
+        return Response(ExerciseSetSerializer(created, many=True).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def reorder(self, request):
+        """
+        Rewrite the order of a log's sets: {"exercise_log": id, "order": [set ids in the new order]}.
+        `order` must list every set of the log exactly once; answers with the sets in their new order.
+        """
+        serializer = ExerciseSetReorderSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        order = serializer.validated_data['order']
+        with transaction.atomic():
+            exercise_log = lock_exercise_log(request.user, serializer.validated_data['exercise_log'].pk)
+            current = dict(ExerciseSet.objects.filter(exercise_log=exercise_log).values_list('pk', 'set_number'))
+            if sorted(order) != sorted(current):
+                raise ValidationError({'order': ["Must list every set of the exercise log exactly once."]})
+            renumber_sets(exercise_log, order, max(current.values()))
+        sets = ExerciseSet.objects.filter(exercise_log=exercise_log).order_by('set_number')
+        return Response(ExerciseSetSerializer(sets, many=True).data)
 
 
 class TopDownWeeklyTargetViewSet(viewsets.ModelViewSet):
@@ -188,80 +311,38 @@ class TopDownWeeklyTargetViewSet(viewsets.ModelViewSet):
 
 
 class WeeklyStatsViewSet(viewsets.ViewSet):
+    """Derived per-user stats. GET actions honour If-None-Match against the user's data version."""
     permission_classes = [permissions.IsAuthenticated]
 
     @action(detail=False, methods=['get'])
+    @conditional_on_data_version
     def historical_stats(self, request):
-        weeks_back = int(request.query_params.get('weeks_back', 6))
-        offset = int(request.query_params.get('offset', 0))
+        try:
+            weeks_back = int(request.query_params.get('weeks_back', 6))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response({'error': 'weeks_back and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 <= weeks_back <= MAX_WEEKS:
+            return Response({'error': f'weeks_back must be between 0 and {MAX_WEEKS}'}, status=status.HTTP_400_BAD_REQUEST)
         user = request.user
 
         today = date.today()
         current_week_start = today - timedelta(days=today.weekday()) + timedelta(weeks=offset)
-        earliest_week_start = current_week_start - timedelta(weeks=weeks_back - 1)
-        range_end = current_week_start + timedelta(days=6)
-
-        # 3 bulk queries for the entire date range instead of 3×weeks_back sequential queries
-        all_targets = {
-            (t.year, t.week): t.target_points
-            for t in TopDownWeeklyTarget.objects.filter(user=user)
-        }
-        all_plans = list(
-            RoutinePlan.objects.filter(
-                user=user, date__range=[earliest_week_start, range_end]
-            ).prefetch_related('routine__exercises')
-        )
-        all_logs = list(
-            ExerciseLog.objects.filter(
-                user=user, date__range=[earliest_week_start, range_end], completed=True
-            ).select_related('exercise')
-        )
 
+        # 2 queries regardless of history size: targets for the requested weeks only,
+        # and the daily rollup summed per ISO week in the database
         result = []
-        for i in range(weeks_back - 1, -1, -1):
-            week_start = current_week_start - timedelta(weeks=i)
-            week_end = week_start + timedelta(days=6)
-            iso = week_start.isocalendar()
-            year, week_num = iso[0], iso[1]
-
-            weekly_target = all_targets.get((year, week_num), 0)
-
-            week_plans = [p for p in all_plans if week_start <= p.date <= week_end]
-
-            # Single pass: build planned_points total + per-exercise occurrence counts
-            planned_occ: Counter = Counter()
-            planned_points = 0
-            for plan in week_plans:
-                for ex in plan.routine.exercises.all():
-                    planned_occ[ex.id] += 1
-                    planned_points += ex.training_points
-
-            week_logs = [l for l in all_logs if week_start <= l.date <= week_end]
-
-            # Count how many times each exercise was completed this week
-            completed_occ: Counter = Counter()
-            exercise_pts: dict = {}
-            for log in week_logs:
-                completed_occ[log.exercise_id] += 1
-                exercise_pts[log.exercise_id] = log.exercise.training_points
-
-            completed_planned = 0
-            completed_unplanned = 0
-            for ex_id, comp_count in completed_occ.items():
-                pts = exercise_pts[ex_id]
-                plan_count = planned_occ.get(ex_id, 0)
-                completed_planned += min(plan_count, comp_count) * pts
-                completed_unplanned += max(0, comp_count - plan_count) * pts
-
-            completed_points = completed_planned + completed_unplanned
+        for snapshot in week_snapshots(user, current_week_start, history_weeks=weeks_back - 1):
+            weekly_target = snapshot['target']
+            completed_points = snapshot['completed']
             achievement = round(completed_points / weekly_target * 100, 1) if weekly_target > 0 else 0
 
             result.append({
-                'week': f"W{week_num:02d} {year}",
-                'planned': planned_points,
+                'week': snapshot['label'],
+                'planned': snapshot['planned'],
                 'completed': completed_points,
-                'completedPlanned': completed_planned,
-                'completedUnplanned': completed_unplanned,
+                'completedPlanned': snapshot['completed_planned'],
+                'completedUnplanned': snapshot['completed_unplanned'],
                 'weeklyTarget': weekly_target,
                 'achievementPercentage': achievement,
             })
@@ -269,6 +350,7 @@ class WeeklyStatsViewSet(viewsets.ViewSet):
         return Response(result)
 
     @action(detail=False, methods=['get'])
+    @conditional_on_data_version
     def kpi_summary(self, request):
         user = request.user
         start_date_str = request.query_params.get('start_date')
@@ -277,241 +359,299 @@ class WeeklyStatsViewSet(viewsets.ViewSet):
         if not start_date_str or not end_date_str:
             return Response({'error': 'start_date and end_date are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        start_date = date.fromisoformat(start_date_str)
-        end_date = date.fromisoformat(end_date_str)
-        iso = start_date.isocalendar()
-        year, week_num = iso[0], iso[1]
-
         try:
-            target_obj = TopDownWeeklyTarget.objects.get(user=user, year=year, week=week_num)
-            weekly_target = target_obj.target_points
-        except TopDownWeeklyTarget.DoesNotExist:
-            weekly_target = 0
-
-        plans = RoutinePlan.objects.filter(
-            user=user, date__range=[start_date, end_date]
-        ).prefetch_related('routine__exercises')
-        logs = ExerciseLog.objects.filter(
-            user=user, date__range=[start_date, end_date]
-        ).select_related('exercise')
+            start_date = date.fromisoformat(start_date_str)
+            end_date = date.fromisoformat(end_date_str)
+        except ValueError:
+            return Response({'error': 'start_date and end_date must be ISO dates (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        if end_date < start_date:
+            return Response({'error': 'end_date must not be before start_date'}, status=status.HTTP_400_BAD_REQUEST)
+
+        first_week_start = start_date - timedelta(days=start_date.weekday())
+        last_week_start = end_date - timedelta(days=end_date.weekday())
+        history_weeks = (last_week_start - first_week_start).days // 7
+        if history_weeks >= MAX_WEEKS:
+            return Response({'error': f'the range may touch at most {MAX_WEEKS} weeks'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Two queries for every ISO week the range touches: targets and per-day totals
+        snapshots = week_snapshots(user, last_week_start, history_weeks=history_weeks, include_days=True)
+
+        weeks = {}
+        day_totals = {}
+        target_days = 0  # sum of each week's target times its days in the range
+        for snapshot in snapshots:
+            week_start = snapshot['week_start']
+            first_day, last_day = max(week_start, start_date), min(week_start + timedelta(days=6), end_date)
+            target_days += snapshot['target'] * ((last_day - first_day).days + 1)
+            day_totals.update(snapshot['days'])
+            weeks[week_start] = {
+                'week': snapshot['label'],
+                'start_date': first_day.isoformat(),
+                'end_date': last_day.isoformat(),
+                'target_points': snapshot['target'],
+                'planned_points': 0,
+                'completed_points': 0,
+            }
 
+        # Single pass over the range, bucketing each day into its ISO week
         daily_metrics = {}
         current = start_date
         while current <= end_date:
-            date_str = current.isoformat()
-            day_planned = sum(
-                ex.training_points
-                for p in plans if p.date == current
-                for ex in p.routine.exercises.all()
-            )
-            day_completed = sum(
-                l.exercise.training_points for l in logs
-                if l.date == current and l.completed
-            )
+            day_planned, day_completed = day_totals.get(current, (0, 0))
             day_achievement = round(day_completed / day_planned * 100, 1) if day_planned > 0 else 0
-            daily_metrics[date_str] = {
+            daily_metrics[current.isoformat()] = {
                 'planned_points': day_planned,
                 'completed_points': day_completed,
                 'achievement_percentage': day_achievement,
             }
+            week = weeks[current - timedelta(days=current.weekday())]
+            week['planned_points'] += day_planned
+            week['completed_points'] += day_completed
             current += timedelta(days=1)
 
-        total_planned = sum(m['planned_points'] for m in daily_metrics.values())
-        total_completed = sum(m['completed_points'] for m in daily_metrics.values())
-        planning_achievement = round(total_planned / weekly_target * 100, 1) if weekly_target > 0 else 0
+        for week in weeks.values():
+            week['planning_achievement'] = round(week['planned_points'] / week['target_points'] * 100, 1) if week['target_points'] > 0 else 0
+            week['training_achievement'] = round(week['completed_points'] / week['planned_points'] * 100, 1) if week['planned_points'] > 0 else 0
+
+        # weekly_target stays the target of start_date's week. Planning achievement is measured
+        # against each touched week's target prorated by its days in the range; a range shorter
+        # than a week counts as one week, so within a single week it is the full target as before
+        weekly_target = weeks[first_week_start]['target_points']
+        range_days = (end_date - start_date).days + 1
+        total_target = target_days / min(range_days, 7)
+        total_planned = sum(w['planned_points'] for w in weeks.values())
+        total_completed = sum(w['completed_points'] for w in weeks.values())
+        planning_achievement = round(total_planned / total_target * 100, 1) if total_target > 0 else 0
         training_achievement = round(total_completed / total_planned * 100, 1) if total_planned > 0 else 0
 
         return Response({
             'weekly_target': weekly_target,
+            'target_points': round(total_target, 1),
             'planned_points': total_planned,
             'completed_points': total_completed,
             'planning_achievement': planning_achievement,
             'training_achievement': training_achievement,
             'daily_metrics': daily_metrics,
+            'weekly_breakdown': list(weeks.values()),
         })
 
     @action(detail=False, methods=['get', 'post'])
+    @conditional_on_data_version
     def analysis(self, request):
         user = request.user
-        today = date.today()
-        iso = today.isocalendar()
-        year = int(request.query_params.get('year', iso[0]))
-        week = int(request.query_params.get('week', iso[1]))
+        year, week, history_weeks = _analysis_params(request)
+        cached = WeeklyAnalysis.objects.filter(user=user, year=year, week=week).first()
+        input_hash = fingerprint(build_week_data(user, year, week, history_weeks=history_weeks)) if cached else None
 
         if request.method == 'GET':
-            try:
-                cached = WeeklyAnalysis.objects.get(user=user, year=year, week=week)
-                return Response({
-                    'content': cached.content,
-                    'generated_at': cached.generated_at.isoformat(),
-                    'cached': True,
-                })
-            except WeeklyAnalysis.DoesNotExist:
+            if cached is None:
                 return Response({'content': None, 'cached': False})
+            return Response(_cached_analysis_payload(cached, stale=not is_fresh(cached, input_hash)))
+
+        # POST: return the stored analysis when its inputs are unchanged (unless ?force=true),
+        # otherwise queue a (re)generation job for `manage.py run_analysis_worker`
+        if cached is not None and not _force(request) and is_fresh(cached, input_hash):
+            return Response(_cached_analysis_payload(cached, stale=False))
 
-        # POST: generate (or regenerate)
-        api_key = os.environ.get('ANTHROPIC_API_KEY')
-        if not api_key:
+        if not llm.is_configured():
             return Response(
                 {'error': 'ANTHROPIC_API_KEY not configured on server'},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE,
             )
 
-        week_data = _build_week_data(user, year, week)
-        prompt = _build_analysis_prompt(week_data)
+        job = enqueue_analysis(user, year, week, history_weeks=history_weeks)
 
-        try:
-            client = anthropic.Anthropic(api_key=api_key)
-            message = client.messages.create(
-                model='claude-sonnet-4-6',
-                max_tokens=1024,
-                messages=[{'role': 'user', 'content': prompt}],
-            )
-            raw = message.content[0].text.strip()
-            if raw.startswith('```'):
-                raw = raw.split('```')[1]
-                if raw.startswith('json'):
-                    raw = raw[4:]
-            content = json.loads(raw.strip())
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        obj, _ = WeeklyAnalysis.objects.update_or_create(
-            user=user, year=year, week=week,
-            defaults={'content': content},
+        return Response(
+            AnalysisJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('analysisjob-detail', kwargs={'pk': job.pk}, request=request)},
         )
 
-        return Response({
-            'content': content,
-            'generated_at': obj.generated_at.isoformat(),
-            'cached': False,
-        })
+    @action(detail=False, methods=['post'])
+    def analysis_stream(self, request):
+        """
+        Server-Sent Events variant of POST analysis that generates inline: `delta` events carry
+        the text as the model produces it, then a `done` event carries the stored analysis (or
+        an `error` event). An unchanged cached analysis is sent as a single `done` event.
+        """
+        user = request.user
+        year, week, history_weeks = _analysis_params(request)
+        cached = WeeklyAnalysis.objects.filter(user=user, year=year, week=week).first()
+
+        if cached is not None and not _force(request) and is_fresh(
+            cached, fingerprint(build_week_data(user, year, week, history_weeks=history_weeks))
+        ):
+            events = iter([('done', _cached_analysis_payload(cached, stale=False))])
+        elif not llm.is_configured():
+            return Response(
+                {'error': 'ANTHROPIC_API_KEY not configured on server'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        else:
+            events = stream_analysis(user, year, week, history_weeks=history_weeks)
 
+        content = _sse_lines(events)
+        if isinstance(request._request, ASGIRequest):
+            # Under ASGI Django buffers synchronous iterators completely; hand it an async one
+            content = _aiter_in_thread(content)
+        response = StreamingHttpResponse(content, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # disable proxy buffering
+        return response
 
-def _build_week_data(user, year, week):
-    week_start = datetime.fromisocalendar(year, week, 1).date()
-    week_end = week_start + timedelta(days=6)
-
-    try:
-        target_obj = TopDownWeeklyTarget.objects.get(user=user, year=year, week=week)
-        weekly_target = target_obj.target_points
-    except TopDownWeeklyTarget.DoesNotExist:
-        weekly_target = 0
-
-    plans = RoutinePlan.objects.filter(
-        user=user, date__range=[week_start, week_end]
-    ).prefetch_related('routine__exercises').order_by('date')
-
-    logs = ExerciseLog.objects.filter(
-        user=user, date__range=[week_start, week_end]
-    ).select_related('exercise').order_by('date')
-
-    day_names = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    days = []
-    for i in range(7):
-        day = week_start + timedelta(days=i)
-        day_plans = [p for p in plans if p.date == day]
-        day_logs = [l for l in logs if l.date == day]
-
-        exercises = []
-        if day_plans:
-            for p in day_plans:
-                for ex in p.routine.exercises.all():
-                    exercises.append({
-                        'name': ex.name,
-                        'type': ex.type,
-                        'muscle_group': ex.muscle_group,
-                        'training_points': ex.training_points,
-                    })
-
-        day_planned = sum(e['training_points'] for e in exercises)
-        day_completed = sum(l.exercise.training_points for l in day_logs if l.completed)
-
-        days.append({
-            'day': day_names[i],
-            'date': day.strftime('%a %b %d'),
-            'routine': day_plans[0].routine.name if day_plans else None,
-            'planned_points': day_planned,
-            'completed_points': day_completed,
-            'exercises': exercises,
-        })
 
-    history = []
-    for offset in range(4, 0, -1):
-        h_start = week_start - timedelta(weeks=offset)
-        h_end = h_start + timedelta(days=6)
-        h_iso = h_start.isocalendar()
-        h_year, h_week = h_iso[0], h_iso[1]
+class BatchViewSet(viewsets.ViewSet):
+    """
+    POST batch/ with {"operations": [{"method", "resource", "id", "data"}, ...]} applies create,
+    update and delete calls on routine plans, exercise logs, exercise sets and weekly targets in
+    one request and one transaction. Each operation goes through the resource's own viewset
+    (queryset scoping, serializer validation, perform_* hooks). Answers 200 with one
+    {"status", "data"} result per operation, or, if any operation fails, rolls everything back
+    and answers with that operation's status and {"index", "errors"}.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    viewsets_by_resource = {
+        'routine-plans': RoutinePlanViewSet,
+        'exercise-logs': ExerciseLogViewSet,
+        'exercise-sets': ExerciseSetViewSet,
+        'weekly-targets': TopDownWeeklyTargetViewSet,
+    }
+    actions_by_method = {'POST': 'create', 'PUT': 'update', 'PATCH': 'partial_update', 'DELETE': 'destroy'}
+
+    def create(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = []
         try:
-            h_target = TopDownWeeklyTarget.objects.get(user=user, year=h_year, week=h_week)
-            h_target_pts = h_target.target_points
-        except TopDownWeeklyTarget.DoesNotExist:
-            h_target_pts = 0
-        h_logs = ExerciseLog.objects.filter(
-            user=user, date__range=[h_start, h_end], completed=True
-        ).select_related('exercise')
-        h_completed = sum(l.exercise.training_points for l in h_logs)
-        history.append({
-            'week': f"W{h_week:02d} {h_year}",
-            'completed': h_completed,
-            'target': h_target_pts,
-            'pct': round(h_completed / h_target_pts * 100, 1) if h_target_pts > 0 else 0,
-        })
+            with transaction.atomic():
+                for index, operation in enumerate(serializer.validated_data['operations']):
+                    try:
+                        results.append(self._apply(request, operation))
+                    except Http404:
+                        raise _BatchOperationFailed(index, status.HTTP_404_NOT_FOUND, {'detail': 'Not found.'})
+                    except APIException as exc:
+                        # Same body shape as DRF's exception handler
+                        errors = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+                        raise _BatchOperationFailed(index, exc.status_code, errors)
+                    except IntegrityError:
+                        raise _BatchOperationFailed(index, status.HTTP_409_CONFLICT, {'detail': 'Conflicts with an existing row.'})
+        except _BatchOperationFailed as failure:
+            return Response({'index': failure.index, 'errors': failure.errors}, status=failure.status_code)
+        return Response({'results': results})
+
+    def _apply(self, request, operation):
+        viewset_class = self.viewsets_by_resource[operation['resource']]
+        action_name = self.actions_by_method[operation['method']]
+        if operation['method'].lower() not in viewset_class.http_method_names:
+            raise MethodNotAllowed(operation['method'])
+
+        view = viewset_class(request=request, args=(), kwargs={}, format_kwarg=None, action=action_name)
+        view.check_permissions(request)
+        if action_name == 'create':
+            serializer = view.get_serializer(data=operation['data'])
+            serializer.is_valid(raise_exception=True)
+            view.perform_create(serializer)
+            return {'status': status.HTTP_201_CREATED, 'data': serializer.data}
+
+        view.kwargs = {view.lookup_field: operation['id']}
+        instance = view.get_object()
+        if action_name == 'destroy':
+            view.perform_destroy(instance)
+            return {'status': status.HTTP_204_NO_CONTENT, 'data': None}
+        serializer = view.get_serializer(instance, data=operation['data'], partial=action_name == 'partial_update')
+        serializer.is_valid(raise_exception=True)
+        view.perform_update(serializer)
+        return {'status': status.HTTP_200_OK, 'data': serializer.data}
+
+
+class _BatchOperationFailed(Exception):
+    def __init__(self, index, status_code, errors):
+        super().__init__(index)
+        self.index = index
+        self.status_code = status_code
+        self.errors = errors
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """
+    Delta sync for offline-capable clients: GET sync/?since=<token> returns the exercise logs,
+    sets, routine plans and weekly targets changed since `token`, the ids deleted since then and
+    a new token. Without `since`, or after a catalog change, it returns a full snapshot. Unchanged
+    data answers 304 to If-None-Match.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-    total_planned = sum(d['planned_points'] for d in days)
-    total_completed = sum(d['completed_points'] for d in days)
+    @conditional_on_data_version
+    def list(self, request):
+        try:
+            return Response(sync_payload(request.user, request.query_params.get('since')))
+        except InvalidToken:
+            return Response({'error': 'since is not a valid sync token'}, status=status.HTTP_400_BAD_REQUEST)
 
-    return {
-        'week_label': f"W{week:02d} {year}",
-        'week_range': f"{week_start.strftime('%a %b %d')} – {week_end.strftime('%a %b %d %Y')}",
-        'weekly_target': weekly_target,
-        'total_planned': total_planned,
-        'total_completed': total_completed,
-        'planning_pct': round(total_planned / weekly_target * 100, 1) if weekly_target > 0 else 0,
-        'achievement_pct': round(total_completed / weekly_target * 100, 1) if weekly_target > 0 else 0,
-        'days': days,
-        'history': history,
-    }
 
+class AnalysisJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of queued weekly analysis jobs for polling after POST weekly-stats/analysis."""
+    serializer_class = AnalysisJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-def _build_analysis_prompt(data):
-    day_lines = []
-    for d in data['days']:
-        if d['routine']:
-            exs = ', '.join(
-                f"{e['name']} ({e['muscle_group']}, {e['training_points']}pts)"
-                for e in d['exercises']
-            )
-            day_lines.append(
-                f"  {d['day']} {d['date']}: {d['routine']} — planned {d['planned_points']}pts, "
-                f"completed {d['completed_points']}pts\n    Exercises: {exs}"
-            )
-        else:
-            day_lines.append(f"  {d['day']} {d['date']}: — (rest/unplanned)")
+    def get_queryset(self):
+        return AnalysisJob.objects.filter(user=self.request.user).order_by('-created_at')
 
-    history_lines = [
-        f"  {h['week']}: {h['completed']}/{h['target']} pts ({h['pct']}% of target)"
-        for h in data['history']
-    ]
 
-    return f"""You are a personal fitness coach. Analyze this weekly training data and provide structured feedback.
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+@permission_classes([permissions.IsAdminUser])
+def metrics_view(request):
+    """
+    Request counts, latency and query-count histograms and DB/serialization/LLM time per view,
+    for this worker process, in the Prometheus text format. Staff only (admin session or JWT).
+    """
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
-WEEK: {data['week_label']} ({data['week_range']})
-TARGET: {data['weekly_target']} training points
-PLANNED: {data['total_planned']} pts ({data['planning_pct']}% of target)
-COMPLETED: {data['total_completed']} pts ({data['achievement_pct']}% of target)
 
-DAILY BREAKDOWN:
-{chr(10).join(day_lines)}
+def _fast_list(view, build_rows):
+    """
+    ModelViewSet.list with the un-paginated response built by `build_rows` (see readers.py)
+    instead of the serializer. Keyset pages are small and keep using the serializer.
+    """
+    queryset = view.filter_queryset(view.get_queryset())
+    page = view.paginate_queryset(queryset)
+    if page is not None:
+        return view.get_paginated_response(view.get_serializer(page, many=True).data)
+    return Response(build_rows(queryset))
+
+
+def _analysis_params(request):
+    iso = date.today().isocalendar()
+    year = int(request.query_params.get('year', iso[0]))
+    week = int(request.query_params.get('week', iso[1]))
+    history_weeks = min(max(int(request.query_params.get('history_weeks', DEFAULT_HISTORY_WEEKS)), 0), MAX_HISTORY_WEEKS)
+    return year, week, history_weeks
+
+
+def _force(request):
+    return request.query_params.get('force', '').lower() in ('1', 'true', 'yes')
+
+
+def _cached_analysis_payload(analysis, stale):
+    return {
+        'content': analysis.content,
+        'generated_at': analysis.generated_at.isoformat(),
+        'cached': True,
+        'stale': stale,
+    }
+
 
-RECENT HISTORY (last 4 weeks):
-{chr(10).join(history_lines)}
+def _sse_lines(events):
+    for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-Return ONLY a valid JSON object — no markdown, no code blocks, just raw JSON:
-{{
-  "summary": "1-2 sentence overview of the week",
-  "observations": ["specific data-driven observation", "another observation", "a third observation"],
-  "suggestions": ["actionable suggestion", "another suggestion"]
-}}
 
-Be specific: reference exercise names, point counts, recovery gaps, muscle group balance, and historical trends."""
+async def _aiter_in_thread(iterator):
+    done = object()
+    while True:
+        item = await sync_to_async(next)(iterator, done)
+        if item is done:
+            return
+        yield item
@@ -62,12 +62,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware', # Server-Timing header and /metrics; first, so it times everything below
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware', # gzip/brotli for buffered responses; sees CORS headers already set
     'corsheaders.middleware.CorsMiddleware', # Added CORS middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware', # staff ?profile=1 and sampled profiles; needs request.user
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -141,9 +144,51 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', # Default to requiring authentication
-    )
+    ),
+    # orjson-backed when installed, stdlib json otherwise; same output either way
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+# Response compression (api.middleware.CompressionMiddleware). Brotli is used when the
+# optional Brotli package is installed and the client accepts it, gzip otherwise.
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "5"))
+
+# Weekly analysis generation
+# 'anthropic' calls the API with ANTHROPIC_API_KEY; 'fake' uses an offline canned client.
+ANALYSIS_LLM_CLIENT = os.environ.get("ANALYSIS_LLM_CLIENT", "anthropic")
+# Bound every API call so a hung upstream cannot hold a worker indefinitely (seconds).
+ANALYSIS_LLM_CONNECT_TIMEOUT = float(os.environ.get("ANALYSIS_LLM_CONNECT_TIMEOUT", "5"))
+ANALYSIS_LLM_READ_TIMEOUT = float(os.environ.get("ANALYSIS_LLM_READ_TIMEOUT", "60"))
+ANALYSIS_LLM_MAX_RETRIES = int(os.environ.get("ANALYSIS_LLM_MAX_RETRIES", "2"))
+
+# Seconds clients may reuse the exercise catalog before revalidating it with its ETag
+EXERCISE_CATALOG_MAX_AGE = int(os.environ.get("EXERCISE_CATALOG_MAX_AGE", "60"))
+
+# Delta sync (GET /api/sync/). Each request re-reads this many seconds before the client's
+# token to pick up rows from transactions that committed late; tombstones of deleted rows are
+# kept this many days, and older tokens get a full snapshot instead.
+SYNC_OVERLAP_SECONDS = int(os.environ.get("SYNC_OVERLAP_SECONDS", "5"))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get("SYNC_TOMBSTONE_RETENTION_DAYS", "90"))
+
+# Request profiling (api.middleware.ProfilingMiddleware). Staff can add ?profile=1 to any
+# request; in addition PROFILING_SAMPLE_RATE (0-1) of all requests are profiled and kept when
+# they take at least PROFILING_SLOW_MS. The newest PROFILING_MAX_REPORTS reports are kept in
+# PROFILING_DIR and listed at /admin/profiles/. PROFILING_ENABLED=False removes the middleware.
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "True") == "True"
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_SLOW_MS = int(os.environ.get("PROFILING_SLOW_MS", "1000"))
+PROFILING_MAX_REPORTS = int(os.environ.get("PROFILING_MAX_REPORTS", "50"))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", os.path.join(BASE_DIR, "profiles"))
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
 
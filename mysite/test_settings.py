@@ -0,0 +1,25 @@
+"""
+Settings for running the test suite locally and in CI without PostgreSQL:
+
+    python manage.py test --settings=mysite.test_settings
+"""
+import os
+
+# mysite.settings reads these unconditionally; the values are unused with the SQLite database below
+for name in ("PGDATABASE", "PGUSER", "PGPASSWORD", "PGHOST", "PGPORT"):
+    os.environ.setdefault(name, "unused")
+
+from .settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test.sqlite3',  # noqa: F405
+        'OPTIONS': {'timeout': 30},
+        # A file rather than the default shared-cache in-memory database, where concurrent
+        # writers fail at once with "table is locked" instead of waiting for the lock
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},  # noqa: F405
+    }
+}
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+ANALYSIS_LLM_CLIENT = 'fake'
@@ -19,10 +19,15 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from api.admin import profile_report_download, profile_reports_view
+from api.views import metrics_view
 
 urlpatterns = [
+    path('admin/profiles/', admin.site.admin_view(profile_reports_view), name='profile_reports'),
+    path('admin/profiles/<str:name>.<str:kind>', admin.site.admin_view(profile_report_download), name='profile_report_download'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),  # Include API app URLs
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics_view, name='metrics'),
 ]